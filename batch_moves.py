@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+批量走法生成（数据集处理用，需要 NumPy；与界面无关，不依赖 tkinter）：一次算成千上万个局面的合法着法与将军状态。
+- 局面：(N, 90) int8 数组，格号 row*9+col，棋子码同 chess_rules.PIECE_CODE（0 = 空），
+  另给 (N,) 走子方（True = 黑方走）；encode_positions() 可由 Board / Position 生成
+- 着法全集 MOVE_FROM / MOVE_TO：任何兵种几何上可能走的 (起点, 终点)，共 N_MOVES 种；
+  MOVE_INDEX[着法码] → 下标（着法码同 game_db：起点 << 8 | 终点）
+- legal_move_masks(boards, black) → (masks (N, N_MOVES) bool, in_check (N,) bool)：
+  按兵种与颜色分组查预先算好的走子表，车炮的路径占子数用一次矩阵乘法算出，马腿/象眼/九宫/过河都在表里；
+  再把全部伪合法着法走成新局面 (K, 90)，整批查己方将帅是否被攻击（射线表 + 反查攻击者表）
+- in_check(boards, black)：走子方是否被将军（含将帅对脸）
+- 与 Board.generate_legal_moves 的区别：没有历史，不判长将/长捉（同 Position.legal_moves）
+命令行：
+  python batch_moves.py verify [--positions 3000] [--seed 1]   随机局面与 chess_rules.Board 逐一比对
+  python batch_moves.py bench [--positions 20000] [--seed 1]
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+import chess_rules as xr
+
+N_SQ = xr.ROWS * xr.COLS
+PAD = N_SQ                      # 补齐用的格号：局面数组末尾补一格恒为空
+CHUNK = 2048                    # 每批局面数（控制中间数组大小）
+_DIRS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+_TYPE = {t: i for i, t in enumerate(xr.PIECE_TYPES)}
+
+
+def _code(color: str, ptype: str) -> int:
+    return xr.PIECE_CODE[(color, ptype)]
+
+
+# ======================= 预先算好的表 =======================
+def _line(fr: int, to: int) -> List[int]:
+    """同行/同列两格之间的格号（不含两端）"""
+    (r0, c0), (r1, c1) = divmod(fr, xr.COLS), divmod(to, xr.COLS)
+    if r0 == r1:
+        step = 1 if c1 > c0 else -1
+        return [r0 * xr.COLS + c for c in range(c0 + step, c1, step)]
+    step = 1 if r1 > r0 else -1
+    return [r * xr.COLS + c0 for r in range(r0 + step, r1, step)]
+
+
+def _build_move_rules():
+    """
+    → (着法全集, {(颜色, 兵种): (着法下标, 起点, 终点, 阻挡格)}, 直线着法下标, 路径矩阵)
+    阻挡格：马腿 / 象眼，必须为空；没有时为 PAD
+    """
+    rules: Dict[Tuple[str, str], List[Tuple[int, int, int]]] = {}
+    lines = []
+    for fr in range(N_SQ):
+        r, c = divmod(fr, xr.COLS)
+        for dr, dc in _DIRS:
+            rr, cc = r + dr, c + dc
+            while xr.in_bounds(rr, cc):
+                lines.append((fr, rr * xr.COLS + cc))
+                rr += dr; cc += dc
+        for color in ('r', 'b'):
+            rules.setdefault((color, 'N'), []).extend(
+                (fr, to, lr * xr.COLS + lc) for (lr, lc), to in xr._KNIGHT[fr])
+            rules.setdefault((color, 'B'), []).extend(
+                (fr, to, er * xr.COLS + ec) for (er, ec), to in xr._ELEPHANT[color][fr])
+            for t in ('A', 'K', 'P'):
+                rules.setdefault((color, t), []).extend((fr, to, PAD) for to in xr._STEPS[(color, t)][fr])
+    codes = sorted({fr << 8 | to for fr, to in lines} |
+                   {fr << 8 | to for rows in rules.values() for fr, to, _ in rows})
+    index = {code: i for i, code in enumerate(codes)}
+    tables = {}
+    for key, rows in rules.items():
+        arr = np.array([(index[fr << 8 | to], fr, to, blk) for fr, to, blk in rows], dtype=np.intp)
+        tables[key] = (arr[:, 0], arr[:, 1], arr[:, 2], arr[:, 3])
+    line_idx = np.array([index[fr << 8 | to] for fr, to in lines], dtype=np.intp)
+    line_from = np.array([fr for fr, _ in lines], dtype=np.intp)
+    line_to = np.array([to for _, to in lines], dtype=np.intp)
+    path = np.zeros((N_SQ + 1, len(lines)), dtype=np.float32)
+    for j, (fr, to) in enumerate(lines):
+        path[_line(fr, to), j] = 1
+    return codes, tables, (line_idx, line_from, line_to), path
+
+
+def _build_attack_tables():
+    """
+    反查攻击者：[攻击方是否黑方][被攻击格] → 可能的攻击者 (格号, 阻挡格, 棋子码)，补齐到同样长度
+    （车炮与将帅对脸走射线，不在表里）
+    """
+    att = {(color, k): [] for color in ('r', 'b') for k in range(N_SQ)}
+    for s in range(N_SQ):
+        for color in ('r', 'b'):
+            for (lr, lc), k in xr._KNIGHT[s]:
+                att[(color, k)].append((s, lr * xr.COLS + lc, _code(color, 'N')))
+            for (er, ec), k in xr._ELEPHANT[color][s]:
+                att[(color, k)].append((s, er * xr.COLS + ec, _code(color, 'B')))
+            for t in ('A', 'K', 'P'):
+                for k in xr._STEPS[(color, t)][s]:
+                    att[(color, k)].append((s, PAD, _code(color, t)))
+    width = max(len(v) for v in att.values())
+    src = np.full((2, N_SQ, width), PAD, dtype=np.intp)
+    blk = np.full((2, N_SQ, width), PAD, dtype=np.intp)
+    code = np.full((2, N_SQ, width), -1, dtype=np.int8)
+    for (color, k), rows in att.items():
+        side = 1 if color == 'b' else 0
+        for i, (s, b, c) in enumerate(rows):
+            src[side, k, i], blk[side, k, i], code[side, k, i] = s, b, c
+    rays = np.full((N_SQ, 4, xr.ROWS), PAD, dtype=np.intp)
+    for k in range(N_SQ):
+        for d, ray in enumerate(xr._RAYS[k]):
+            rays[k, d, :len(ray)] = [j for _, _, j in ray]
+    return src, blk, code, rays
+
+
+MOVE_CODES, _RULES, _LINES, _PATH = _build_move_rules()
+N_MOVES = len(MOVE_CODES)
+MOVE_FROM = np.array([code >> 8 for code in MOVE_CODES], dtype=np.int16)
+MOVE_TO = np.array([code & 0xFF for code in MOVE_CODES], dtype=np.int16)
+MOVE_INDEX: Dict[int, int] = {code: i for i, code in enumerate(MOVE_CODES)}
+_ATT_SRC, _ATT_BLK, _ATT_CODE, _RAYS = _build_attack_tables()
+_VERTICAL = np.array([True, True, False, False])        # _RAYS 的四个方向里哪两个是竖线（将帅对脸）
+
+
+# ======================= 输入 =======================
+def encode_positions(items: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """Board / Position 序列 → (boards (N, 90) int8, black (N,) bool)"""
+    cells, black = [], []
+    for item in items:
+        pos = item if isinstance(item, xr.Position) else item.position()
+        cells.append(pos.cells)
+        black.append(pos.side == 'b')
+    boards = np.frombuffer(b"".join(cells), dtype=np.int8).reshape(-1, N_SQ)
+    return boards, np.array(black, dtype=bool)
+
+
+def _padded(boards: np.ndarray) -> np.ndarray:
+    out = np.zeros((len(boards), N_SQ + 1), dtype=np.int8)
+    out[:, :N_SQ] = boards
+    return out
+
+
+# ======================= 将军判断 =======================
+def _in_check_padded(b: np.ndarray, black: np.ndarray) -> np.ndarray:
+    """b：(K, 91) 已补齐的局面；black：被查的一方是否黑方"""
+    n = len(b)
+    rows = np.arange(n)
+    enemy = np.where(black, 0, 7).astype(np.int8)                  # 对方棋子码偏移
+    king = np.where(black, _code('b', 'K'), _code('r', 'K')).astype(np.int8)
+    is_king = b[:, :N_SQ] == king[:, None]
+    has_king = is_king.any(axis=1)
+    ksq = is_king.argmax(axis=1)
+
+    # 射线：第一个子是对方车（竖线上也可以是对方将帅），第二个子是对方炮
+    ray = b[rows[:, None, None], _RAYS[ksq]]                       # (K, 4, 10)
+    occ = ray != 0
+    first = occ.argmax(axis=2)
+    p1 = np.take_along_axis(ray, first[..., None], axis=2)[..., 0]
+    p1 = np.where(occ.any(axis=2), p1, 0)
+    occ2 = occ & (np.arange(xr.ROWS) > first[..., None])
+    second = occ2.argmax(axis=2)
+    p2 = np.take_along_axis(ray, second[..., None], axis=2)[..., 0]
+    p2 = np.where(occ2.any(axis=2), p2, 0)
+    e = enemy[:, None]
+    hit = (p1 == _TYPE['R'] + 1 + e) | (p2 == _TYPE['C'] + 1 + e) | \
+          ((p1 == _TYPE['K'] + 1 + e) & _VERTICAL)
+    checked = hit.any(axis=1)
+
+    # 马、象、仕、将、兵：按被攻击格反查攻击者
+    side = (~black).astype(np.intp)                                # 攻击方是否黑方
+    src = _ATT_SRC[side, ksq]
+    cond = (b[rows[:, None], src] == _ATT_CODE[side, ksq]) & (b[rows[:, None], _ATT_BLK[side, ksq]] == 0)
+    checked |= cond.any(axis=1)
+    return checked | ~has_king
+
+
+def in_check(boards: np.ndarray, black: np.ndarray) -> np.ndarray:
+    """走子方是否被将军（没有将帅也算被将军，同 Board.is_in_check）"""
+    black = np.asarray(black, dtype=bool)
+    out = np.empty(len(boards), dtype=bool)
+    for i in range(0, len(boards), CHUNK):
+        out[i:i + CHUNK] = _in_check_padded(_padded(boards[i:i + CHUNK]), black[i:i + CHUNK])
+    return out
+
+
+# ======================= 合法着法 =======================
+def _pseudo_masks(b: np.ndarray, black: np.ndarray) -> np.ndarray:
+    n = len(b)
+    color = np.where(b[:, :N_SQ] == 0, 0, np.where(b[:, :N_SQ] > 7, 2, 1)).astype(np.int8)
+    color = np.concatenate([color, np.zeros((n, 1), np.int8)], axis=1)
+    own = np.where(black, 2, 1).astype(np.int8)[:, None]
+    masks = np.zeros((n, N_MOVES), dtype=bool)
+    for side_black, side_color in ((False, 'r'), (True, 'b')):
+        sel = np.flatnonzero(black == side_black)
+        if not len(sel):
+            continue
+        bs, cs = b[sel], color[sel]
+        not_own = cs != own[sel]
+        part = np.zeros((len(sel), N_MOVES), dtype=bool)
+        for ptype in ('N', 'B', 'A', 'K', 'P'):
+            idx, fr, to, blk = _RULES[(side_color, ptype)]
+            ok = (bs[:, fr] == _code(side_color, ptype)) & (bs[:, blk] == 0) & not_own[:, to]
+            part[:, idx] |= ok
+        line_idx, fr, to = _LINES
+        between = (bs != 0).astype(np.float32) @ _PATH                 # 路径上的子数
+        target = cs[:, to]
+        rook = (bs[:, fr] == _code(side_color, 'R')) & (between == 0) & not_own[:, to]
+        cannon = (bs[:, fr] == _code(side_color, 'C')) & (
+            ((between == 0) & (target == 0)) | ((between == 1) & (target == 3 - own[sel])))
+        part[:, line_idx] |= rook | cannon
+        masks[sel] = part
+    return masks
+
+
+def _legal_chunk(boards: np.ndarray, black: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    b = _padded(boards)
+    checked = _in_check_padded(b, black)
+    masks = _pseudo_masks(b, black)
+    pos, mv = np.nonzero(masks)
+    if len(pos):
+        after = b[pos]
+        rows = np.arange(len(pos))
+        fr, to = MOVE_FROM[mv].astype(np.intp), MOVE_TO[mv].astype(np.intp)
+        after[rows, to] = after[rows, fr]
+        after[rows, fr] = 0
+        masks[pos, mv] = ~_in_check_padded(after, black[pos])
+    return masks, checked
+
+
+def legal_move_masks(boards: np.ndarray, black: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """→ (masks (N, N_MOVES) bool：第 j 列为 MOVE_CODES[j] 是否合法, in_check (N,) bool)"""
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, N_SQ)
+    black = np.asarray(black, dtype=bool).reshape(-1)
+    if len(black) != len(boards):
+        raise ValueError(f"局面数 {len(boards)} 与走子方数 {len(black)} 不一致")
+    masks = np.empty((len(boards), N_MOVES), dtype=bool)
+    checked = np.empty(len(boards), dtype=bool)
+    for i in range(0, len(boards), CHUNK):
+        masks[i:i + CHUNK], checked[i:i + CHUNK] = _legal_chunk(boards[i:i + CHUNK], black[i:i + CHUNK])
+    return masks, checked
+
+
+def mask_to_moves(mask: np.ndarray) -> List[xr.Move]:
+    """一行掩码 → [Move]（按着法码排序）"""
+    return [xr.Move(divmod(int(MOVE_FROM[j]), xr.COLS), divmod(int(MOVE_TO[j]), xr.COLS))
+            for j in np.flatnonzero(mask)]
+
+
+# ======================= 校验与测速 =======================
+def random_positions(n: int, seed: int) -> List[xr.Position]:
+    """一半取自随机对局途中的局面，一半是随机摆子（将帅在九宫内，其余子可以在任意空格）"""
+    rng = random.Random(seed)
+    out: List[xr.Position] = []
+    while len(out) < n // 2:
+        board = xr.Board()
+        for _ in range(rng.randrange(20, 160)):
+            legal = board.generate_legal_moves()
+            if not legal:
+                break
+            board.make_move(rng.choice(legal))
+            if rng.random() < 0.25:
+                out.append(board.position())
+    del out[n // 2:]
+    palace = {'r': [r * xr.COLS + c for r in xr.PALACE_RED_ROWS for c in xr.PALACE_COLS],
+              'b': [r * xr.COLS + c for r in xr.PALACE_BLACK_ROWS for c in xr.PALACE_COLS]}
+    while len(out) < n:
+        cells = bytearray(N_SQ)
+        free = list(range(N_SQ))
+        for color in ('r', 'b'):
+            sq = rng.choice([s for s in palace[color] if cells[s] == 0])
+            cells[sq] = _code(color, 'K')
+            free.remove(sq)
+        for sq in rng.sample(free, rng.randrange(2, 20)):
+            cells[sq] = _code(rng.choice('rb'), rng.choice('RNBACP'))
+        out.append(xr.Position(bytes(cells), rng.choice('rb')))
+    return out
+
+
+def verify(positions: List[xr.Position]) -> int:
+    """逐个局面与 Board.generate_legal_moves / is_in_check 比对，返回不一致的局面数"""
+    boards, black = encode_positions(positions)
+    masks, checked = legal_move_masks(boards, black)
+    bad = 0
+    for pos, mask, chk in zip(positions, masks, checked):
+        board = pos.to_board()
+        want = {MOVE_INDEX[(mv.from_sq[0] * xr.COLS + mv.from_sq[1]) << 8 | mv.to_sq[0] * xr.COLS + mv.to_sq[1]]
+                for mv in board.generate_legal_moves()}
+        if want != set(np.flatnonzero(mask).tolist()) or board.is_in_check(board.side_to_move) != chk:
+            bad += 1
+            if bad <= 5:
+                print(f"不一致：{pos.fen()}", file=sys.stderr)
+    return bad
+
+
+def _main(argv: List[str]) -> int:
+    ap = argparse.ArgumentParser(description="批量合法着法（NumPy）")
+    ap.add_argument("cmd", choices=("verify", "bench"))
+    ap.add_argument("--positions", type=int)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    positions = random_positions(args.positions or (3000 if args.cmd == "verify" else 20000), args.seed)
+    if args.cmd == "verify":
+        bad = verify(positions)
+        print(f"{len(positions)} 个局面，{bad} 个与 chess_rules.Board 不一致")
+        return 1 if bad else 0
+    boards, black = encode_positions(positions)
+    t0 = time.perf_counter()
+    masks, _ = legal_move_masks(boards, black)
+    dt = time.perf_counter() - t0
+    sample = positions[:min(len(positions), 500)]
+    t0 = time.perf_counter()
+    for pos in sample:
+        pos.to_board().generate_legal_moves()
+    dt_board = (time.perf_counter() - t0) / len(sample)
+    print(f"{len(positions)} 个局面，{int(masks.sum())} 步合法着法：批量 {dt:.2f} 秒"
+          f"（{len(positions) / dt:,.0f} 局面/秒）；Board 逐个 {1 / dt_board:,.0f} 局面/秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
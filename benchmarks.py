@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准（可复现）：给走法生成、记谱、文件读取和棋盘重绘这几条热路径量一个“尺子”，
+性能相关的改动前后各跑一次，对比结果 JSON 就能看出快了还是慢了。
+- 语料：默认用固定种子从开局随机走出若干局（同一种子、同一版本规则 → 完全相同的棋局与局面）；
+  也可以 --corpus 指定真实棋谱文件（任何可读格式），取前 --games 局
+- 基准项（BENCHMARKS）：
+    legal_moves      每个语料局面 generate_legal_moves()
+    in_check         每个语料局面双方各 is_in_check()
+    make_undo        每局主线 make_move 走到底再 undo_move 退回
+    board_copy       每局走到终局的棋盘 Board.copy() 一次，副本再走一步（触发历史栈的写时复制）
+    move_to_chinese  每局主线逐步生成中文记谱（含走子）
+    play_san         每局主线按中文记谱解析并走子（同界面 play_san）
+    load_<格式>      每局单独存成该格式文件，read_game + 按记谱复盘（同界面打开棋谱，
+                     对话框与控件刷新除外）；格式见 LOAD_FORMATS
+    draw_board       draw_board.draw_board 在隐藏窗口的画布上重绘语料局面（含 update_idletasks）；
+                     没有 tkinter 或没有显示器时记为 skipped
+- 每项先热身一次，再关掉 gc 计时 --repeat 次，记录最小/中位/平均耗时与单次操作耗时
+- 结果 JSON：{"env": 运行环境, "corpus": 语料描述, "results": {基准项: 统计}}；
+  --baseline 给出旧结果时逐项对比单次操作耗时（按中位数），变慢超出 --threshold（默认 10%）记为 regression
+命令行：
+  python benchmarks.py run [--out 结果.json] [--baseline 基线.json] [--only legal_moves,play_san]
+                           [--games 10] [--seed 1] [--repeat 3] [--corpus 棋谱文件] [--threshold 0.1]
+  python benchmarks.py compare 基线.json 结果.json [--threshold 0.1]
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import chess_rules as xr
+import game_io
+from game_record import GameRecord
+
+RESULTS_VERSION = 1
+LOAD_FORMATS = ('.json', '.txt', '.pgn', '.xqf', '.cbr', '.cbl', '.xqdb')
+DEFAULT_THRESHOLD = 0.10
+MAX_PLIES = 120           # 随机语料每局最多走这么多半步
+DRAW_POSITIONS = 40       # 重绘基准只取这么多个局面（Tk 画布操作较慢）
+
+
+# ======================= 语料 =======================
+class Corpus:
+    """若干局主线（起始 FEN + 中文记谱）及其途经的全部局面 FEN"""
+
+    def __init__(self, source: str, games: List[GameRecord]):
+        self.source = source
+        self.games = games
+        self.fens: List[str] = []
+        for rec in games:
+            board = _start_board(rec.start_fen)
+            self.fens.append(board.board_fen())
+            for san in rec.moves:
+                board.make_move(board.parse_chinese(san))
+                self.fens.append(board.board_fen())
+
+    @property
+    def plies(self) -> int:
+        return sum(len(rec.moves) for rec in self.games)
+
+    def describe(self) -> Dict:
+        return {"source": self.source, "games": len(self.games),
+                "plies": self.plies, "positions": len(self.fens)}
+
+
+def _start_board(fen: Optional[str]) -> xr.Board:
+    board = xr.Board()
+    if fen:
+        board.set_fen(fen)
+    return board
+
+
+def random_corpus(games: int, seed: int) -> Corpus:
+    """固定种子随机走子：每步在全部合法着法里均匀挑一个，无着可走或满 MAX_PLIES 为止"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(games):
+        board = xr.Board()
+        moves = []
+        for _ in range(MAX_PLIES):
+            legal = board.generate_legal_moves()
+            if not legal:
+                break
+            mv = rng.choice(legal)
+            moves.append(board.move_to_chinese(mv))
+            board.make_move(mv)
+        records.append(GameRecord(headers={"Event": f"bench {seed}-{i + 1}"}, moves=moves))
+    return Corpus(f"random(seed={seed})", records)
+
+
+def file_corpus(path: str, games: int) -> Corpus:
+    """真实棋谱：按记谱复盘能完整走通的前 games 局"""
+    records = []
+    for rec in game_io.iter_games(path):
+        board = _start_board(rec.start_fen)
+        try:
+            for san in rec.moves:
+                mv = board.parse_chinese(san)
+                if mv is None:
+                    raise ValueError(san)
+                board.make_move(mv)
+        except ValueError:
+            continue
+        records.append(rec)
+        if len(records) >= games:
+            break
+    if not records:
+        raise ValueError(f"{path} 中没有能完整复盘的棋谱")
+    return Corpus(os.path.abspath(path), records)
+
+
+# ======================= 基准项 =======================
+# 每个 setup(corpus) 返回 (计时函数, 一次调用包含的操作数[, 收尾函数])；返回 str 表示跳过及原因
+# load_<格式> 的 setup 另收一个临时目录，测试文件写在里面
+def _bench_legal_moves(corpus: Corpus):
+    boards = [_start_board(fen) for fen in corpus.fens]
+
+    def run():
+        for b in boards:
+            b.generate_legal_moves()
+    return run, len(boards)
+
+
+def _bench_in_check(corpus: Corpus):
+    boards = [_start_board(fen) for fen in corpus.fens]
+
+    def run():
+        for b in boards:
+            b.is_in_check('r')
+            b.is_in_check('b')
+    return run, 2 * len(boards)
+
+
+def _mainlines(corpus: Corpus) -> List[Tuple[Optional[str], List[xr.Move]]]:
+    out = []
+    for rec in corpus.games:
+        board = _start_board(rec.start_fen)
+        moves = []
+        for san in rec.moves:
+            mv = board.parse_chinese(san)
+            board.make_move(mv)
+            moves.append(mv)
+        out.append((rec.start_fen, moves))
+    return out
+
+
+def _bench_make_undo(corpus: Corpus):
+    lines = [(_start_board(fen), moves) for fen, moves in _mainlines(corpus)]
+
+    def run():
+        for board, moves in lines:
+            for mv in moves:
+                board.make_move(mv)
+            for _ in moves:
+                board.undo_move()
+    return run, 2 * corpus.plies
+
+
+def _bench_board_copy(corpus: Corpus):
+    finals = []
+    for rec in corpus.games:
+        board = _replay(rec)
+        finals.append((board, board.generate_pseudo_legal_moves()[:1]))
+
+    def run():
+        for board, first in finals:
+            dup = board.copy()
+            for mv in first:
+                dup.make_move(mv)
+    return run, len(finals)
+
+
+def _bench_move_to_chinese(corpus: Corpus):
+    lines = _mainlines(corpus)
+
+    def run():
+        for fen, moves in lines:
+            board = _start_board(fen)
+            for mv in moves:
+                board.move_to_chinese(mv)
+                board.make_move(mv)
+    return run, corpus.plies
+
+
+def _replay(rec: GameRecord) -> xr.Board:
+    """同 XiangqiGUI.play_san：按中文记谱找着法再走子"""
+    board = _start_board(rec.start_fen)
+    for san in rec.moves:
+        mv = board.parse_chinese(san)
+        if mv is None:
+            raise ValueError(f"无法在当前局面找到匹配的走法：{san}")
+        board.make_move(mv)
+    return board
+
+
+def _bench_play_san(corpus: Corpus):
+    def run():
+        for rec in corpus.games:
+            _replay(rec)
+    return run, corpus.plies
+
+
+def _make_load_bench(ext: str):
+    def setup(corpus: Corpus, tmpdir: str):
+        paths = []
+        for i, rec in enumerate(corpus.games):
+            path = os.path.join(tmpdir, f"game{i:04d}{ext}")
+            game_io.write_game(path, rec)
+            paths.append(path)
+
+        def run():
+            for path in paths:
+                _replay(game_io.read_game(path))
+        return run, len(paths)
+    return setup
+
+
+def _grid(board: xr.Board) -> List[List[str]]:
+    """同 BoardView.draw_board：Board → draw_board 用的字符棋盘"""
+    data = [['.'] * xr.COLS for _ in range(xr.ROWS)]
+    for r in range(xr.ROWS):
+        for c in range(xr.COLS):
+            piece = board.piece_at((r, c))
+            if piece is not None:
+                data[r][c] = piece.ptype.upper() if piece.color == 'r' else piece.ptype.lower()
+    return data
+
+
+def _bench_draw_board(corpus: Corpus):
+    try:
+        import tkinter as tk
+        import draw_board as db
+    except ImportError as e:
+        return f"tkinter 不可用：{e}"
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return f"无法创建 Tk 窗口：{e}"
+    root.withdraw()
+    canvas = tk.Canvas(root, width=700, height=760, bg=db.BOARD_BG)
+    canvas.pack()
+    step = max(1, len(corpus.fens) // DRAW_POSITIONS)
+    grids = [_grid(_start_board(fen)) for fen in corpus.fens[::step][:DRAW_POSITIONS]]
+
+    def run():
+        for data in grids:
+            db.draw_board(canvas, None, db.SQUARE_SIZE, data)
+            canvas.update_idletasks()
+    return run, len(grids), root.destroy
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "legal_moves": _bench_legal_moves,
+    "in_check": _bench_in_check,
+    "make_undo": _bench_make_undo,
+    "board_copy": _bench_board_copy,
+    "move_to_chinese": _bench_move_to_chinese,
+    "play_san": _bench_play_san,
+}
+LOAD_BENCHMARKS = {"load_" + ext[1:]: _make_load_bench(ext) for ext in LOAD_FORMATS}
+ALL_NAMES = list(BENCHMARKS) + list(LOAD_BENCHMARKS) + ["draw_board"]
+
+
+# ======================= 计时 =======================
+def time_it(run: Callable, ops: int, repeat: int) -> Dict:
+    run()                                   # 热身：填缓存、触发惰性初始化
+    times = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - t0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    median = statistics.median(times)
+    return {"ops": ops, "repeat": repeat,
+            "min": round(min(times), 6), "median": round(median, 6),
+            "mean": round(statistics.fmean(times), 6),
+            "per_op_us": round(median / ops * 1e6, 3) if ops else None,
+            "ops_per_sec": round(ops / median) if median > 0 else None}
+
+
+def environment() -> Dict:
+    env = {"python": platform.python_version(),
+           "implementation": platform.python_implementation(),
+           "platform": platform.platform(),
+           "machine": platform.machine(),
+           "processor": platform.processor(),
+           "cpu_count": os.cpu_count(),
+           "time": datetime.datetime.now().isoformat(timespec="seconds")}
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        if out.returncode == 0:
+            env["commit"] = out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    try:
+        import numpy
+        env["numpy"] = numpy.__version__
+    except ImportError:
+        env["numpy"] = None
+    return env
+
+
+def run_benchmarks(corpus: Corpus, names: Optional[List[str]] = None,
+                   repeat: int = 3, log=None) -> Dict:
+    names = names or ALL_NAMES
+    results = {}
+    tmpdir = tempfile.mkdtemp(prefix="xq_bench_")
+    try:
+        for name in names:
+            cleanup = None
+            if name in BENCHMARKS:
+                setup = BENCHMARKS[name](corpus)
+            elif name in LOAD_BENCHMARKS:
+                setup = LOAD_BENCHMARKS[name](corpus, tmpdir)
+            elif name == "draw_board":
+                setup = _bench_draw_board(corpus)
+            else:
+                raise ValueError(f"未知基准项：{name}（可选 {', '.join(ALL_NAMES)}）")
+            if isinstance(setup, str):
+                results[name] = {"skipped": setup}
+            else:
+                run, ops = setup[:2]
+                cleanup = setup[2] if len(setup) > 2 else None
+                try:
+                    results[name] = time_it(run, ops, repeat)
+                finally:
+                    if cleanup:
+                        cleanup()
+            if log:
+                log(name, results[name])
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {"version": RESULTS_VERSION, "env": environment(),
+            "corpus": corpus.describe(), "results": results}
+
+
+# ======================= 对比 =======================
+def compare(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """逐项对比单次操作的中位耗时（µs）→ [{name, baseline, current, change, status}]；
+    status：regression / improved / same / new / missing / skipped"""
+    rows = []
+    base_res, cur_res = baseline.get("results", {}), current.get("results", {})
+    for name in list(cur_res) + [n for n in base_res if n not in cur_res]:
+        b, c = base_res.get(name), cur_res.get(name)
+        row = {"name": name, "baseline": None, "current": None, "change": None}
+        if c is None:
+            row["status"] = "missing"
+        elif b is None:
+            row["status"] = "new"
+        elif "skipped" in b or "skipped" in c:
+            row["status"] = "skipped"
+        else:
+            row["baseline"], row["current"] = b["per_op_us"], c["per_op_us"]
+            change = c["per_op_us"] / b["per_op_us"] - 1 if b["per_op_us"] else 0.0
+            row["change"] = round(change, 4)
+            row["status"] = ("regression" if change > threshold else
+                             "improved" if change < -threshold else "same")
+        rows.append(row)
+    return rows
+
+
+def format_comparison(rows: List[Dict]) -> List[str]:
+    # 表头含全角字，按显示宽度补齐
+    lines = [f"{'基准项':<15}{'基线(µs/次)':>9}{'本次(µs/次)':>9}{'变化':>7}  结论"]
+    for r in rows:
+        base = "-" if r["baseline"] is None else f"{r['baseline']:.2f}"
+        cur = "-" if r["current"] is None else f"{r['current']:.2f}"
+        change = "-" if r["change"] is None else f"{r['change'] * 100:+.1f}%"
+        lines.append(f"{r['name']:<18}{base:>12}{cur:>12}{change:>9}  {r['status']}")
+    return lines
+
+
+def _corpus_mismatch(baseline: Dict, current: Dict) -> Optional[str]:
+    if baseline.get("corpus") != current.get("corpus"):
+        return (f"注意：语料不同（基线 {baseline.get('corpus')}，本次 {current.get('corpus')}），"
+                "按单次操作耗时对比，仅供参考")
+    return None
+
+
+def _read_results(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != RESULTS_VERSION or "results" not in data:
+        raise ValueError(f"{path} 不是基准结果文件")
+    return data
+
+
+def _print_comparison(baseline: Dict, current: Dict, threshold: float) -> int:
+    rows = compare(baseline, current, threshold)
+    note = _corpus_mismatch(baseline, current)
+    if note:
+        print(note)
+    for line in format_comparison(rows):
+        print(line)
+    return 1 if any(r["status"] == "regression" for r in rows) else 0
+
+
+def _log_result(name: str, res: Dict):
+    if "skipped" in res:
+        print(f"  {name:<18}跳过：{res['skipped']}", file=sys.stderr)
+    else:
+        print(f"  {name:<18}{res['median'] * 1000:9.2f} ms  {res['per_op_us']:9.2f} µs/次  "
+              f"（{res['ops']} 次 × {res['repeat']} 轮）", file=sys.stderr)
+
+
+def _main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="性能基准")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("run", help="跑基准并写出结果 JSON")
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--baseline", help="与旧结果对比，有 regression 时退出码为 1")
+    p.add_argument("--only", help="逗号分隔的基准项：" + ",".join(ALL_NAMES))
+    p.add_argument("--games", type=int, default=10)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--corpus", help="用真实棋谱文件代替随机语料")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p = sub.add_parser("compare", help="对比两份结果")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "compare":
+        return _print_comparison(_read_results(args.baseline), _read_results(args.current), args.threshold)
+
+    names = args.only.split(",") if args.only else None
+    for name in names or []:
+        if name not in ALL_NAMES:
+            ap.error(f"未知基准项：{name}")
+    baseline = _read_results(args.baseline) if args.baseline else None
+    t0 = time.perf_counter()
+    corpus = file_corpus(args.corpus, args.games) if args.corpus else random_corpus(args.games, args.seed)
+    print(f"语料：{corpus.describe()}（{time.perf_counter() - t0:.1f} 秒）", file=sys.stderr)
+    data = run_benchmarks(corpus, names, args.repeat, log=_log_result)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.out}", file=sys.stderr)
+    if baseline is not None:
+        return _print_comparison(baseline, data, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
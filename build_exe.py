@@ -20,6 +20,20 @@ a = Analysis(
         ('xiangqi_ui_all.py', '.'),
         ('chess_rules.py', '.'),
         ('draw_board.py', '.'),
+        ('game_record.py', '.'),
+        ('pgn_io.py', '.'),
+        ('xqf_io.py', '.'),
+        ('cbr_io.py', '.'),
+        ('game_db.py', '.'),
+        ('game_io.py', '.'),
+        ('game_transform.py', '.'),
+        ('hashfile.py', '.'),
+        ('position_index.py', '.'),
+        ('opening_tree.py', '.'),
+        ('material_search.py', '.'),
+        ('opening_book.py', '.'),
+        ('tablebase.py', '.'),
+        ('profiling.py', '.'),
     ],
     hiddenimports=hidden,
     hookspath=[],
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+批量导入（无界面）：把目录下成千上万个棋谱文件导入一个 .xqdb 棋谱库。
+- 解析与复盘校验（chess_rules.Board 逐步走棋）分块交给 ProcessPoolExecutor 的子进程，
+  结果按提交顺序流回主进程，由唯一的 GameDBWriter 写库（库里的局序与文件顺序一致）
+- 失败按“文件 / 第几局 / 第几步 / 着法”记录到 <库>.failures.jsonl，并在屏幕上汇总
+- 断点续传：每次提交库（checkpoint）之后把已完成的文件记入 <库>.journal；
+  重跑同一命令时跳过已记账的文件，并丢掉最后一次记账之后写进库里的对局
+用法：
+  python bulk_import.py 源目录 输出.xqdb [--workers N] [--chunk 64] [--restart]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+import game_db
+import game_io
+
+IMPORT_EXTS = ('.json', '.txt', '.pgn', '.xqf', '.cbr', '.cbl')
+CHECKPOINT_SECONDS = 30.0
+
+
+def find_files(root: str) -> List[str]:
+    """递归找出可导入的文件（排序，保证每次运行顺序一致）"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMPORT_EXTS:
+                found.append(os.path.join(dirpath, name))
+    return found
+
+
+# ======================= 子进程 =======================
+def _failure(path: str, game: int, err: Exception) -> Dict:
+    item = {"file": path, "game": game, "error": str(err) or type(err).__name__}
+    if isinstance(err, game_db.IllegalMoveError):
+        item.update(line=err.where.strip(), ply=err.ply, move=err.san)
+    elif isinstance(err, OSError):
+        item["io"] = True           # 读文件出错，不是棋谱本身的问题
+    return item
+
+
+def parse_file(path: str) -> Tuple[List[game_db.EncodedGame], List[Dict]]:
+    """
+    读取一个文件里的所有对局并逐步复盘 → (编码后的对局, 失败记录)；单局失败不影响同文件其它局。
+    任何异常都记成失败、不往外抛：一个格式怪异的文件（如顶层是列表的 JSON）不能拖垮整个进程池
+    """
+    games, failures = [], []
+    n = 0
+    try:
+        for n, rec in enumerate(game_io.iter_games(path), start=1):
+            try:
+                games.append(game_db.encode_game(rec))
+            except Exception as e:
+                failures.append(_failure(path, n, e))
+    except Exception as e:
+        # 文件本身读不下去：记在下一局上（0 表示整个文件）
+        failures.append(_failure(path, n + 1 if n else 0, e))
+    return games, failures
+
+
+def parse_chunk(paths: List[str]):
+    return [(path,) + parse_file(path) for path in paths]
+
+
+# ======================= 主进程 =======================
+class Journal:
+    """<库>.journal：每行一个 JSON {"file", "games", "failures", "total"}，total 为写完该文件后库中局数"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        self.total = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        break           # 最后一行可能只写了一半
+                    self.done.add(item["file"])
+                    self.total = item["total"]
+        self._pending: List[Dict] = []
+
+    def add(self, item: Dict):
+        self._pending.append(item)
+
+    def prune_failures(self, path: str):
+        """
+        续传前整理失败记录：上次记账之后处理的文件这次会重做，它们留在 path 里的失败记录先删掉，
+        免得重复；已记账文件的记录原样保留
+        """
+        if not os.path.exists(path):
+            return
+        kept = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    break           # 最后一行可能只写了一半
+                if os.path.abspath(item["file"]) in self.done:
+                    kept.append(line if line.endswith("\n") else line + "\n")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(kept)
+        os.replace(tmp, path)
+
+    def commit(self):
+        if not self._pending:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for item in self._pending:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending.clear()
+
+
+def _chunks(paths: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(paths), size):
+        yield paths[i:i + size]
+
+
+def _ordered_results(executor, chunks, window: int):
+    """有界地提交任务、按提交顺序取结果，不会把全部结果堆在内存里"""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(parse_chunk, chunk))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def run_import(src: str, out: str, workers: int = 0, chunk: int = 64, restart: bool = False,
+               log=print) -> Dict:
+    journal_path = out + ".journal"
+    failures_path = out + ".failures.jsonl"
+    if restart:
+        for p in (out, journal_path, failures_path):
+            if os.path.exists(p):
+                os.remove(p)
+    journal = Journal(journal_path)
+    journal.prune_failures(failures_path)
+    files = [p for p in find_files(src) if os.path.abspath(p) not in journal.done]
+    workers = workers or os.cpu_count() or 1
+    if journal.done:
+        log(f"续传：已完成 {len(journal.done)} 个文件（{journal.total} 局），剩余 {len(files)} 个")
+
+    stats = {"files": 0, "games": 0, "failed_games": 0, "failed_files": 0}
+    t0 = last_cp = last_report = time.perf_counter()
+    keep = journal.total if journal.done else None
+    with game_db.GameDBWriter(out, keep=keep) as writer, \
+            open(failures_path, "a", encoding="utf-8") as flog, \
+            ProcessPoolExecutor(max_workers=workers) as ex:
+        for path, games, failures in _ordered_results(ex, _chunks(files, chunk), workers * 2):
+            for enc in games:
+                writer.add_encoded(enc)
+            for item in failures:
+                flog.write(json.dumps(item, ensure_ascii=False) + "\n")
+            stats["files"] += 1
+            stats["games"] += len(games)
+            stats["failed_games"] += len(failures)
+            stats["failed_files"] += bool(failures)
+            journal.add({"file": os.path.abspath(path), "games": len(games),
+                         "failures": len(failures), "total": len(writer)})
+            now = time.perf_counter()
+            if now - last_cp >= CHECKPOINT_SECONDS:
+                # 先提交库，再记账：中断后记账里的每个文件都确实在库中
+                writer.checkpoint()
+                flog.flush()
+                journal.commit()
+                last_cp = now
+            if now - last_report >= 2.0:
+                log(f"  {stats['files']}/{len(files)} 个文件，{stats['games']} 局，"
+                    f"{stats['games'] / (now - t0):,.0f} 局/秒")
+                last_report = now
+    journal.commit()
+    elapsed = time.perf_counter() - t0
+    stats["seconds"] = round(elapsed, 3)
+    stats["games_per_sec"] = round(stats["games"] / elapsed, 1) if elapsed > 0 else 0.0
+    stats["files_per_sec"] = round(stats["files"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="批量导入棋谱到 .xqdb 棋谱库")
+    ap.add_argument("src", help="源目录（递归查找 " + " ".join(IMPORT_EXTS) + "）")
+    ap.add_argument("out", help="输出 .xqdb")
+    ap.add_argument("--workers", type=int, default=0, help="子进程数（默认 CPU 核数）")
+    ap.add_argument("--chunk", type=int, default=64, help="每个任务包含的文件数")
+    ap.add_argument("--restart", action="store_true", help="丢弃记账与已有输出，从头导入")
+    args = ap.parse_args(argv)
+
+    stats = run_import(args.src, args.out, args.workers, args.chunk, args.restart)
+    print(f"完成：{stats['files']} 个文件，{stats['games']} 局，用时 {stats['seconds']:.1f} 秒"
+          f"（{stats['games_per_sec']:,.0f} 局/秒，{stats['files_per_sec']:,.0f} 文件/秒）")
+    if stats["failed_games"]:
+        print(f"失败：{stats['failed_games']} 局（{stats['failed_files']} 个文件），"
+              f"详见 {args.out}.failures.jsonl", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
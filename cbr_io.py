@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+CBR / CBL（象棋桥 CCBridge）二进制棋谱读写（与界面无关，不依赖 tkinter）：
+- decode_cbr(data) / read_cbr(path)：单局 CBR → GameRecord（主线、注释、变着、排局）
+- write_cbr(path, rec)：写出 CBR（不含象棋桥私有的扩展字段）
+- CblLibrary(path)：CBL 棋谱库。mmap 打开后只扫描一遍各局的起始偏移（在 C 层 find），
+  不解码任何一局；len() / titles() / 下标取局都是按需进行，几千局的库也能立即打开。
+文件布局（小端）：
+  0      16   "CCBridge Record\\0"
+  180..  字符串字段，UTF-16LE，定长（见 _STRINGS）
+  2120   90   初始局面，行优先（第 0 行为黑方底线），棋子码见 _PIECE_CODES
+  2210   1    先行方（2 = 黑方）
+  2214   ...  着法记录：[标志, 保留, 起点, 终点]，先序排列，第一条是根（只带开局注释）；
+              标志 0x80 = 有后续着法，0x40 = 有同级替代着法，0x20 = 随后有 4 字节长度 + UTF-16LE 注释
+CBL 是若干 CBR 记录连续存放、前面带 "CCBridgeLibrary\\0" 文件头的库文件。
+"""
+
+import mmap
+import struct
+from typing import Dict, Iterator, List
+
+import chess_rules as xr
+from game_record import GameRecord
+from xqf_io import TAG_DOWN, TAG_RIGHT, build_move_tree, iter_preorder, tree_to_record
+
+CBR_MAGIC = b"CCBridge Record\x00"
+CBL_MAGIC = b"CCBridgeLibrary\x00"
+BOARD_OFFSET = 2120
+SIDE_OFFSET = 2210
+MOVES_OFFSET = 2214
+_TAG_COMMENT = 0x20
+# 字符串字段：标签名 -> (偏移, 字节数)
+_STRINGS = {
+    "Event": (180, 128),        # 标题
+    "Match": (308, 128),        # 赛事
+    "Date": (436, 64),
+    "Site": (500, 128),
+    "RedTeam": (628, 64),
+    "Red": (692, 64),
+    "BlackTeam": (756, 64),
+    "Black": (820, 64),
+    "Opening": (884, 128),
+    "Annotator": (1012, 64),    # 评注者
+    "Author": (1076, 64),
+}
+_RESULT_OFFSET = 1140
+_RESULTS = {1: "1-0", 2: "0-1", 3: "1/2-1/2"}
+_PIECE_CODES = {0x11: 'R', 0x12: 'N', 0x13: 'B', 0x14: 'A', 0x15: 'K', 0x16: 'C', 0x17: 'P'}
+
+
+class CbrError(ValueError):
+    pass
+
+
+# ======================= 读取 =======================
+def _sq(idx: int):
+    if idx >= 90:
+        return None
+    return divmod(idx, 9)
+
+
+def _utf16(buf, off: int, size: int) -> str:
+    raw = bytes(buf[off:off + size])
+    end = 0
+    while end + 1 < len(raw) and (raw[end] or raw[end + 1]):
+        end += 2
+    return raw[:end].decode("utf-16-le", errors="replace")
+
+
+def _headers(buf) -> Dict[str, str]:
+    headers = {}
+    for tag, (off, size) in _STRINGS.items():
+        val = _utf16(buf, off, size).strip()
+        if val:
+            headers[tag] = val
+    if buf[_RESULT_OFFSET] in _RESULTS:
+        headers["Result"] = _RESULTS[buf[_RESULT_OFFSET]]
+    return headers
+
+
+def _setup_board(buf) -> xr.Board:
+    board = xr.Board(startpos=False)
+    for idx, code in enumerate(buf[BOARD_OFFSET:BOARD_OFFSET + 90]):
+        if not code:
+            continue
+        ptype = _PIECE_CODES.get(0x10 | (code & 0x0F))
+        color = {0x10: 'r', 0x20: 'b'}.get(code & 0xF0)
+        if ptype is None or color is None:
+            raise CbrError(f"初始局面第 {idx} 格棋子码无效：{code:#x}")
+        board.set_piece(divmod(idx, 9), xr.Piece(color, ptype))
+    return board
+
+
+def _parse_nodes(buf, end: int):
+    nodes = []
+    off = MOVES_OFFSET
+    pending = 1
+    while pending:
+        if off + 4 > end:
+            raise CbrError(f"着法记录在 {off} 处被截断")
+        tag, _, src, dst = buf[off:off + 4]
+        off += 4
+        comment = ""
+        if tag & _TAG_COMMENT:
+            if off + 4 > end:
+                raise CbrError(f"注释长度在 {off} 处被截断")
+            length = struct.unpack_from("<I", buf, off)[0]
+            off += 4
+            if off + length > end:
+                raise CbrError(f"注释长度无效：{length}")
+            comment = bytes(buf[off:off + length]).decode("utf-16-le", errors="replace").strip()
+            off += length
+        if nodes:
+            fr, to = _sq(src), _sq(dst)
+            if fr is None or to is None:
+                raise CbrError(f"第 {len(nodes)} 个着法坐标无效：{src}->{dst}")
+        else:
+            fr = to = (0, 0)
+        nodes.append((fr, to, tag & (TAG_DOWN | TAG_RIGHT), comment))
+        pending -= 1
+        if tag & TAG_DOWN:
+            pending += 1
+        if tag & TAG_RIGHT and len(nodes) > 1:
+            pending += 1
+    return nodes
+
+
+def decode_cbr(data) -> GameRecord:
+    """data：bytes / memoryview / mmap 切片，从 CBR 记录开头起"""
+    buf = memoryview(data)
+    try:
+        if len(buf) < MOVES_OFFSET + 4 or bytes(buf[:16]) != CBR_MAGIC:
+            raise CbrError("不是 CBR 棋谱")
+        nodes = _parse_nodes(buf, len(buf))
+        return tree_to_record(_setup_board(buf), nodes, _headers(buf),
+                              'b' if buf[SIDE_OFFSET] == 2 else 'r', CbrError)
+    finally:
+        # 出错时异常的 traceback 还引用着这个视图；不立即释放，调用方的 mmap 就关不掉
+        buf.release()
+
+
+def is_cbr_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(16) == CBR_MAGIC
+
+
+def read_cbr(path: str) -> GameRecord:
+    with open(path, "rb") as f:
+        return decode_cbr(f.read())
+
+
+# ======================= 棋谱库 =======================
+class CblLibrary:
+    """with CblLibrary(path) as lib: len(lib); lib.title(i); lib[i] -> GameRecord"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            self._f.close()
+            raise CbrError("空的 CBL 文件")
+        if self._mm[:16] != CBL_MAGIC:
+            self.close()
+            raise CbrError("不是 CBL 棋谱库")
+        self._offsets = self._scan()
+
+    def _scan(self) -> List[int]:
+        offsets = []
+        mm = self._mm
+        pos = mm.find(CBR_MAGIC, 16)
+        while pos >= 0:
+            offsets.append(pos)
+            pos = mm.find(CBR_MAGIC, pos + MOVES_OFFSET)
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _span(self, i: int) -> memoryview:
+        start = self._offsets[i]
+        end = self._offsets[i + 1] if i + 1 < len(self._offsets) else len(self._mm)
+        return memoryview(self._mm)[start:end]
+
+    def headers(self, i: int) -> Dict[str, str]:
+        """只读文件头字段，不解码着法"""
+        buf = self._span(i)
+        try:
+            return _headers(buf)
+        finally:
+            buf.release()
+
+    def title(self, i: int) -> str:
+        h = self.headers(i)
+        return h.get("Event") or " vs ".join(x for x in (h.get("Red"), h.get("Black")) if x)
+
+    def __getitem__(self, i: int) -> GameRecord:
+        buf = self._span(i)
+        try:
+            return decode_cbr(buf)
+        finally:
+            buf.release()
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        mm, self._mm = self._mm, None
+        try:
+            if mm is not None:
+                mm.close()
+        except BufferError:
+            pass            # 仍有视图未释放：映射随最后一个视图回收，文件照样关闭
+        finally:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================= 写出 =======================
+def _put_utf16(buf: bytearray, off: int, size: int, text: str):
+    raw = text.encode("utf-16-le")[:size - 2]
+    buf[off:off + len(raw)] = raw
+
+
+def encode_cbr(rec: GameRecord) -> bytes:
+    board = xr.Board()
+    if rec.start_fen:
+        board.set_fen(rec.start_fen)
+    head = bytearray(MOVES_OFFSET)
+    head[:16] = CBR_MAGIC
+    for tag, (off, size) in _STRINGS.items():
+        if rec.headers.get(tag):
+            _put_utf16(head, off, size, rec.headers[tag])
+    head[_RESULT_OFFSET] = {v: k for k, v in _RESULTS.items()}.get(rec.result, 0)
+    codes = {t: c for c, t in _PIECE_CODES.items()}
+    for r in range(xr.ROWS):
+        for c in range(xr.COLS):
+            p = board.board[r][c]
+            if p is not None:
+                head[BOARD_OFFSET + r * 9 + c] = codes[p.ptype] + (0 if p.color == 'r' else 0x10)
+    head[SIDE_OFFSET] = 2 if board.side_to_move == 'b' else 1
+
+    body = bytearray()
+
+    def emit(src: int, dst: int, down: bool, right: bool, comment: str):
+        raw = comment.encode("utf-16-le")
+        tag = (TAG_DOWN if down else 0) | (TAG_RIGHT if right else 0) | (_TAG_COMMENT if raw else 0)
+        body.extend((tag, 0, src, dst))
+        if raw:
+            body.extend(struct.pack("<I", len(raw)))
+            body.extend(raw)
+
+    root = build_move_tree(rec, CbrError)
+    emit(0, 0, bool(root.children), False, root.comment)
+    for node, right in iter_preorder(root):
+        (fr, fc), (tr, tc) = node.move.from_sq, node.move.to_sq
+        emit(fr * 9 + fc, tr * 9 + tc, bool(node.children), right, node.comment)
+    return bytes(head) + bytes(body)
+
+
+def write_cbr(path: str, rec: GameRecord):
+    data = encode_cbr(rec)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_cbl(path: str, records) -> int:
+    """把多局写成一个 CBL 库（主要用于测试与导出）"""
+    n = 0
+    with open(path, "wb") as f:
+        f.write(CBL_MAGIC)
+        for rec in records:
+            f.write(encode_cbr(rec))
+            n += 1
+    return n
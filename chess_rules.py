@@ -5,12 +5,27 @@
 1) 长将过滤
 2) 长捉过滤
 3) 60 回合无吃子判和（120 ply）
-说明：不改变 history 的三元组结构，新增 _meta_history 并在生成合法走法时试走检测。
+4) 重复局面：每步走前压入局面的 Zobrist 键，另有 {键: 次数} 计数器，O(1) 判断当前局面是否出现过；
+   只往回看到最近一次不可逆着法（吃子、兵卒前进）为止。长将/长捉只在形成重复局面时才禁止，
+   repetition_ruling() 结合将军/捉子连续记录给出判和或判负（game_result 也会用到）
+5) 攻击图：双方每格被几枚子攻击，走子时只重算受影响的棋子（同线车炮、蹩腿的马、塞眼的象），
+   is_in_check 因此是 O(1)；长捉按本步新攻击到的全部对方子判定（含闪击、一子捉多子），排除有根的子等
+6) Position：不可变、可哈希的局面值（90 字节棋盘 + 走子方 + 无吃子半步数 + 哈希），play(move) 返回新局面，
+   与 Board 互转（Board.position() / Position.to_board()），供缓存、残局库、开局库、并行分析传递局面
+7) Board.copy()：不复盘地复制一块棋盘（棋子共用、棋盘逐行切片），历史栈写时复制，
+   供分析时在副本上试走、界面按步缓存局面快照
+8) 走子历史按字段列式存放（PlyStack：array 定长数组，容量翻倍），每步不再生成元组/字典；
+   history（三元组）与 _meta_history（元信息字典）保留为按下标读取的只读视图
+说明：history 仍按 (move, captured_piece, prev_side) 三元组读取；生成合法走法时试走检测长将/长捉。
 """
 
-from dataclasses import dataclass
+import random
+from array import array
+from dataclasses import dataclass, field
 from typing import Optional, List, Tuple, Iterable, Dict
 
+import profiling
+
 # ===== 原常量与工具函数（保持不变） =====
 ROWS = 10
 COLS = 9
@@ -23,6 +38,17 @@ CN_NUM = ['零', '一', '二', '三', '四', '五', '六', '七', '八', '九']
 PALACE_BLACK_ROWS = range(0, 3)
 PALACE_RED_ROWS   = range(7, 10)
 PALACE_COLS       = range(3, 6)
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR r"
+REPETITION_LIMIT = 3      # 同一局面第 3 次出现时裁决
+
+# game_result() / repetition_ruling() 的返回码
+RESULT_TEXT = {
+    'r+': '将死，红方胜', 'b+': '将死，黑方胜',
+    'r-': '黑方无着可走，红方胜', 'b-': '红方无着可走，黑方胜',
+    'd': '60 回合无吃子，和棋',
+    'd=': '重复局面，和棋',
+    'r*': '黑方长将/长捉，判红方胜', 'b*': '红方长将/长捉，判黑方胜',
+}
 
 def in_bounds(r: int, c: int) -> bool:
     return 0 <= r < ROWS and 0 <= c < COLS
@@ -35,6 +61,73 @@ def _next_pid() -> int:
     _g_next_pid += 1
     return pid
 
+# ======= 新增：Zobrist 哈希（局面索引 / 开局库 / 重复局面检测共用） =======
+# 固定种子生成，保证各次运行、各个索引文件之间的哈希一致；格号 = row*9+col
+_zrng = random.Random(0x58514953)
+ZOBRIST_PIECE: Dict[Tuple[str, str], List[int]] = {
+    (color, ptype): [_zrng.getrandbits(64) for _ in range(ROWS * COLS)]
+    for color in ('r', 'b') for ptype in PIECE_TYPES
+}
+ZOBRIST_SIDE = _zrng.getrandbits(64)     # 轮黑方走时异或
+del _zrng
+
+# ======= 新增：按格号预先算好的走子几何（增量攻击图用），格号 = row*9+col =======
+def _sq_list(cands):
+    return tuple((r, c, r * COLS + c) for r, c in cands if in_bounds(r, c))
+
+
+def _build_tables():
+    rays, ortho, diag, knight = [], [], [], []
+    elephant = {'r': [], 'b': []}
+    steps = {(color, t): [] for color in ('r', 'b') for t in ('A', 'K', 'P')}
+    for r in range(ROWS):
+        for c in range(COLS):
+            rays.append(tuple(_sq_list([(r + dr * k, c + dc * k) for k in range(1, 10)])
+                              for dr, dc in ((1, 0), (-1, 0), (0, 1), (0, -1))))
+            ortho.append(_sq_list([(r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)]))
+            diag.append(_sq_list([(r + 1, c + 1), (r + 1, c - 1), (r - 1, c + 1), (r - 1, c - 1)]))
+            knight.append(tuple(((r + lr, c + lc), (r + dr) * COLS + c + dc)
+                                for (dr, dc), (lr, lc) in (((-2, -1), (-1, 0)), ((-2, 1), (-1, 0)),
+                                                           ((2, -1), (1, 0)), ((2, 1), (1, 0)),
+                                                           ((-1, -2), (0, -1)), ((1, -2), (0, -1)),
+                                                           ((-1, 2), (0, 1)), ((1, 2), (0, 1)))
+                                if in_bounds(r + dr, c + dc)))
+            for color, rows in (('r', range(5, 10)), ('b', range(0, 5))):
+                elephant[color].append(tuple(((r + dr // 2, c + dc // 2), (r + dr) * COLS + c + dc)
+                                             for dr, dc in ((-2, -2), (-2, 2), (2, -2), (2, 2))
+                                             if in_bounds(r + dr, c + dc) and r + dr in rows))
+            for color, palace in (('r', PALACE_RED_ROWS), ('b', PALACE_BLACK_ROWS)):
+                in_palace = lambda sq: sq[0] in palace and sq[1] in PALACE_COLS
+                steps[(color, 'A')].append(tuple(j for rr, cc, j in _sq_list(
+                    [(r + 1, c + 1), (r + 1, c - 1), (r - 1, c + 1), (r - 1, c - 1)]) if in_palace((rr, cc))))
+                steps[(color, 'K')].append(tuple(j for rr, cc, j in _sq_list(
+                    [(r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)]) if in_palace((rr, cc))))
+                forward = -1 if color == 'r' else 1
+                crossed = r < 5 if color == 'r' else r > 4
+                cands = [(r + forward, c)] + ([(r, c - 1), (r, c + 1)] if crossed else [])
+                steps[(color, 'P')].append(tuple(j for _, _, j in _sq_list(cands)))
+    return rays, ortho, diag, knight, elephant, steps
+
+
+_RAYS, _ORTHO, _DIAG, _KNIGHT, _ELEPHANT, _STEPS = _build_tables()
+
+_FULL_TO_HALF = str.maketrans("０１２３４５６７８９", "0123456789")
+_ZH_DIGIT_MAP = {"零": "0", "〇": "0", "一": "1", "二": "2", "三": "3", "四": "4", "五": "5",
+                 "六": "6", "七": "7", "八": "8", "九": "9", "十": "10"}
+_NAME_MAP = {"車": "车", "馬": "马", "傌": "马", "砲": "炮", "將": "将", "帥": "帅", "士": "仕"}
+
+def normalize_chinese(s: str) -> str:
+    """记谱规范化（用于稳健匹配）：全角/中文数字转阿拉伯数字，繁体/异体棋子名统一"""
+    if not s:
+        return ""
+    t = s.strip().replace(" ", "")
+    t = t.translate(_FULL_TO_HALF)
+    for k, v in _ZH_DIGIT_MAP.items():
+        t = t.replace(k, v)
+    for k, v in _NAME_MAP.items():
+        t = t.replace(k, v)
+    return t
+
 @dataclass
 class Piece:
     color: str  # 'r' 或 'b'
@@ -59,18 +152,168 @@ class Move:
     def __repr__(self):
         return f"Move({self.from_sq}->{self.to_sq})"
 
+# ======= 新增：走子历史的列式存储 =======
+PLY_BLACK, PLY_CAPTURE, PLY_CHECK = 1, 2, 4     # PlyStack.flags 的各位：走子方为黑、吃子、将军
+
+
+class PlyStack:
+    """
+    走子历史按字段分列存放：每个字段一个预先分配的 array 定长数组，满了容量翻倍，
+    第 i 步的各字段都在下标 i（n 之后的位置是空闲容量）。每步几十字节，没有逐步的元组/字典/Move 对象。
+    - from_sq / to_sq：格号 row*9+col；captured：被吃棋子码（PIECE_CODE，0 = 未吃子）；flags：PLY_*
+    - moved_pid：走动棋子的 pid；prev_halfmove / prev_rep_floor：走前的无吃子半步数与重复检测窗口起点
+    - key：走前局面的 Zobrist 键（含走子方）
+    - 被捉子：各步被捉子的 pid 依次接在 chase_pool 里，第 i 步是 chase_pool[chase_end[i-1]:chase_end[i]]
+    - taken：{第几步: 被吃的棋子对象}，悔棋放回原对象，pid 保持不变
+    """
+    COLUMNS = (("from_sq", "B"), ("to_sq", "B"), ("captured", "B"), ("flags", "B"),
+               ("moved_pid", "I"), ("chase_end", "I"), ("prev_halfmove", "I"),
+               ("prev_rep_floor", "I"), ("key", "Q"))
+
+    def __init__(self, capacity: int = 64):
+        self.n = 0
+        self.capacity = capacity
+        for name, code in self.COLUMNS:
+            setattr(self, name, array(code, bytes(array(code).itemsize * capacity)))
+        self.chase_pool = array("I")
+        self.taken: Dict[int, Piece] = {}
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _grow(self):
+        for name, _ in self.COLUMNS:
+            col = getattr(self, name)
+            col.frombytes(bytes(col.itemsize * self.capacity))
+        self.capacity *= 2
+
+    def push(self, fr: int, to: int, captured: Optional[Piece], moved_pid: int, flags: int,
+             chased: Iterable[int], prev_halfmove: int, prev_rep_floor: int, key: int):
+        i = self.n
+        if i == self.capacity:
+            self._grow()
+        self.from_sq[i] = fr
+        self.to_sq[i] = to
+        if captured is None:
+            self.captured[i] = 0
+        else:
+            self.captured[i] = PIECE_CODE[(captured.color, captured.ptype)]
+            self.taken[i] = captured
+        self.flags[i] = flags
+        self.moved_pid[i] = moved_pid
+        if chased:
+            self.chase_pool.extend(chased)
+        self.chase_end[i] = len(self.chase_pool)
+        self.prev_halfmove[i] = prev_halfmove
+        self.prev_rep_floor[i] = prev_rep_floor
+        self.key[i] = key
+        self.n = i + 1
+
+    def pop(self) -> int:
+        """弹出最后一步，返回它的下标（弹出后该下标上的字段仍可读，直到下一次 push）"""
+        i = self.n - 1
+        start = self.chase_end[i - 1] if i else 0
+        if start != self.chase_end[i]:
+            del self.chase_pool[start:]
+        self.n = i
+        return i
+
+    def chased(self, i: int) -> frozenset:
+        return frozenset(self.chase_pool[self.chase_end[i - 1] if i else 0:self.chase_end[i]])
+
+    def clear(self):
+        self.n = 0
+        del self.chase_pool[:]
+        self.taken.clear()
+
+    def copy(self) -> "PlyStack":
+        new = PlyStack.__new__(PlyStack)
+        new.n, new.capacity = self.n, self.capacity
+        for name, _ in self.COLUMNS:
+            setattr(new, name, getattr(self, name)[:])
+        new.chase_pool = self.chase_pool[:]
+        new.taken = dict(self.taken)
+        return new
+
+
+class _PlyView:
+    """PlyStack 的只读序列视图：支持 len / 下标（含负数、切片）/ 迭代，逐项现造对象"""
+    __slots__ = ("_plies",)
+
+    def __init__(self, plies: PlyStack):
+        self._plies = plies
+
+    def __len__(self) -> int:
+        return self._plies.n
+
+    def __getitem__(self, i):
+        n = self._plies.n
+        if isinstance(i, slice):
+            return [self._row(k) for k in range(*i.indices(n))]
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("history index out of range")
+        return self._row(i)
+
+    def __iter__(self):
+        return (self._row(k) for k in range(self._plies.n))
+
+    def _row(self, i: int):
+        raise NotImplementedError
+
+
+class HistoryView(_PlyView):
+    """board.history：按步给出 (Move, 被吃的棋子或 None, 走子方)，同旧版三元组"""
+    __slots__ = ()
+
+    def _row(self, i: int) -> Tuple["Move", Optional[Piece], str]:
+        s = self._plies
+        move = Move(divmod(s.from_sq[i], COLS), divmod(s.to_sq[i], COLS))
+        return move, s.taken.get(i), 'b' if s.flags[i] & PLY_BLACK else 'r'
+
+
+class MetaView(_PlyView):
+    """board._meta_history：按步给出旧版元信息字典"""
+    __slots__ = ()
+
+    def _row(self, i: int) -> Dict:
+        s = self._plies
+        flags = s.flags[i]
+        return {
+            "moved_pid": s.moved_pid[i],
+            "captured": bool(flags & PLY_CAPTURE),
+            "gave_check": bool(flags & PLY_CHECK),
+            "chased": s.chased(i),
+            "prev_halfmove": s.prev_halfmove[i],
+            "prev_rep_floor": s.prev_rep_floor[i],
+            "moved_color": 'b' if flags & PLY_BLACK else 'r',
+        }
+
+
 class Board:
     def __init__(self, startpos: bool = True):
         self.board: List[List[Optional[Piece]]] = [[None for _ in range(COLS)] for _ in range(ROWS)]
         self.side_to_move: str = 'r'
-        # 保持不变：history 仍是三元组 (move, captured_piece, prev_side)
-        self.history: List[Tuple[Move, Optional[Piece], str]] = []
-        # 新增：与 history 同步的元信息栈，不改变原 history 结构
-        # 每元素：{"moved_pid":int, "captured":bool, "gave_check":bool,
-        #          "chase_pair":(attacker_pid,target_pid)|None, "prev_halfmove":int}
-        self._meta_history: List[Dict] = []
+        # 走子历史（列式存储，见 PlyStack）；history / _meta_history 是按旧结构读取的兼容视图
+        self._plies = PlyStack()
         # 新增：连续无吃子的半步计数（ply）
         self.halfmove_clock: int = 0
+        # 新增：棋子部分的 Zobrist 哈希，由 set_piece 增量维护（不含走子方）
+        self._piece_hash: int = 0
+        self._mirror_hash: int = 0          # 左右镜像后局面的棋子哈希（开局库折叠对称局面用）
+        # 新增：重复局面检测。_plies.key[i] = 第 i 步走之前的局面键，
+        # _key_counts 统计其中各键的出现次数，_rep_floor = 最近一次不可逆着法之后的局面序号
+        self._key_counts: Dict[int, int] = {}
+        self._rep_floor: int = 0
+        # 新增：攻击图。_attacks[方][格号] = 该方有几枚子攻击（能吃到）这一格，含保护己方子；
+        # _att_of[格号] = (方, [该格棋子攻击的格号])；_kings[方] = 将帅所在格号
+        self._attacks: Dict[str, List[int]] = {'r': [0] * (ROWS * COLS), 'b': [0] * (ROWS * COLS)}
+        self._att_of: Dict[int, Tuple[str, List[int]]] = {}
+        self._kings: Dict[str, Optional[int]] = {'r': None, 'b': None}
+        # 新增：copy() 之后 _plies/_key_counts 与另一块棋盘共用，
+        # 哪边先要改就先复制一份（写时复制，见 _own_history）
+        self._history_shared: bool = False
         if startpos:
             self.set_start_position()
 
@@ -92,153 +335,275 @@ class Board:
             self.board[6][c] = Piece('r', 'P')
 
         self.side_to_move = 'r'
-        self.history.clear()
-        self._meta_history.clear()
+        self._reset_history()
+
+    def _reset_history(self):
+        if self._history_shared:
+            # 共用的历史还属于另一块棋盘，换成新的空栈而不是清空
+            self._plies, self._key_counts = PlyStack(), {}
+            self._history_shared = False
+        else:
+            self._plies.clear()
+            self._key_counts.clear()
         self.halfmove_clock = 0
+        self._rep_floor = 0
+        self._piece_hash, self._mirror_hash = self._compute_piece_hash()
+        self._rebuild_attacks()
+
+    def _compute_piece_hash(self) -> Tuple[int, int]:
+        h = m = 0
+        for r in range(ROWS):
+            for c in range(COLS):
+                p = self.board[r][c]
+                if p is not None:
+                    keys = ZOBRIST_PIECE[(p.color, p.ptype)]
+                    h ^= keys[r * COLS + c]
+                    m ^= keys[r * COLS + COLS - 1 - c]
+        return h, m
+
+    def zobrist(self) -> int:
+        """当前局面（棋子 + 走子方）的 64 位 Zobrist 哈希"""
+        return self._piece_hash ^ ZOBRIST_SIDE if self.side_to_move == 'b' else self._piece_hash
+
+    def zobrist_mirror(self) -> int:
+        """左右镜像（第 c 列 ↔ 第 8-c 列）后局面的哈希，不必真的翻转棋盘"""
+        return self._mirror_hash ^ ZOBRIST_SIDE if self.side_to_move == 'b' else self._mirror_hash
 
     def piece_at(self, sq: Tuple[int,int]) -> Optional[Piece]:
         r,c = sq
         if not in_bounds(r,c): return None
         return self.board[r][c]
 
+    def position(self) -> "Position":
+        """当前局面的不可变快照（不含历史）"""
+        return Position.from_board(self)
+
+    def copy(self) -> "Board":
+        """
+        同局面、同历史的新棋盘，不必从头复盘：棋子对象两边共用（视为不可变，pid 不变），
+        棋盘逐行切片，攻击图与哈希直接复制；历史栈先共用，哪边走子/悔棋时才复制（写时复制）
+        """
+        new = type(self).__new__(type(self))
+        new.__dict__.update(self.__dict__)
+        new.board = [row[:] for row in self.board]
+        new._attacks = {'r': self._attacks['r'][:], 'b': self._attacks['b'][:]}
+        new._att_of = dict(self._att_of)    # 值 (方, 格号表) 只整体替换、不原地修改，可以共用
+        new._kings = dict(self._kings)
+        self._history_shared = new._history_shared = True
+        return new
+
+    __copy__ = copy
+
+    def _own_history(self):
+        """改历史栈之前调用：若仍与 copy() 出的棋盘共用，先复制成自己的一份"""
+        self._plies = self._plies.copy()
+        self._key_counts = dict(self._key_counts)
+        self._history_shared = False
+
+    @property
+    def history(self) -> HistoryView:
+        """走过的着法：[(Move, 被吃的棋子或 None, 走子方)]（只读视图）"""
+        return HistoryView(self._plies)
+
+    @property
+    def _meta_history(self) -> MetaView:
+        """与 history 同步的元信息：[{"moved_pid", "captured", "gave_check", "chased", ...}]（只读视图）"""
+        return MetaView(self._plies)
+
+    @property
+    def ply_count(self) -> int:
+        """已走的半步数（= len(history)）"""
+        return self._plies.n
+
     def set_piece(self, sq: Tuple[int,int], piece: Optional[Piece]):
         r,c = sq
         if not in_bounds(r,c): return
+        self._apply_changes(((r, c, piece),))
+
+    def _put(self, r: int, c: int, piece: Optional[Piece]):
+        """只改棋盘格、Zobrist 哈希与将帅位置（攻击图由 _apply_changes 负责）"""
+        old = self.board[r][c]
+        i = r * COLS + c
+        if old is not None:
+            keys = ZOBRIST_PIECE[(old.color, old.ptype)]
+            self._piece_hash ^= keys[i]
+            self._mirror_hash ^= keys[r * COLS + COLS - 1 - c]
+            if old.ptype == 'K' and self._kings[old.color] == i:
+                self._kings[old.color] = None
+        if piece is not None:
+            keys = ZOBRIST_PIECE[(piece.color, piece.ptype)]
+            self._piece_hash ^= keys[i]
+            self._mirror_hash ^= keys[r * COLS + COLS - 1 - c]
+            if piece.ptype == 'K':
+                self._kings[piece.color] = i
         self.board[r][c] = piece
 
     def find_king(self, color: str) -> Optional[Tuple[int,int]]:
+        i = self._kings[color]
+        return None if i is None else divmod(i, COLS)
+
+    # ======= 新增：增量攻击图（将军判断 O(1)；长捉按全部新增被攻击的子判定） =======
+    def _attack_squares(self, r: int, c: int, piece: Piece) -> List[int]:
+        """该棋子此刻能吃到的格（不论格上是对方子、己方子还是空格；忽略送将等限制）"""
+        i = r * COLS + c
+        t = piece.ptype
+        board = self.board
+        if t == 'R':
+            out = []
+            for ray in _RAYS[i]:
+                for rr, cc, j in ray:
+                    out.append(j)
+                    if board[rr][cc] is not None:
+                        break
+            return out
+        if t == 'C':
+            out = []
+            for ray in _RAYS[i]:
+                screen = False
+                for rr, cc, j in ray:
+                    if board[rr][cc] is not None:
+                        if screen:
+                            out.append(j)
+                            break
+                        screen = True
+            return out
+        if t == 'N':
+            return [j for (lr, lc), j in _KNIGHT[i] if board[lr][lc] is None]
+        if t == 'B':
+            return [j for (er, ec), j in _ELEPHANT[piece.color][i] if board[er][ec] is None]
+        return list(_STEPS[(piece.color, t)][i])
+
+    def _rebuild_attacks(self):
+        n = ROWS * COLS
+        self._attacks = {'r': [0] * n, 'b': [0] * n}
+        self._att_of = {}
+        self._kings = {'r': None, 'b': None}
         for r in range(ROWS):
             for c in range(COLS):
                 p = self.board[r][c]
-                if p and p.color == color and p.ptype == 'K':
-                    return (r,c)
-        return None
+                if p is None:
+                    continue
+                if p.ptype == 'K':
+                    self._kings[p.color] = r * COLS + c
+                sqs = self._attack_squares(r, c, p)
+                self._att_of[r * COLS + c] = (p.color, sqs)
+                counts = self._attacks[p.color]
+                for j in sqs:
+                    counts[j] += 1
 
-    # ======= 新增：攻击判断（仅用于“长捉”标记） =======
-    def _squares_attacked_by_piece(self, from_sq: Tuple[int,int], piece: Piece) -> List[Tuple[int,int]]:
-        """返回该棋子此刻可直接吃到的格（忽略长将/长捉规则，仅依当前局面）。"""
-        r,c = from_sq
-        moves: List[Move] = []
-        # 借用原伪合法生成，但只收集“可吃子”终点
-        def add_if_capture(mr, mc):
-            if in_bounds(mr,mc):
-                tp = self.board[mr][mc]
-                return tp is not None and tp.color != piece.color
-            return False
+    def _collect_affected(self, i: int, affected: set):
+        """第 i 格有无棋子变化时，攻击范围随之改变的棋子：同线上被挡/解挡的车炮、蹩腿的马、塞眼的象"""
+        board = self.board
+        for ray in _RAYS[i]:
+            seen = 0
+            for rr, cc, j in ray:
+                p = board[rr][cc]
+                if p is not None:
+                    if p.ptype == 'C' or (seen == 0 and p.ptype == 'R'):
+                        affected.add(j)
+                    seen += 1
+                    if seen == 2:
+                        break
+        for rr, cc, j in _ORTHO[i]:
+            p = board[rr][cc]
+            if p is not None and p.ptype == 'N':
+                affected.add(j)
+        for rr, cc, j in _DIAG[i]:
+            p = board[rr][cc]
+            if p is not None and p.ptype == 'B':
+                affected.add(j)
 
-        # 复用 _moves_for_piece 的核心判定
-        ptype = piece.ptype
-        attacked: List[Tuple[int,int]] = []
-        if ptype in ('R','C'):
-            for dr,dc in ((1,0),(-1,0),(0,1),(0,-1)):
-                nr, nc = r+dr, c+dc
-                jumped = False
-                while in_bounds(nr,nc):
-                    if self.board[nr][nc] is None:
-                        if ptype == 'R':
-                            pass
-                        else:
-                            nr += dr; nc += dc
-                            continue
-                    else:
-                        if ptype == 'R':
-                            if self.board[nr][nc].color != piece.color:
-                                attacked.append((nr,nc))
-                            break
-                        else:
-                            # 炮隔一个子打
-                            nr2, nc2 = nr+dr, nc+dc
-                            while in_bounds(nr2,nc2):
-                                if self.board[nr2][nc2] is not None:
-                                    if self.board[nr2][nc2].color != piece.color:
-                                        attacked.append((nr2,nc2))
-                                    break
-                                nr2 += dr; nc2 += dc
-                            break
-                    nr += dr; nc += dc
-        elif ptype == 'N':
-            steps = [
-                ((-2,-1),(-1,0)), ((-2,1),(-1,0)),
-                ((2,-1),(1,0)), ((2,1),(1,0)),
-                ((-1,-2),(0,-1)), ((1,-2),(0,-1)),
-                ((-1,2),(0,1)), ((1,2),(0,1)),
-            ]
-            for (dr,dc),(lr,lc) in steps:
-                leg_r, leg_c = r+lr, c+lc
-                tr, tc = r+dr, c+dc
-                if not in_bounds(tr,tc): continue
-                if in_bounds(leg_r,leg_c) and self.board[leg_r][leg_c] is not None:
-                    continue
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    attacked.append((tr,tc))
-        elif ptype == 'B':
-            for dr,dc in ((-2,-2),(-2,2),(2,-2),(2,2)):
-                tr,tc = r+dr, c+dc
-                er,ec = r+dr//2, c+dc//2
-                if not in_bounds(tr,tc): continue
-                if piece.color == 'r' and tr < 5: continue
-                if piece.color == 'b' and tr > 4: continue
-                if self.board[er][ec] is not None: continue
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    attacked.append((tr,tc))
-        elif ptype == 'A':
-            for dr,dc in ((-1,-1),(-1,1),(1,-1),(1,1)):
-                tr,tc = r+dr,c+dc
-                if not in_bounds(tr,tc): continue
-                if piece.color == 'r':
-                    if tr not in PALACE_RED_ROWS or tc not in PALACE_COLS: continue
-                else:
-                    if tr not in PALACE_BLACK_ROWS or tc not in PALACE_COLS: continue
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    attacked.append((tr,tc))
-        elif ptype == 'K':
-            for dr,dc in ((1,0),(-1,0),(0,1),(0,-1)):
-                tr,tc = r+dr,c+dc
-                if not in_bounds(tr,tc): continue
-                if piece.color == 'r':
-                    if tr not in PALACE_RED_ROWS or tc not in PALACE_COLS: continue
-                else:
-                    if tr not in PALACE_BLACK_ROWS or tc not in PALACE_COLS: continue
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    attacked.append((tr,tc))
-        elif ptype == 'P':
-            forward = -1 if piece.color == 'r' else 1
-            # 前
-            tr,tc = r+forward, c
-            if in_bounds(tr,tc):
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    attacked.append((tr,tc))
-            # 过河后左右
-            river_crossed = (r < 5) if piece.color == 'r' else (r > 4)
-            if river_crossed:
-                for dc in (-1,1):
-                    tr,tc = r, c+dc
-                    if in_bounds(tr,tc):
-                        tp = self.board[tr][tc]
-                        if tp is not None and tp.color != piece.color:
-                            attacked.append((tr,tc))
-        return attacked
+    def _apply_changes(self, changes) -> Dict[str, List[int]]:
+        """
+        changes: [(row, col, 新棋子或 None)]，一次走子的全部改动（走子 = 起点清空 + 终点放子）。
+        同步棋盘、哈希与攻击图：只重算受影响的棋子（改动格上的子、同线车炮、马腿/象眼相邻的马象）。
+        → {方: [本次由“无人攻击”变为“有子攻击”的格号]}（判长捉用）
+        """
+        board = self.board
+        affected = set()
+        occupancy = []
+        for r, c, piece in changes:
+            i = r * COLS + c
+            affected.add(i)
+            if (board[r][c] is None) != (piece is None):
+                occupancy.append(i)
+        for r, c, piece in changes:
+            self._put(r, c, piece)
+        for i in occupancy:
+            self._collect_affected(i, affected)
+
+        att_of = self._att_of
+        delta = {'r': {}, 'b': {}}
+        for i in affected:
+            entry = att_of.pop(i, None)
+            if entry is not None:
+                d = delta[entry[0]]
+                for j in entry[1]:
+                    d[j] = d.get(j, 0) - 1
+        for i in affected:
+            r, c = divmod(i, COLS)
+            p = board[r][c]
+            if p is not None:
+                sqs = self._attack_squares(r, c, p)
+                att_of[i] = (p.color, sqs)
+                d = delta[p.color]
+                for j in sqs:
+                    d[j] = d.get(j, 0) + 1
+
+        newly = {}
+        for color, d in delta.items():
+            counts = self._attacks[color]
+            fresh = []
+            for j, v in d.items():
+                if v:
+                    if v > 0 and counts[j] == 0:
+                        fresh.append(j)
+                    counts[j] += v
+            newly[color] = fresh
+        return newly
+
+    def _chased_targets(self, color: str, squares: List[int]) -> frozenset:
+        """
+        color 方刚走完一步，squares 是本步新攻击到的格：其中算“捉”的对方棋子 id。
+        不算捉：将帅（那是将军）、未过河的兵卒、只被将帅或兵卒攻击、与攻击方可以互吃（兑子）、
+        有根的子（例外：马炮捉车，车有根也算捉）
+        """
+        board = self.board
+        out = []
+        for j in squares:
+            r, c = divmod(j, COLS)
+            t = board[r][c]
+            if t is None or t.color == color or t.ptype == 'K':
+                continue
+            if t.ptype == 'P' and not (r < 5 if t.color == 'r' else r > 4):
+                continue
+            attackers = [i for i, (col, sqs) in self._att_of.items() if col == color and j in sqs]
+            kinds = [board[i // COLS][i % COLS].ptype for i in attackers]
+            if all(k in ('K', 'P') for k in kinds):
+                continue
+            own = self._att_of.get(j)
+            if own is not None and all(i in own[1] for i in attackers):
+                continue
+            if self._attacks[t.color][j] and not (t.ptype == 'R' and any(k in ('N', 'C') for k in kinds)):
+                continue
+            out.append(t.pid)
+        return frozenset(out)
 
     def generate_legal_moves(self, color: Optional[str] = None) -> List[Move]:
         if color is None:
             color = self.side_to_move
         pseudo = self.generate_pseudo_legal_moves(color)
-        legal: List[Move] = []
-        for mv in pseudo:
-            captured = self.make_move(mv)
-            in_check = self.is_in_check(color)
-            # 新增：长将/长捉检测（只对当前试走方）
-            long_check = self._is_long_check_after_last_move(color)
-            long_chase = self._is_long_chase_after_last_move(color)
-            self.undo_move()
-            if not in_check and not long_check and not long_chase:
-                legal.append(mv)
-        return legal
+        return [mv for mv in pseudo if self._trial_is_legal(mv, color)]
+
+    def _trial_is_legal(self, mv: Move, color: str) -> bool:
+        """试走一步：不送将，且不构成长将/长捉（连续将军/捉子并造成重复局面，只对当前试走方）"""
+        self.make_move(mv)
+        ok = not self.is_in_check(color)
+        if ok and self.is_repetition():
+            ok = not (self._is_long_check_after_last_move(color) or
+                      self._is_long_chase_after_last_move(color))
+        self.undo_move()
+        return ok
 
     def generate_pseudo_legal_moves(self, color: Optional[str] = None) -> List[Move]:
         if color is None:
@@ -378,26 +743,22 @@ class Board:
             raise ValueError(f"来源格没有棋子: {fr}")
         captured = self.piece_at(to)
         side_before = self.side_to_move
+        if self._history_shared:
+            self._own_history()
+
+        # 走前局面计数（重复局面检测）
+        key = self.zobrist()
+        self._key_counts[key] = self._key_counts.get(key, 0) + 1
 
-        # 执行走子
-        self.set_piece(to, piece)
-        self.set_piece(fr, None)
-        self.history.append((move, captured, side_before))
+        # 执行走子（同步更新攻击图）
+        newly = self._apply_changes(((fr[0], fr[1], None), (to[0], to[1], piece)))
         self.side_to_move = 'b' if self.side_to_move == 'r' else 'r'
 
-        # 检测“是否将军”与“是否形成追（攻击同一目标）”
-        opponent = side_before if side_before != self.side_to_move else ('b' if side_before=='r' else 'r')
+        # 检测“是否将军”与“捉了哪些子”（本步新攻击到的、含闪击）
         gave_check = self.is_in_check(self.side_to_move)  # 走完后对手是否被将军
-        # 计算 chase_pair：如果此步未吃子，且“该动子此刻直接攻击到某个对手棋”
-        chase_pair = None
-        if captured is None:
-            attacked = self._squares_attacked_by_piece(to, piece)
-            # 选一个最自然的目标（若有多枚被同一动子攻击，选任意一个即可用于“同目标”跟踪）
-            if attacked:
-                tr, tc = attacked[0]
-                tp = self.board[tr][tc]
-                if tp is not None and tp.color != piece.color:
-                    chase_pair = (piece.pid, tp.pid)
+        chased = frozenset()
+        if captured is None and newly[side_before]:
+            chased = self._chased_targets(side_before, newly[side_before])
 
         # halfmove 维护
         prev_half = self.halfmove_clock
@@ -406,57 +767,55 @@ class Board:
         else:
             self.halfmove_clock = 0
 
-        # 记录元信息
-        self._meta_history.append({
-            "moved_pid": piece.pid,
-            "captured": captured is not None,
-            "gave_check": gave_check,
-            "chase_pair": chase_pair,
-            "prev_halfmove": prev_half,
-            "moved_color": side_before,
-        })
+        # 不可逆着法（吃子、兵卒前进）之前的局面不可能再出现，重复检测的窗口从这里开始
+        prev_floor = self._rep_floor
+        if captured is not None or (piece.ptype == 'P' and fr[0] != to[0]):
+            self._rep_floor = self._plies.n + 1
+
+        # 着法与元信息入栈
+        flags = (PLY_BLACK if side_before == 'b' else 0) | (PLY_CHECK if gave_check else 0) \
+            | (0 if captured is None else PLY_CAPTURE)
+        self._plies.push(fr[0] * COLS + fr[1], to[0] * COLS + to[1], captured, piece.pid, flags,
+                         chased, prev_half, prev_floor, key)
 
         return captured
 
     def undo_move(self):
-        if not self.history:
+        if not self._plies.n:
             return
-        # 恢复原来三元组
-        move, captured, side_before = self.history.pop()
-        fr = move.from_sq; to = move.to_sq
+        if self._history_shared:
+            self._own_history()
+        s = self._plies
+        i = s.pop()
+        fr = divmod(s.from_sq[i], COLS); to = divmod(s.to_sq[i], COLS)
+        captured = s.taken.pop(i) if s.captured[i] else None
         piece = self.piece_at(to)
-        self.set_piece(fr, piece)
-        self.set_piece(to, captured)
-        self.side_to_move = side_before
-        # 恢复元信息与 halfmove
-        if self._meta_history:
-            meta = self._meta_history.pop()
-            self.halfmove_clock = meta["prev_halfmove"]
+        self._apply_changes(((fr[0], fr[1], piece), (to[0], to[1], captured)))
+        self.side_to_move = 'b' if s.flags[i] & PLY_BLACK else 'r'
+        # 恢复 halfmove 与重复检测
+        self.halfmove_clock = s.prev_halfmove[i]
+        self._rep_floor = s.prev_rep_floor[i]
+        key = s.key[i]
+        n = self._key_counts[key] - 1
+        if n:
+            self._key_counts[key] = n
+        else:
+            del self._key_counts[key]
 
     # ======= 不变：is_in_check / is_checkmate / board_fen / pretty_print / move_to_chinese =======
     def is_in_check(self, color: str) -> bool:
-        king_sq = self.find_king(color)
-        if king_sq is None:
+        """查攻击图 O(1)；另查将帅对脸（白脸将）"""
+        king = self._kings[color]
+        if king is None:
             return True
         opponent = 'b' if color == 'r' else 'r'
-        for mv in self.generate_pseudo_legal_moves(opponent):
-            if mv.to_sq == king_sq:
-                return True
-        opp_king_sq = self.find_king(opponent)
-        if opp_king_sq:
-            kr, kc = king_sq
-            ork, okc = opp_king_sq
-            if kc == okc:
-                step = 1 if ork > kr else -1
-                r = kr + step
-                blocked = False
-                while r != ork:
-                    if self.board[r][kc] is not None:
-                        blocked = True
-                        break
-                    r += step
-                if not blocked:
-                    return True
+        if self._attacks[opponent][king]:
+            return True
+        opp_king = self._kings[opponent]
+        if opp_king is not None and opp_king % COLS == king % COLS:
+            lo, hi = sorted((king, opp_king))
+            col = king % COLS
+            return all(self.board[j // COLS][col] is None for j in range(lo + COLS, hi, COLS))
         return False
 
     def is_checkmate(self, color: str) -> bool:
@@ -470,9 +829,13 @@ class Board:
         return self.halfmove_clock >= 120  # 120 ply = 60 回合
 
     def game_result(self) -> Optional[str]:
+        """None = 未结束；其余返回码见 RESULT_TEXT"""
         # 先检查和棋规则
         if self.is_60_move_rule_draw():
             return 'd'  # 和棋（可按需改为 '1/2-1/2(60)'）
+        rep = self.repetition_ruling()
+        if rep:
+            return rep
         if self.is_checkmate('r'):
             return 'b+'
         if self.is_checkmate('b'):
@@ -502,6 +865,30 @@ class Board:
             rows.append(''.join(row_s))
         return '/'.join(rows) + f" {self.side_to_move}"
 
+    def set_fen(self, fen: str):
+        """board_fen() 的逆操作；也接受标准 FEN（'w' 视为红方，忽略其后的计数字段）"""
+        parts = fen.split()
+        rows = parts[0].split('/')
+        if len(rows) != ROWS:
+            raise ValueError(f"FEN 行数不对: {fen}")
+        self.board = [[None for _ in range(COLS)] for _ in range(ROWS)]
+        for r, row_s in enumerate(rows):
+            c = 0
+            for ch in row_s:
+                if ch.isdigit():
+                    c += int(ch)
+                    continue
+                ptype = ch.upper()
+                if ptype == 'H': ptype = 'N'
+                if ptype == 'E': ptype = 'B'
+                if ptype not in PIECE_TYPES or c >= COLS:
+                    raise ValueError(f"FEN 无法解析: {fen}")
+                self.board[r][c] = Piece('r' if ch.isupper() else 'b', ptype)
+                c += 1
+        side = parts[1].lower() if len(parts) > 1 else 'r'
+        self.side_to_move = 'b' if side == 'b' else 'r'
+        self._reset_history()
+
     def pretty_print(self):
         for r in range(ROWS):
             row_elems = []
@@ -518,10 +905,14 @@ class Board:
             print("局势：", res)
 
     def move_to_chinese(self, move: Move) -> str:
-        # —— 关键：先看 to_sq（兼容“先走后记”），取不到再看 from_sq（兼容“先记后走”）
-        piece = self.piece_at(move.to_sq)
+        # —— 先看 from_sq（“先记后走”），取不到再看 to_sq（兼容“先走后记”）
+        # 注：旧版先看 to_sq，吃子着法在走子前会误取被吃的子；旧谱由 parse_chinese 兼容
+        piece = self.piece_at(move.from_sq)
         if piece is None:
-            piece = self.piece_at(move.from_sq)
+            piece = self.piece_at(move.to_sq)
+        return self._chinese_for(move, piece)
+
+    def _chinese_for(self, move: Move, piece: Optional[Piece]) -> str:
         if piece is None:
             # 兜底：仍然给坐标，避免异常
             return f"{move.from_sq}->{move.to_sq}"
@@ -576,21 +967,46 @@ class Board:
         else:
             return f"{prefix}{name}{from_col}-{to_col}"
 
+    def parse_chinese(self, san: str) -> Optional[Move]:
+        """
+        在当前局面的合法着法中找出与中文记谱 san 匹配的一步；找不到返回 None。
+        先在伪合法着法里按记谱匹配，只对匹配上的着法试走判合法（复盘/导入的热点路径）。
+        """
+        color = self.side_to_move
+        target = normalize_chinese(san)
+        pseudo = self.generate_pseudo_legal_moves(color)
+        for mv in pseudo:
+            cand = self.move_to_chinese(mv)
+            if cand == san or normalize_chinese(cand) == target or \
+               normalize_chinese(cand).replace(".", "") == target.replace(".", ""):
+                if self._trial_is_legal(mv, color):
+                    return mv
+        # 兼容旧版记谱：吃子着法曾按“被吃的子”记谱
+        for mv in pseudo:
+            victim = self.piece_at(mv.to_sq)
+            if victim is not None and normalize_chinese(self._chinese_for(mv, victim)) == target \
+                    and self._trial_is_legal(mv, color):
+                return mv
+        return None
+
     # ======= 新增：长将/长捉逻辑（内部与便于调用的外部方法） =======
     def _is_long_check_after_last_move(self, moved_color: str, threshold: int = 3) -> bool:
         """假设已经完成一次试走：判断“最近一次走子”是否使 moved_color 达到连续将军阈值。"""
-        if not self._meta_history:
+        s = self._plies
+        if not s.n:
             return False
+        own = PLY_BLACK if moved_color == 'b' else 0
+        flags = s.flags
         # 最近一次必须给将
-        if not self._meta_history[-1]["gave_check"] or self._meta_history[-1]["moved_color"] != moved_color:
+        if not flags[s.n - 1] & PLY_CHECK or flags[s.n - 1] & PLY_BLACK != own:
             return False
         # 回溯统计：该颜色是否“每次轮到自己都在将军”，连续次数 >= threshold
         cnt = 0
         # 遍历从尾到头，交替颜色，数该侧最近连续的“自己回合给将”
-        for i in range(len(self._meta_history)-1, -1, -1):
-            m = self._meta_history[i]
-            if m["moved_color"] == moved_color:
-                if m["gave_check"]:
+        for i in range(s.n - 1, -1, -1):
+            f = flags[i]
+            if f & PLY_BLACK == own:
+                if f & PLY_CHECK:
                     cnt += 1
                 else:
                     break
@@ -602,28 +1018,77 @@ class Board:
         return False
 
     def _is_long_chase_after_last_move(self, moved_color: str, threshold: int = 3) -> bool:
-        """假设已经完成一次试走：判断“最近一次走子”是否使 moved_color 达到连续长捉阈值。"""
-        if not self._meta_history:
+        """假设已经完成一次试走：判断“最近一次走子”是否使 moved_color 达到连续长捉阈值
+        （该方最近每一步都在捉同一枚子，可以是不同的子轮流去捉）。"""
+        s = self._plies
+        if not s.n:
+            return False
+        own = PLY_BLACK if moved_color == 'b' else 0
+        last = s.n - 1
+        if s.flags[last] & PLY_BLACK != own:
             return False
-        last = self._meta_history[-1]
-        if last["moved_color"] != moved_color or last["chase_pair"] is None:
+        targets = s.chased(last)
+        if not targets:
             return False
-        target_pair = last["chase_pair"]  # (attacker_pid, target_pid)
         cnt = 0
-        # 遍历并要求：该颜色最近每一次自己的回合，都出现同一 (attacker,target) 的追击
-        for i in range(len(self._meta_history)-1, -1, -1):
-            m = self._meta_history[i]
-            if m["moved_color"] == moved_color:
-                if m["chase_pair"] == target_pair:
-                    cnt += 1
-                else:
-                    break
-            else:
+        for i in range(last, -1, -1):
+            if s.flags[i] & PLY_BLACK != own:
                 continue
+            targets = targets & s.chased(i)
+            if not targets:
+                break
+            cnt += 1
             if cnt >= threshold:
                 return True
         return False
 
+    # ======= 新增：重复局面 =======
+    def is_repetition(self) -> bool:
+        """当前局面此前是否出现过（O(1)，搜索时每个结点都可以调用）。
+        不可逆着法之前的局面在棋盘上不可能再现，计数器里的旧键不会误报（哈希碰撞除外）"""
+        return self.zobrist() in self._key_counts
+
+    def _repeat_indices(self) -> List[int]:
+        """窗口内与当前局面相同的历史局面序号（由近到远；同一走子方，只隔偶数步）"""
+        key = self.zobrist()
+        if key not in self._key_counts:
+            return []
+        keys = self._plies.key
+        return [i for i in range(self._plies.n - 2, self._rep_floor - 1, -2) if keys[i] == key]
+
+    def repetition_count(self) -> int:
+        """当前局面在窗口内此前出现过几次"""
+        return len(self._repeat_indices())
+
+    def repetition_ruling(self, limit: int = REPETITION_LIMIT) -> Optional[str]:
+        """
+        当前局面已出现 limit 次时裁决（返回码见 RESULT_TEXT），否则 None。
+        看这几次重复之间双方的着法：一方每步都将军而另一方不是 → 长将方判负；
+        都没有长将时，一方每步都捉同一枚子而另一方不是 → 长捉方判负；其余（含双方同犯）判和。
+        """
+        idx = self._repeat_indices()
+        if len(idx) < limit - 1:
+            return None
+        s = self._plies
+        checks, chases = {}, {}
+        for color in ('r', 'b'):
+            own = PLY_BLACK if color == 'b' else 0
+            span = [i for i in range(idx[limit - 2], s.n) if s.flags[i] & PLY_BLACK == own]
+            checks[color] = bool(span) and all(s.flags[i] & PLY_CHECK for i in span)
+            targets = None
+            for i in span:
+                t = s.chased(i)
+                targets = t if targets is None else targets & t
+                if not targets:
+                    break
+            chases[color] = bool(targets)
+        for flags in (checks, chases):
+            if flags['r'] != flags['b']:
+                return 'b*' if flags['r'] else 'r*'
+            if flags['r']:
+                return 'd='
+        return 'd='
+
     # —— 对外便捷查询（不改变状态；内部做试走/回退） ——
     def is_long_check_if(self, move: Move, threshold: int = 3) -> bool:
         color = self.side_to_move
@@ -638,3 +1103,137 @@ class Board:
         flag = self._is_long_chase_after_last_move(color, threshold)
         self.undo_move()
         return flag
+
+
+# ======= 新增：不可变局面值 =======
+# 棋子码（Position.cells 用）：红 1..7、黑 8..14，依次为 PIECE_TYPES 顺序，0 = 空
+PIECE_CODE: Dict[Tuple[str, str], int] = {(color, t): i + 1 + 7 * k
+                                          for k, color in enumerate(('r', 'b'))
+                                          for i, t in enumerate(PIECE_TYPES)}
+CODE_PIECE: Dict[int, Tuple[str, str]] = {v: k for k, v in PIECE_CODE.items()}
+_CODE_KEYS: List[Optional[List[int]]] = [None] + [ZOBRIST_PIECE[CODE_PIECE[i]] for i in range(1, 15)]
+
+
+@dataclass(frozen=True)
+class Position:
+    """
+    不可变、可哈希的局面值：可以放进 dict/set、在线程间共享、pickle 给子进程，不会被别处改动。
+    - cells：90 字节，格号 row*9+col，棋子码见 PIECE_CODE（0 = 空）
+    - side：走子方；halfmove：连续无吃子半步数；key：Zobrist 哈希（与 Board.zobrist() 相同）
+    相等与哈希只看棋子和走子方。不带历史，长将/长捉/重复局面的判定需回到 Board。
+    提供 zobrist() / zobrist_mirror() / side_to_move，可直接交给开局库、开局统计、局面索引查询。
+    """
+    cells: bytes
+    side: str = 'r'
+    halfmove: int = field(default=0, compare=False)
+    key: int = field(default=0, compare=False)
+
+    def __post_init__(self):
+        if len(self.cells) != ROWS * COLS:
+            raise ValueError(f"局面应为 {ROWS * COLS} 格，实际 {len(self.cells)}")
+        if not self.key:
+            object.__setattr__(self, 'key', self._hash(mirror=False))
+
+    def __hash__(self) -> int:
+        return self.key
+
+    def _hash(self, mirror: bool) -> int:
+        h = 0
+        for i, code in enumerate(self.cells):
+            if code:
+                if mirror:
+                    i += COLS - 1 - 2 * (i % COLS)
+                h ^= _CODE_KEYS[code][i]
+        return h ^ ZOBRIST_SIDE if self.side == 'b' else h
+
+    # —— 与 Board / FEN 互转 ——
+    @classmethod
+    def from_board(cls, board: "Board") -> "Position":
+        cells = bytes(0 if p is None else PIECE_CODE[(p.color, p.ptype)] for row in board.board for p in row)
+        return cls(cells, board.side_to_move, board.halfmove_clock, board.zobrist())
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Position":
+        board = Board(startpos=False)
+        board.set_fen(fen)
+        return cls.from_board(board)
+
+    def to_board(self) -> "Board":
+        """还原成可走子的 Board（新的棋子对象，历史为空）"""
+        board = Board(startpos=False)
+        cells = self.cells
+        board.board = [[Piece(*CODE_PIECE[x]) if x else None for x in cells[r * COLS:(r + 1) * COLS]]
+                       for r in range(ROWS)]
+        board.side_to_move = self.side
+        board._reset_history()
+        board.halfmove_clock = self.halfmove
+        return board
+
+    def fen(self) -> str:
+        """同 Board.board_fen()"""
+        rows = []
+        for r in range(ROWS):
+            row_s, empty = [], 0
+            for code in self.cells[r * COLS:(r + 1) * COLS]:
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    row_s.append(str(empty)); empty = 0
+                color, ptype = CODE_PIECE[code]
+                row_s.append(ptype if color == 'r' else ptype.lower())
+            if empty:
+                row_s.append(str(empty))
+            rows.append(''.join(row_s))
+        return '/'.join(rows) + f" {self.side}"
+
+    # —— 查询 ——
+    @property
+    def side_to_move(self) -> str:
+        return self.side
+
+    def zobrist(self) -> int:
+        return self.key
+
+    def zobrist_mirror(self) -> int:
+        return self._hash(mirror=True)
+
+    def piece_at(self, sq: Tuple[int, int]) -> Optional[Tuple[str, str]]:
+        """→ (颜色, 兵种) 或 None"""
+        r, c = sq
+        if not in_bounds(r, c):
+            return None
+        code = self.cells[r * COLS + c]
+        return CODE_PIECE[code] if code else None
+
+    def pieces(self) -> List[Tuple[str, str, int]]:
+        """[(颜色, 兵种, 格号)]，与 tablebase 的棋子表示相同"""
+        return [CODE_PIECE[code] + (i,) for i, code in enumerate(self.cells) if code]
+
+    # —— 走子 ——
+    def play(self, move: Move) -> "Position":
+        """走一步 → 新局面（不检查合法性；哈希增量更新）"""
+        fr = move.from_sq[0] * COLS + move.from_sq[1]
+        to = move.to_sq[0] * COLS + move.to_sq[1]
+        code = self.cells[fr]
+        if not code:
+            raise ValueError(f"来源格没有棋子: {move.from_sq}")
+        captured = self.cells[to]
+        cells = bytearray(self.cells)
+        cells[to] = code
+        cells[fr] = 0
+        keys = _CODE_KEYS[code]
+        key = self.key ^ keys[fr] ^ keys[to] ^ ZOBRIST_SIDE
+        if captured:
+            key ^= _CODE_KEYS[captured][to]
+        return Position(bytes(cells), 'b' if self.side == 'r' else 'r',
+                        0 if captured else self.halfmove + 1, key)
+
+    def legal_moves(self) -> List[Move]:
+        """合法着法（不含依赖历史的长将/长捉限制）"""
+        return self.to_board().generate_legal_moves()
+
+
+# ===== 性能计数：PROFILER.enable() 时才换成计数包装，停用时无任何开销 =====
+profiling.register(Board, ("generate_legal_moves", "is_in_check", "make_move", "undo_move",
+                           "parse_chinese", "move_to_chinese"), "Board.")
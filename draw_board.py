@@ -1,3 +1,7 @@
+import os
+import json
+import math
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import font as tkfont
 
@@ -8,6 +12,20 @@ BOARD_COLS = 9
 MARGIN = 30
 PIECE_FONT_FAMILY_PREFERRED = ['SimHei', '黑体', 'Microsoft YaHei', 'Arial']
 PIECE_FONT_SIZE = 28  # 初始值，动态变化
+BOARD_BG = '#DEB887'
+LINE_COLOR = '#8B4513'
+RIVER_COLOR = '#8B0000'
+
+# ==== 预渲染缓存（按格子尺寸，LRU 限量，窗口反复缩放时内存不增长） ====
+# 同进程多窗口共用；淘汰只丢缓存里的引用，画布正在显示的图片由画布自己引用着（见 draw_board）
+IMAGE_CACHE_LIMIT = 8
+_board_images = OrderedDict()    # SQUARE_SIZE -> PhotoImage（底色+线条+九宫）
+_piece_sprites = OrderedDict()   # (SQUARE_SIZE, 'r'|'b') -> PhotoImage（棋子圆盘，外部透明）
+_font_family = None
+_default_font = None
+
+# 解析出的字体族缓存到磁盘，避免每次启动都枚举系统字体
+FONT_CACHE_JSON = os.path.join(os.path.expanduser("~"), ".xiangqi_app", "font_cache.json")
 
 # 棋子中文名称
 PIECE_NAMES = {
@@ -35,87 +53,205 @@ board_data = [
     list('R N B A K A B N R'.split()),
 ]
 
-def draw_board(canvas, piece_font=None):
-    """绘制棋盘和棋子，支持动态缩放和居中"""
+def _read_font_cache():
+    try:
+        with open(FONT_CACHE_JSON, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("preferred") == PIECE_FONT_FAMILY_PREFERRED:
+            return data.get("family")
+    except Exception:
+        pass
+    return None
+
+
+def _write_font_cache(family):
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_JSON), exist_ok=True)
+        with open(FONT_CACHE_JSON, "w", encoding="utf-8") as f:
+            json.dump({"preferred": PIECE_FONT_FAMILY_PREFERRED, "family": family}, f, ensure_ascii=False)
+    except Exception:
+        pass
+
+
+def resolve_font_family():
+    """
+    从 PIECE_FONT_FAMILY_PREFERRED 中选出可用字体。
+    先用磁盘缓存（仅确认该字体仍可用，不枚举），缓存失效时才调用 tkfont.families()。
+    """
+    global _font_family
+    if _font_family is not None:
+        return _font_family
+    cached = _read_font_cache()
+    if cached:
+        try:
+            if tkfont.Font(family=cached).actual("family") == cached:
+                _font_family = cached
+                return _font_family
+        except tk.TclError:
+            pass
+    available_fonts = list(tkfont.families())
+    _font_family = next((f for f in PIECE_FONT_FAMILY_PREFERRED if f in available_fonts), available_fonts[0])
+    _write_font_cache(_font_family)
+    return _font_family
+
+
+def _cache_get(cache, key, build):
+    img = cache.get(key)
+    if img is None:
+        img = build()
+        cache[key] = img
+        while len(cache) > IMAGE_CACHE_LIMIT:
+            cache.popitem(last=False)
+    else:
+        cache.move_to_end(key)
+    return img
+
+
+def _put_line(img, color, xa, ya, xb, yb, width):
+    """在 PhotoImage 上画线：水平/竖直线一次填充，斜线按像素步进。"""
+    lo = width // 2
+    hi = width - lo
+    if xa == xb or ya == yb:
+        img.put(color, to=(min(xa, xb) - lo, min(ya, yb) - lo, max(xa, xb) + hi, max(ya, yb) + hi))
+        return
+    n = max(abs(xb - xa), abs(yb - ya))
+    for i in range(n + 1):
+        x = xa + (xb - xa) * i // n
+        y = ya + (yb - ya) * i // n
+        img.put(color, to=(x - lo, y - lo, x + hi, y + hi))
+
+
+def _render_board_image(master, size):
+    S = size
+    w = (BOARD_COLS - 1) * S + 2 * MARGIN
+    h = (BOARD_ROWS - 1) * S + 2 * MARGIN
+    img = tk.PhotoImage(master=master, width=w, height=h)
+    img.put(BOARD_BG, to=(0, 0, w, h))
+    x1, y1 = MARGIN, MARGIN
+    x2 = x1 + (BOARD_COLS - 1) * S
+    y2 = y1 + (BOARD_ROWS - 1) * S
+    # 外框
+    for a, b, c, d in ((x1, y1, x2, y1), (x1, y2, x2, y2), (x1, y1, x1, y2), (x2, y1, x2, y2)):
+        _put_line(img, LINE_COLOR, a, b, c, d, 3)
+    # 横线
+    for r in range(BOARD_ROWS):
+        y = y1 + r * S
+        _put_line(img, LINE_COLOR, x1, y, x2, y, 2)
+    # 竖线（河界断开）
+    for c in range(BOARD_COLS):
+        x = x1 + c * S
+        if c == 0 or c == BOARD_COLS - 1:
+            _put_line(img, LINE_COLOR, x, y1, x, y2, 2)
+        else:
+            _put_line(img, LINE_COLOR, x, y1, x, y1 + 4 * S, 2)
+            _put_line(img, LINE_COLOR, x, y1 + 5 * S, x, y2, 2)
+    # 九宫斜线
+    for top in (0, 7):
+        _put_line(img, LINE_COLOR, x1 + 3 * S, y1 + top * S, x1 + 5 * S, y1 + (top + 2) * S, 2)
+        _put_line(img, LINE_COLOR, x1 + 5 * S, y1 + top * S, x1 + 3 * S, y1 + (top + 2) * S, 2)
+    return img
+
+
+def _render_piece_sprite(master, size, color):
+    """棋子圆盘：逐行填充横向线段，圆外像素保持透明。"""
+    rad = size * 0.42
+    d = int(math.ceil(rad)) * 2 + 2
+    c0 = d / 2.0
+    fill, outline = ('#FFF8DC', 'red') if color == 'r' else ('black', 'black')
+    img = tk.PhotoImage(master=master, width=d, height=d)
+    inner = rad - 2
+    for y in range(d):
+        dy = y + 0.5 - c0
+        if abs(dy) > rad:
+            continue
+        half = math.sqrt(rad * rad - dy * dy)
+        xa, xb = int(round(c0 - half)), int(round(c0 + half))
+        if xb > xa:
+            img.put(outline, to=(xa, y, xb, y + 1))
+        if abs(dy) <= inner:
+            half = math.sqrt(inner * inner - dy * dy)
+            xa, xb = int(round(c0 - half)), int(round(c0 + half))
+            if xb > xa:
+                img.put(fill, to=(xa, y, xb, y + 1))
+    return img
+
+
+def board_image(master, size=None):
+    size = size or SQUARE_SIZE
+    return _cache_get(_board_images, size, lambda: _render_board_image(master, size))
+
+
+def piece_sprite(master, color, size=None):
+    size = size or SQUARE_SIZE
+    return _cache_get(_piece_sprites, (size, color), lambda: _render_piece_sprite(master, size, color))
+
+
+def draw_board(canvas, piece_font=None, square_size=None, data=None):
+    """
+    绘制棋盘和棋子，支持动态缩放和居中；棋盘与棋子圆盘取自按尺寸缓存的图片。
+    square_size/data 缺省时使用模块级 SQUARE_SIZE/board_data（多窗口时各画布自带）。
+    """
+    global _default_font
+    S = square_size or SQUARE_SIZE
+    data = data or board_data
     canvas.delete('all')
 
     canvas_width = canvas.winfo_width()
     canvas_height = canvas.winfo_height()
 
-    board_width = (BOARD_COLS - 1) * SQUARE_SIZE + 2 * MARGIN
-    board_height = (BOARD_ROWS - 1) * SQUARE_SIZE + 2 * MARGIN
+    board_width = (BOARD_COLS - 1) * S + 2 * MARGIN
+    board_height = (BOARD_ROWS - 1) * S + 2 * MARGIN
 
     # 计算居中偏移
     offset_x = (canvas_width - board_width) // 2
     offset_y = (canvas_height - board_height) // 2
 
     # 动态调整字体大小
+    size = max(10, int(S * 0.44))
     if piece_font is None:
-        available_fonts = list(tkfont.families())
-        fam = next((f for f in PIECE_FONT_FAMILY_PREFERRED if f in available_fonts), available_fonts[0])
-        size = max(10, int(SQUARE_SIZE * 0.44))
-        piece_font = tkfont.Font(family=fam, size=size, weight='bold')
-    else:
-        size = max(10, int(SQUARE_SIZE * 0.44))
+        if _default_font is None:
+            _default_font = tkfont.Font(family=resolve_font_family(), size=size, weight='bold')
+        piece_font = _default_font
+    if int(piece_font.cget('size')) != size:
         piece_font.configure(size=size)
 
-    # 外框
     x1 = offset_x + MARGIN
     y1 = offset_y + MARGIN
-    x2 = x1 + (BOARD_COLS - 1) * SQUARE_SIZE
-    y2 = y1 + (BOARD_ROWS - 1) * SQUARE_SIZE
-    canvas.create_rectangle(x1, y1, x2, y2, outline='#8B4513', width=3)
-
-    # 横线
-    for r in range(BOARD_ROWS):
-        y = y1 + r * SQUARE_SIZE
-        canvas.create_line(x1, y, x2, y, fill='#8B4513', width=2)
-
-    # 竖线（河界断开）
-    for c in range(BOARD_COLS):
-        x = x1 + c * SQUARE_SIZE
-        if c == 0 or c == BOARD_COLS - 1:
-            canvas.create_line(x, y1, x, y2, fill='#8B4513', width=2)
-        else:
-            canvas.create_line(x, y1, x, y1 + 4 * SQUARE_SIZE, fill='#8B4513', width=2)
-            canvas.create_line(x, y1 + 5 * SQUARE_SIZE, x, y2, fill='#8B4513', width=2)
-
-    # 九宫斜线
-    canvas.create_line(x1 + 3 * SQUARE_SIZE, y1, x1 + 5 * SQUARE_SIZE, y1 + 2 * SQUARE_SIZE, fill='#8B4513', width=2)
-    canvas.create_line(x1 + 5 * SQUARE_SIZE, y1, x1 + 3 * SQUARE_SIZE, y1 + 2 * SQUARE_SIZE, fill='#8B4513', width=2)
-    canvas.create_line(x1 + 3 * SQUARE_SIZE, y1 + 7 * SQUARE_SIZE, x1 + 5 * SQUARE_SIZE, y1 + 9 * SQUARE_SIZE, fill='#8B4513', width=2)
-    canvas.create_line(x1 + 5 * SQUARE_SIZE, y1 + 7 * SQUARE_SIZE, x1 + 3 * SQUARE_SIZE, y1 + 9 * SQUARE_SIZE, fill='#8B4513', width=2)
+    board_img = board_image(canvas, S)
+    canvas.create_image(offset_x, offset_y, image=board_img, anchor='nw')
 
     # 楚河汉界
-    canvas.create_text(x1 + 2 * SQUARE_SIZE, y1 + 4.5 * SQUARE_SIZE, text='楚河', font=piece_font, fill='#8B0000')
-    canvas.create_text(x1 + 6 * SQUARE_SIZE, y1 + 4.5 * SQUARE_SIZE, text='汉界', font=piece_font, fill='#8B0000')
+    canvas.create_text(x1 + 2 * S, y1 + 4.5 * S, text='楚河', font=piece_font, fill=RIVER_COLOR)
+    canvas.create_text(x1 + 6 * S, y1 + 4.5 * S, text='汉界', font=piece_font, fill=RIVER_COLOR)
 
-    # 棋子
+    # 棋子：圆盘贴图 + 文字（Tk 无法把字形渲染进 PhotoImage，字仍用文本对象）
+    red_disc = piece_sprite(canvas, 'r', S)
+    black_disc = piece_sprite(canvas, 'b', S)
+    # 画布只记图片对象的 id：Python 侧没有引用时 Tk 就删掉图片、棋子变空白。
+    # 别的窗口缩放时可能把这几张挤出 LRU，所以画布自己留一份引用直到下次重画
+    canvas._images = (board_img, red_disc, black_disc)
     for r in range(BOARD_ROWS):
         for c in range(BOARD_COLS):
-            ch = board_data[r][c]
+            ch = data[r][c]
             if ch != '.':
                 name = PIECE_NAMES.get(ch, ch)
-                cx = x1 + c * SQUARE_SIZE
-                cy = y1 + r * SQUARE_SIZE
-                rad = SQUARE_SIZE * 0.42
+                cx = x1 + c * S
+                cy = y1 + r * S
                 if ch.isupper():  # 红子
-                    canvas.create_oval(cx - rad, cy - rad, cx + rad, cy + rad, fill='#FFF8DC', outline='red', width=2)
+                    canvas.create_image(cx, cy, image=red_disc)
                     canvas.create_text(cx, cy, text=name, font=piece_font, fill='red')
                 else:  # 黑子
-                    canvas.create_oval(cx - rad, cy - rad, cx + rad, cy + rad, fill='black', outline='black', width=2)
+                    canvas.create_image(cx, cy, image=black_disc)
                     canvas.create_text(cx, cy, text=name, font=piece_font, fill='white')
 
 
 if __name__ == '__main__':
     root = tk.Tk()
     root.title("象棋棋盘绘制示例")
-    canvas = tk.Canvas(root, bg='#DEB887')
+    canvas = tk.Canvas(root, bg=BOARD_BG)
     canvas.pack(padx=10, pady=8, fill=tk.BOTH, expand=True)
 
-    available_fonts = list(tkfont.families())
-    fam = next((f for f in PIECE_FONT_FAMILY_PREFERRED if f in available_fonts), available_fonts[0])
-    piece_font = tkfont.Font(family=fam, size=PIECE_FONT_SIZE, weight='bold')
+    piece_font = tkfont.Font(family=resolve_font_family(), size=PIECE_FONT_SIZE, weight='bold')
 
     def on_resize(event):
         global SQUARE_SIZE
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑二进制棋谱库（.xqdb，与界面无关，不依赖 tkinter）：
+- 每局一个定长局头 + 2 字节着法码（起点格、终点格各 1 字节，格号 = row*9+col）
+- 标签、注释、起始局面等文字统一进字符串表（去重，同一棋手名只存一次）
+- 文件末尾是字符串表与偏移索引；GameDB 用 mmap 打开，任意一局可随机读取，不解析其它局
+- 追加写（GameDBWriter）：新对局接在已有对局之后（覆盖旧表），最后重写字符串表、索引和文件头；
+  覆盖前旧表先另存一份并让文件头指向它，中途中断时文件头总指向一份完整的表，库保持完整
+文件布局（小端）：
+  文件头 _FILE_HEADER：magic "XQDB", 版本, 局数, 字符串数, 字符串表偏移, 索引偏移
+  对局  _GAME_HEADER：着法数, 变着数, 注释数, 标签数, 结果码, 保留, 起始局面串号
+        标签  n × (键串号 u32, 值串号 u32)
+        主线  n × u16 着法码
+        注释  n × (ply u16, 串号 u32)
+        变着  n × (pivot u16, 长度 u16, 长度 × u16 着法码)
+  字符串表：(n+1) × u32 偏移 + UTF-8 字节
+  索引：局数 × u64 对局偏移
+命令行：
+  python game_db.py import 库.xqdb 文件...    导入 PGN/XQF/CBR/CBL/JSON/TXT
+  python game_db.py export 库.xqdb 输出.pgn   导出为 PGN（或输出目录 → 每局一个文件）
+  python game_db.py info 库.xqdb
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import chess_rules as xr
+from game_record import GameRecord, RESULTS
+
+DB_MAGIC = b"XQDB"
+DB_VERSION = 1
+NO_STRING = 0xFFFFFFFF
+_FILE_HEADER = struct.Struct("<4sHHIIQQ")
+_GAME_HEADER = struct.Struct("<HHHHBBHI")
+_TAG = struct.Struct("<II")
+_COMMENT = struct.Struct("<HI")
+_VAR = struct.Struct("<HH")
+# 结果码：RESULTS 的下标 + 1；0 = 未记录
+_RESULT_CODES = {res: i + 1 for i, res in enumerate(RESULTS)}
+
+
+class GameDBError(ValueError):
+    pass
+
+
+class IllegalMoveError(GameDBError):
+    """复盘时走不出的着法；where = "主线" / "变着 n "，ply 从 1 开始"""
+
+    def __init__(self, where: str, ply: int, san: str):
+        super().__init__(f"{where}第 {ply} 步无法解析：{san}")
+        self.where = where
+        self.ply = ply
+        self.san = san
+
+
+# ======================= 编码 =======================
+def encode_move(mv: xr.Move) -> int:
+    (fr, fc), (tr, tc) = mv.from_sq, mv.to_sq
+    return (fr * 9 + fc) << 8 | (tr * 9 + tc)
+
+
+def decode_move(code: int) -> xr.Move:
+    return xr.Move(divmod(code >> 8, 9), divmod(code & 0xFF, 9))
+
+
+@dataclass
+class EncodedGame:
+    """已解析成着法码、但字符串尚未入表的对局；可跨进程传递（批量导入时由子进程生成）"""
+    tags: List[Tuple[str, str]] = field(default_factory=list)
+    moves: List[int] = field(default_factory=list)
+    comments: List[Tuple[int, str]] = field(default_factory=list)
+    variations: List[Tuple[int, List[int]]] = field(default_factory=list)
+    result: int = 0
+    start_fen: Optional[str] = None
+
+
+def _start_board(start_fen: Optional[str]) -> xr.Board:
+    board = xr.Board()
+    if start_fen:
+        board.set_fen(start_fen)
+    return board
+
+
+def _parse_line(board: xr.Board, sans: List[str], where: str) -> List[int]:
+    codes = []
+    for ply, san in enumerate(sans, start=1):
+        mv = board.parse_chinese(san)
+        if mv is None:
+            raise IllegalMoveError(where, ply, san)
+        codes.append(encode_move(mv))
+        board.make_move(mv)
+    return codes
+
+
+def encode_game(rec: GameRecord) -> EncodedGame:
+    """GameRecord（中文记谱）→ EncodedGame；逐步在棋盘上复盘校验，非法着法抛 GameDBError"""
+    enc = EncodedGame(tags=[(k, str(v)) for k, v in rec.headers.items() if k != "Result"],
+                      result=_RESULT_CODES.get(rec.headers.get("Result", ""), 0),
+                      start_fen=rec.start_fen)
+    board = _start_board(rec.start_fen)
+    enc.moves = _parse_line(board, rec.moves, "主线")
+    enc.comments = sorted((ply, text) for ply, text in rec.comments.items() if text)
+    for i, (pivot, sans) in enumerate(rec.variations, start=1):
+        while len(board.history) > pivot - 1:
+            board.undo_move()
+        # 上一条变着的分叉点更早时，沿主线前进到本条的分叉点
+        for code in enc.moves[len(board.history):pivot - 1]:
+            board.make_move(decode_move(code))
+        enc.variations.append((pivot, _parse_line(board, sans, f"变着 {i} ")))
+        for _ in sans:
+            board.undo_move()
+    return enc
+
+
+def _moves_to_san(board: xr.Board, codes) -> List[str]:
+    sans = []
+    for code in codes:
+        mv = decode_move(code)
+        if board.piece_at(mv.from_sq) is None:
+            raise GameDBError(f"着法码 {code:#06x} 起点没有棋子")
+        sans.append(board.move_to_chinese(mv))
+        board.make_move(mv)
+    return sans
+
+
+def decode_game(enc: EncodedGame) -> GameRecord:
+    """EncodedGame → GameRecord：沿主线走一趟生成中文记谱（只走子，不生成合法着法），变着在分叉点顺带走一遍"""
+    rec = GameRecord(headers=dict(enc.tags), comments=dict(enc.comments), start_fen=enc.start_fen)
+    if enc.result:
+        rec.headers["Result"] = RESULTS[enc.result - 1]
+    board = _start_board(enc.start_fen)
+    by_pivot: Dict[int, List[List[int]]] = {}
+    for pivot, codes in enc.variations:
+        by_pivot.setdefault(pivot, []).append(codes)
+    # 沿主线复盘；到每个分叉点时把该处的变着走一遍再退回
+    for ply in range(1, len(enc.moves) + 2):
+        for codes in by_pivot.pop(ply, []):
+            sans = _moves_to_san(board, codes)
+            for _ in sans:
+                board.undo_move()
+            rec.variations.append((ply, sans))
+        if ply <= len(enc.moves):
+            rec.moves.extend(_moves_to_san(board, enc.moves[ply - 1:ply]))
+    return rec
+
+
+# ======================= 读取 =======================
+class GameDB:
+    """with GameDB(path) as db: len(db); db.headers(i); db.move_codes(i); db[i] -> GameRecord"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = None
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            if self._mm[:4] != DB_MAGIC:
+                raise GameDBError("不是 xqdb 棋谱库")
+            _, ver, _, n_games, n_strings, str_off, idx_off = _FILE_HEADER.unpack_from(self._mm, 0)
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise e if isinstance(e, GameDBError) else GameDBError(f"棋谱库文件头损坏：{e}")
+        if ver > DB_VERSION:
+            self.close()
+            raise GameDBError(f"不支持的棋谱库版本：{ver}")
+        self._n = n_games
+        self._n_strings = n_strings
+        self._str_off = str_off
+        self._str_data = str_off + 4 * (n_strings + 1)
+        self._idx_off = idx_off
+        self._strings: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._n
+
+    def string(self, sid: int) -> Optional[str]:
+        if sid == NO_STRING:
+            return None
+        s = self._strings.get(sid)
+        if s is None:
+            a, b = struct.unpack_from("<II", self._mm, self._str_off + 4 * sid)
+            s = self._strings[sid] = self._mm[self._str_data + a:self._str_data + b].decode("utf-8")
+        return s
+
+    def strings(self) -> List[str]:
+        return [self.string(i) for i in range(self._n_strings)]
+
+    def _game_offset(self, i: int) -> int:
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return struct.unpack_from("<Q", self._mm, self._idx_off + 8 * i)[0]
+
+    def _game_header(self, i: int):
+        off = self._game_offset(i)
+        return off, _GAME_HEADER.unpack_from(self._mm, off)
+
+    def headers(self, i: int) -> Dict[str, str]:
+        """只读标签与结果，不碰着法"""
+        off, (n_moves, n_vars, n_comm, n_tags, result, _, _, _) = self._game_header(i)
+        off += _GAME_HEADER.size
+        headers = {}
+        for k, v in _TAG.iter_unpack(self._mm[off:off + n_tags * _TAG.size]):
+            headers[self.string(k)] = self.string(v)
+        if result:
+            headers["Result"] = RESULTS[result - 1]
+        return headers
+
+    def result(self, i: int) -> Optional[str]:
+        """只读局头里的结果码（开局统计逐局调用，比 headers 省去标签解码）"""
+        code = self._game_header(i)[1][4]
+        return RESULTS[code - 1] if code else None
+
+    def start_fen(self, i: int) -> Optional[str]:
+        _, h = self._game_header(i)
+        return self.string(h[7])
+
+    def move_codes(self, i: int) -> List[int]:
+        """主线着法码（不复盘，供位置索引等批量处理使用）"""
+        off, (n_moves, _, _, n_tags, _, _, _, _) = self._game_header(i)
+        off += _GAME_HEADER.size + n_tags * _TAG.size
+        return list(struct.unpack_from(f"<{n_moves}H", self._mm, off))
+
+    def fingerprint(self, n: Optional[int] = None) -> int:
+        """
+        前 n 局（缺省全部）的 64 位指纹：偏移索引的前 n 项 + 第 n 局的局头、起始局面与主线。
+        库只追加新局时不变；重建或换成另一个库后几乎必然不同（派生的索引据此判断是否作废）。0 局为 0
+        """
+        n = self._n if n is None else n
+        if n == 0:
+            return 0
+        if not 0 < n <= self._n:
+            raise IndexError(n)
+        h = hashlib.blake2b(self._mm[self._idx_off:self._idx_off + 8 * n], digest_size=8)
+        off, (n_moves, _, _, n_tags, _, _, _, fen_sid) = self._game_header(n - 1)
+        h.update(self._mm[off:off + _GAME_HEADER.size + n_tags * _TAG.size + 2 * n_moves])
+        h.update((self.string(fen_sid) or "").encode("utf-8"))
+        return int.from_bytes(h.digest(), "little")
+
+    def encoded(self, i: int) -> EncodedGame:
+        off, (n_moves, n_vars, n_comm, n_tags, result, _, _, fen_sid) = self._game_header(i)
+        mm = self._mm
+        off += _GAME_HEADER.size
+        enc = EncodedGame(result=result, start_fen=self.string(fen_sid))
+        for k, v in _TAG.iter_unpack(mm[off:off + n_tags * _TAG.size]):
+            enc.tags.append((self.string(k), self.string(v)))
+        off += n_tags * _TAG.size
+        enc.moves = list(struct.unpack_from(f"<{n_moves}H", mm, off))
+        off += 2 * n_moves
+        for ply, sid in _COMMENT.iter_unpack(mm[off:off + n_comm * _COMMENT.size]):
+            enc.comments.append((ply, self.string(sid)))
+        off += n_comm * _COMMENT.size
+        for _ in range(n_vars):
+            pivot, n = _VAR.unpack_from(mm, off)
+            off += _VAR.size
+            enc.variations.append((pivot, list(struct.unpack_from(f"<{n}H", mm, off))))
+            off += 2 * n
+        return enc
+
+    def __getitem__(self, i: int) -> GameRecord:
+        return decode_game(self.encoded(i))
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        for i in range(self._n):
+            yield self[i]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================= 写出 =======================
+def _has_committed_header(path: str) -> bool:
+    """文件存在且文件头不是全 0（全 0 = 建库后还没提交过就中断了，当作没有这个库）"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_FILE_HEADER.size)
+    except FileNotFoundError:
+        return False
+    return bool(head.strip(b"\0"))
+
+
+class GameDBWriter:
+    """
+    with GameDBWriter(path) as w: w.add(rec) / w.add_encoded(enc)；已有库则追加。
+    keep：重新打开时只保留前 keep 局（断点续传时丢掉最后一次记账之后写入的对局）。
+    checkpoint()：把当前内容提交到文件头；之后中断也不会丢失已提交的对局。
+    新对局先攒在内存里（超过 BUFFER_BYTES 自动提交一次），提交时接在已有对局之后、覆盖旧表，
+    文件里不留旧表的空洞。
+    """
+    BUFFER_BYTES = 32 << 20
+
+    def __init__(self, path: str, keep: Optional[int] = None):
+        self.path = path
+        self._strings: List[str] = []
+        self._sid: Dict[str, int] = {}
+        self._index: List[int] = []
+        self._pending: List[bytes] = []
+        self._pending_size = 0
+        self._committed = None          # 已提交的 (局数, 字符串数, 字符串表偏移, 索引偏移, 表末尾)
+        if _has_committed_header(path):
+            with GameDB(path) as db:
+                for s in db.strings():
+                    self._intern(s)
+                n = len(db) if keep is None else min(keep, len(db))
+                self._index = [db._game_offset(i) for i in range(n)]
+                self._committed = (len(db), db._n_strings, db._str_off, db._idx_off,
+                                   db._idx_off + 8 * len(db))
+            self._f = open(path, "r+b")
+            # 丢掉上次提交之后的残留数据（如提交到一半时另存的旧表）
+            self._f.truncate(self._committed[4])
+            self._data_end = self._committed[2]      # 新对局从旧表的位置写起
+            self._dirty = n < self._committed[0]
+        else:
+            # 新库（或从未提交过的残留文件）：立即提交一个空库，第一次提交前中断也能续写
+            self._f = open(path, "w+b")
+            self._f.write(bytes(_FILE_HEADER.size))
+            self._data_end = _FILE_HEADER.size
+            self._dirty = True
+            self.checkpoint()
+        self.added = 0
+
+    def _intern(self, s: Optional[str]) -> int:
+        if s is None:
+            return NO_STRING
+        sid = self._sid.get(s)
+        if sid is None:
+            sid = self._sid[s] = len(self._strings)
+            self._strings.append(s)
+        return sid
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def add(self, rec: GameRecord) -> int:
+        return self.add_encoded(encode_game(rec))
+
+    def add_encoded(self, enc: EncodedGame) -> int:
+        if len(enc.moves) > 0xFFFF or len(enc.variations) > 0xFFFF:
+            raise GameDBError("对局过长")
+        parts = [_GAME_HEADER.pack(len(enc.moves), len(enc.variations), len(enc.comments),
+                                   len(enc.tags), enc.result, 0, 0, self._intern(enc.start_fen))]
+        parts.extend(_TAG.pack(self._intern(k), self._intern(v)) for k, v in enc.tags)
+        parts.append(struct.pack(f"<{len(enc.moves)}H", *enc.moves))
+        parts.extend(_COMMENT.pack(ply, self._intern(text)) for ply, text in enc.comments)
+        for pivot, codes in enc.variations:
+            parts.append(_VAR.pack(pivot, len(codes)))
+            parts.append(struct.pack(f"<{len(codes)}H", *codes))
+        blob = b"".join(parts)
+        self._index.append(self._data_end + self._pending_size)
+        self._pending.append(blob)
+        self._pending_size += len(blob)
+        self._dirty = True
+        self.added += 1
+        if self._pending_size >= self.BUFFER_BYTES:
+            self.checkpoint()
+        return len(self._index) - 1
+
+    def _write_header(self, n_games: int, n_strings: int, str_off: int, idx_off: int):
+        f = self._f
+        f.flush()
+        os.fsync(f.fileno())
+        # 文件头最后写：之前中断时旧文件头仍然有效
+        f.seek(0)
+        f.write(_FILE_HEADER.pack(DB_MAGIC, DB_VERSION, 0, n_games, n_strings, str_off, idx_off))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def checkpoint(self):
+        """
+        写出缓冲的对局、字符串表与索引并更新文件头。新对局与新表要覆盖旧表所在的位置，
+        所以先把旧表另存到这次写入范围之外、让文件头指向这份拷贝，再写新内容；
+        任何时刻中断，文件头都指向一份完整的表。代价是每次提交把表多写一遍
+        """
+        if not self._dirty:
+            return
+        f = self._f
+        blobs = [s.encode("utf-8") for s in self._strings]
+        offsets = [0]
+        for b in blobs:
+            offsets.append(offsets[-1] + len(b))
+        tables = [struct.pack(f"<{len(offsets)}I", *offsets), b"".join(blobs)]
+        idx_rel = sum(len(t) for t in tables)
+        tables.append(struct.pack(f"<{len(self._index)}Q", *self._index))
+        str_off = self._data_end + self._pending_size
+        end = str_off + sum(len(t) for t in tables)
+
+        if self._committed is not None:
+            n_games, n_strings, old_str, old_idx, old_end = self._committed
+            copy_off = max(old_end, end)
+            f.seek(old_str)
+            old_tables = f.read(old_end - old_str)
+            f.seek(copy_off)
+            f.write(old_tables)
+            self._write_header(n_games, n_strings, copy_off, copy_off + old_idx - old_str)
+
+        f.seek(self._data_end)
+        f.write(b"".join(self._pending))
+        f.write(b"".join(tables))
+        self._write_header(len(self._index), len(self._strings), str_off, str_off + idx_rel)
+        f.truncate(end)
+        self._committed = (len(self._index), len(self._strings), str_off, str_off + idx_rel, end)
+        self._data_end = str_off
+        self._pending.clear()
+        self._pending_size = 0
+        self._dirty = False
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.checkpoint()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================= 命令行 =======================
+def _main(argv: List[str]) -> int:
+    import game_io
+
+    if len(argv) >= 3 and argv[0] == "import":
+        n_ok = n_bad = 0
+        with GameDBWriter(argv[1]) as w:
+            for path in argv[2:]:
+                try:
+                    for rec in game_io.iter_games(path):
+                        w.add(rec)
+                        n_ok += 1
+                except (OSError, ValueError) as e:
+                    n_bad += 1
+                    print(f"{path}: {e}", file=sys.stderr)
+        print(f"导入 {n_ok} 局，失败 {n_bad} 个文件")
+        return 1 if n_bad else 0
+    if len(argv) == 3 and argv[0] == "export":
+        with GameDB(argv[1]) as db:
+            out = argv[2]
+            if os.path.isdir(out):
+                for i in range(len(db)):
+                    game_io.write_game(os.path.join(out, f"{i + 1:06d}.pgn"), db[i])
+            else:
+                game_io.write_games(out, db)
+            print(f"导出 {len(db)} 局")
+        return 0
+    if len(argv) == 2 and argv[0] == "info":
+        with GameDB(argv[1]) as db:
+            print(f"{len(db)} 局，{db._n_strings} 个字符串，{os.path.getsize(argv[1])} 字节")
+        return 0
+    print(__doc__.split("命令行：", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+按扩展名分派的棋谱读写入口（与界面无关，不依赖 tkinter）：
+- read_game(path, index=0) -> GameRecord      单局读取（多局文件取第 index 局）
+- iter_games(path)                            逐局读取（PGN / CBL / xqdb 为多局，其余为单局）
+- write_game(path, rec) / write_games(path, recs)
+支持：.json（本程序格式）、.txt（步号文本）、.pgn、.xqf、.cbr、.cbl、.xqdb（GameDBWriter 追加写）
+旧版本曾把 .xqf/.cbr 存成 JSON，读取时按文件头自动识别。
+"""
+
+import json
+import os
+import re
+from typing import Iterable, Iterator
+
+import cbr_io
+import game_db
+import pgn_io
+import xqf_io
+from game_record import GameRecord, flat_to_pairs, headers_to_meta, record_from_parts
+
+MULTI_GAME_EXTS = ('.pgn', '.cbl', '.xqdb')
+READ_EXTS = ('.json', '.txt', '.pgn', '.xqf', '.cbr', '.cbl', '.xqdb')
+
+
+def _ext(path: str) -> str:
+    return os.path.splitext(path)[1].lower()
+
+
+# ======================= JSON / TXT =======================
+def read_json_game(path: str) -> GameRecord:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    meta = data.get('meta') or {"title": "", "author": "", "remark": ""}
+    comments = {int(k): v for k, v in data.get('comments', {}).items()}
+    return record_from_parts(data.get('moves', []), meta, comments, None, data.get('fen'))
+
+
+def write_json_game(path: str, rec: GameRecord):
+    data = {
+        "moves": flat_to_pairs(rec.moves, rec.first_side),    # 仅主线
+        "meta": headers_to_meta(rec.headers),
+        "comments": {str(k): v for k, v in rec.comments.items()},
+    }
+    if rec.start_fen:
+        data["fen"] = rec.start_fen
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def read_txt_game(path: str) -> GameRecord:
+    """每回合两行（“1.  红着” + 黑着），也接受一行 “1. 红着 黑着”"""
+    moves = []
+    with open(path, 'r', encoding='utf-8') as f:
+        raw_lines = [ln.rstrip("\n") for ln in f]
+    i = 0
+    n = len(raw_lines)
+    while i < n:
+        line = raw_lines[i].strip()
+        if not line:
+            i += 1; continue
+        m = re.match(r'^(\d+)\.\s+(.*)$', line)
+        if m:
+            rmove = (m.group(2) or "").strip()
+            bmove = ""
+            j = i + 1
+            while j < n and raw_lines[j].strip() == "":
+                j += 1
+            if j < n:
+                nxt = raw_lines[j].strip()
+                if not re.match(r'^\d+\.\s+', nxt):
+                    bmove = nxt
+                    i = j + 1
+                else:
+                    i = i + 1
+            else:
+                i = i + 1
+            moves.append([rmove, bmove])
+            continue
+        parts = line.split('.', 1)
+        rest = parts[1].strip() if len(parts) == 2 else line
+        tokens = [t for t in rest.split() if t]
+        if tokens:
+            if len(tokens) == 1: moves.append([tokens[0], ""])
+            else: moves.append([tokens[0], tokens[1]])
+        i += 1
+    meta = {"title": os.path.basename(path), "author": "", "remark": ""}
+    return record_from_parts(moves, meta, {})
+
+
+def write_txt_game(path: str, rec: GameRecord):
+    with open(path, 'w', encoding='utf-8') as f:
+        for idx, (rmove, bmove) in enumerate(rec.move_pairs(), start=1):
+            r = rmove or ""
+            b = bmove or ""
+            prefix = f"{idx}.  "
+            f.write(f"{prefix}{r}\n")
+            f.write(f"{' ' * len(prefix)}{b}\n")
+
+
+# ======================= 分派 =======================
+def iter_games(path: str) -> Iterator[GameRecord]:
+    ext = _ext(path)
+    if ext == '.pgn':
+        yield from pgn_io.iter_pgn_games(path)
+    elif ext == '.cbl':
+        with cbr_io.CblLibrary(path) as lib:
+            yield from lib
+    elif ext == '.xqdb':
+        with game_db.GameDB(path) as db:
+            yield from db
+    else:
+        yield read_game(path)
+
+
+def read_game(path: str, index: int = 0) -> GameRecord:
+    ext = _ext(path)
+    if ext in MULTI_GAME_EXTS:
+        for i, rec in enumerate(iter_games(path)):
+            if i == index:
+                return rec
+        raise ValueError(f"文件中不足 {index + 1} 局")
+    if ext == '.xqf' and xqf_io.is_xqf_file(path):
+        return xqf_io.read_xqf(path)
+    if ext == '.cbr' and cbr_io.is_cbr_file(path):
+        return cbr_io.read_cbr(path)
+    if ext == '.txt':
+        return read_txt_game(path)
+    # .json 以及旧版本存成 JSON 的 .xqf/.cbr、未知扩展名
+    return read_json_game(path)
+
+
+def write_game(path: str, rec: GameRecord):
+    """单局写出；.pgn / .xqdb 覆盖成只含这一局，追加请用 write_games(mode='a')"""
+    write_games(path, [rec])
+
+
+def write_games(path: str, records: Iterable[GameRecord], mode: str = 'w') -> int:
+    ext = _ext(path)
+    if ext == '.pgn':
+        return pgn_io.write_pgn(path, records, mode)
+    if ext == '.xqdb':
+        if mode == 'w' and os.path.exists(path):
+            os.remove(path)
+        with game_db.GameDBWriter(path) as w:
+            for rec in records:
+                w.add(rec)
+            return w.added
+    if ext == '.cbl':
+        return cbr_io.write_cbl(path, records)
+    n = 0
+    for rec in records:
+        if n:
+            raise ValueError(f"{ext or '该'}格式只能保存一局")
+        if ext == '.xqf':
+            xqf_io.write_xqf(path, rec)
+        elif ext == '.cbr':
+            cbr_io.write_cbr(path, rec)
+        elif ext == '.txt':
+            write_txt_game(path, rec)
+        else:
+            write_json_game(path, rec)
+        n += 1
+    return n
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+棋谱记录（与界面无关，不依赖 tkinter）：各种文件格式读写共用的数据结构。
+- moves：主线中文记谱，按半步顺序的扁平列表
+- comments：{ply: 注释}，ply 从 1 开始（第 ply 步之后的注释）；0 = 开局前的总注释
+- variations：[(pivot_ply, san_moves)]，语义与界面的 VariationManager 相同：
+  应用变着 = 主线[:pivot-1] + san_moves（嵌套变着已展开成从 pivot 起的完整序列）
+- headers：文件头标签（PGN 标签名，如 Event / Red / Black / Result）
+- start_fen：起始局面（Board.board_fen() 格式）；None 表示标准开局、红先
+界面里的 metadata（title/author/remark）与 headers 之间用 headers_to_meta / meta_to_headers 转换。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# 界面 metadata 键 <-> 标签名
+META_TAGS = {"title": "Event", "author": "Annotator", "remark": "Remark"}
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+START_FEN = "rnbakabnr/9/1c5c1/p1p1p1p1p/9/9/P1P1P1P1P/1C5C1/9/RNBAKABNR r"   # 同 chess_rules.START_FEN
+
+
+@dataclass
+class GameRecord:
+    headers: Dict[str, str] = field(default_factory=dict)
+    moves: List[str] = field(default_factory=list)
+    comments: Dict[int, str] = field(default_factory=dict)
+    variations: List[Tuple[int, List[str]]] = field(default_factory=list)
+    start_fen: Optional[str] = None
+
+    @property
+    def first_side(self) -> str:
+        if self.start_fen and self.start_fen.split()[1:2] == ['b']:
+            return 'b'
+        return 'r'
+
+    @property
+    def result(self) -> str:
+        res = self.headers.get("Result", "*")
+        return res if res in RESULTS else "*"
+
+    def move_pairs(self) -> List[List[str]]:
+        """主线 → 界面的 [[红, 黑], ...] 结构"""
+        return flat_to_pairs(self.moves, self.first_side)
+
+
+def pairs_to_flat(pairs) -> List[str]:
+    flat = []
+    for rmove, bmove in pairs:
+        if rmove: flat.append(rmove)
+        if bmove: flat.append(bmove)
+    return flat
+
+
+def flat_to_pairs(flat: List[str], first_side: str = 'r') -> List[List[str]]:
+    pairs = []
+    it = iter(flat)
+    if first_side == 'b' and flat:
+        pairs.append(["", next(it)])
+    for r in it:
+        pairs.append([r, next(it, "")])
+    return pairs
+
+
+def headers_to_meta(headers: Dict[str, str], default_title: str = "") -> Dict[str, str]:
+    meta = {k: headers.get(tag, "") for k, tag in META_TAGS.items()}
+    if not meta["title"]:
+        meta["title"] = default_title
+    for tag, val in headers.items():
+        if tag not in META_TAGS.values():
+            meta[tag] = val
+    return meta
+
+
+def meta_to_headers(meta: Dict[str, str]) -> Dict[str, str]:
+    headers = {}
+    for k, tag in META_TAGS.items():
+        if meta.get(k):
+            headers[tag] = meta[k]
+    for k, val in meta.items():
+        # 额外标签按原样保存（首字母大写的键来自文件头）
+        if k not in META_TAGS and k[:1].isupper() and isinstance(val, str):
+            headers[k] = val
+    return headers
+
+
+def normalize_fen(fen: Optional[str]) -> Optional[str]:
+    """标准 FEN（红方记作 w，带计数字段）→ board_fen() 格式；标准开局红先返回 None"""
+    if not fen:
+        return None
+    parts = fen.split()
+    side = 'b' if len(parts) > 1 and parts[1].lower() == 'b' else 'r'
+    fen = f"{parts[0]} {side}"
+    return None if fen == START_FEN else fen
+
+
+def record_from_parts(pairs, meta: Dict[str, str], comments: Dict[int, str],
+                      variations: Optional[Dict[int, list]] = None,
+                      start_fen: Optional[str] = None) -> GameRecord:
+    """由界面数据（moves_list / metadata / comments / VariationManager.variations）组装记录"""
+    rec = GameRecord(headers=meta_to_headers(meta), moves=pairs_to_flat(pairs),
+                     comments={int(k): v for k, v in comments.items() if v},
+                     start_fen=normalize_fen(start_fen))
+    for pivot in sorted(variations or {}):
+        for v in variations[pivot]:
+            rec.variations.append((pivot, list(v.san_moves)))
+    return rec
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+整局变换（与界面无关，不依赖 tkinter）：左右镜像 / 红黑对调作用于整盘棋谱——起始局面、主线、变着，
+注释按步号原样保留——而不是只变换当前局面。
+- 着法码（game_db 的 2 字节码）按格号查表重映射，起始局面逐格重映射：代价与步数成正比，
+  不生成合法着法、不复盘校验
+- 中文记谱最后用 game_db.decode_game 一趟重新生成（只走子）
+- KINDS：
+    mirror  左右镜像：第 c 列 ↔ 第 8-c 列
+    swap    红黑对调：棋盘转 180° 且双方互换颜色（先走方随之互换）；Red*/Black* 标签与胜负结果一并对调
+- transform_encoded(enc, kind)：EncodedGame → EncodedGame（批量处理 .xqdb 时只走这一步）
+- transform_record(rec, kind)：GameRecord → GameRecord（先 encode_game 解析一次中文记谱）
+- mirror_normalized(enc)：镜像归一——主线第一步不在中路的着法统一落在右翼（红方视角，如“炮二平五”），
+  互为镜像的同一开局只剩一种写法；已在右翼的原样返回
+- transform_file(src, dst, kind)：整库 / 整个文件转换；kind = "normalize" 时做镜像归一
+命令行：
+  python game_transform.py mirror|swap|normalize 源 目标    （源、目标都是 .xqdb 时只改着法码，不经中文记谱）
+"""
+
+import sys
+import time
+from typing import Iterator, List, Optional
+
+import chess_rules as xr
+import game_db
+import game_io
+from game_record import GameRecord, RESULTS, normalize_fen
+
+_N = xr.ROWS * xr.COLS
+# 各变换的格号映射与是否互换颜色
+KINDS = {
+    "mirror": ([r * xr.COLS + xr.COLS - 1 - c for r in range(xr.ROWS) for c in range(xr.COLS)], False),
+    "swap": ([_N - 1 - i for i in range(_N)], True),
+}
+_SWAP_CODE = [0] + [code + 7 if code <= 7 else code - 7 for code in range(1, 15)]   # 棋子码红黑互换
+_SWAP_RESULT = {RESULTS.index("1-0") + 1: RESULTS.index("0-1") + 1,
+                RESULTS.index("0-1") + 1: RESULTS.index("1-0") + 1}
+
+
+def _kind(kind: str):
+    try:
+        return KINDS[kind]
+    except KeyError:
+        raise ValueError(f"未知变换：{kind}（可选 {', '.join(KINDS)}）") from None
+
+
+def code_table(kind: str) -> List[int]:
+    """着法码 → 变换后的着法码（65536 项查表；起点、终点各 1 字节）"""
+    sq_map, _ = _kind(kind)
+    table = list(range(1 << 16))
+    for fr in range(_N):
+        hi = sq_map[fr] << 8
+        for to in range(_N):
+            table[fr << 8 | to] = hi | sq_map[to]
+    return table
+
+
+_TABLES = {}
+
+
+def _table(kind: str) -> List[int]:
+    table = _TABLES.get(kind)
+    if table is None:
+        table = _TABLES[kind] = code_table(kind)
+    return table
+
+
+def transform_fen(fen: Optional[str], kind: str) -> Optional[str]:
+    """起始局面变换（None = 标准开局红先）；结果按 normalize_fen 规范，标准开局红先仍为 None"""
+    sq_map, swap = _kind(kind)
+    pos = xr.Position.from_fen(fen or xr.START_FEN)
+    cells = bytearray(_N)
+    for i, code in enumerate(pos.cells):
+        if code:
+            cells[sq_map[i]] = _SWAP_CODE[code] if swap else code
+    side = ('b' if pos.side == 'r' else 'r') if swap else pos.side
+    return normalize_fen(xr.Position(bytes(cells), side).fen())
+
+
+def _swap_tag(key: str) -> str:
+    if key.startswith("Red"):
+        return "Black" + key[3:]
+    if key.startswith("Black"):
+        return "Red" + key[5:]
+    return key
+
+
+def transform_encoded(enc: game_db.EncodedGame, kind: str) -> game_db.EncodedGame:
+    """着法码与起始局面重映射；注释按步号不变"""
+    _, swap = _kind(kind)
+    table = _table(kind)
+    return game_db.EncodedGame(
+        tags=[(_swap_tag(k), v) for k, v in enc.tags] if swap else list(enc.tags),
+        moves=[table[code] for code in enc.moves],
+        comments=list(enc.comments),
+        variations=[(pivot, [table[code] for code in codes]) for pivot, codes in enc.variations],
+        result=_SWAP_RESULT.get(enc.result, enc.result) if swap else enc.result,
+        start_fen=transform_fen(enc.start_fen, kind))
+
+
+def transform_record(rec: GameRecord, kind: str) -> GameRecord:
+    """中文记谱解析一次成着法码，重映射后一趟重新生成记谱；记谱走不通时抛 game_db.GameDBError"""
+    return game_db.decode_game(transform_encoded(game_db.encode_game(rec), kind))
+
+
+def _needs_mirror(codes: List[int]) -> bool:
+    """主线第一步不在中路的着法：起点（起点在中路时看终点）在左翼（第 0~3 列）就要镜像"""
+    center = xr.COLS // 2
+    for code in codes:
+        for sq in (code >> 8, code & 0xFF):
+            if sq % xr.COLS != center:
+                return sq % xr.COLS < center
+    return False
+
+
+def mirror_normalized(enc: game_db.EncodedGame) -> game_db.EncodedGame:
+    return transform_encoded(enc, "mirror") if _needs_mirror(enc.moves) else enc
+
+
+def _encoded_games(path: str) -> Iterator[game_db.EncodedGame]:
+    if path.lower().endswith(".xqdb"):
+        with game_db.GameDB(path) as db:
+            for i in range(len(db)):
+                yield db.encoded(i)
+    else:
+        for rec in game_io.iter_games(path):
+            yield game_db.encode_game(rec)
+
+
+def transform_file(src: str, dst: str, kind: str) -> int:
+    """整库 / 整个文件转换，返回局数；目标是 .xqdb 时直接写着法码（追加到已有库）"""
+    convert = mirror_normalized if kind == "normalize" else (lambda enc: transform_encoded(enc, kind))
+    games = (convert(enc) for enc in _encoded_games(src))
+    if dst.lower().endswith(".xqdb"):
+        n = 0
+        with game_db.GameDBWriter(dst) as w:
+            for enc in games:
+                w.add_encoded(enc)
+                n += 1
+        return n
+    return game_io.write_games(dst, (game_db.decode_game(enc) for enc in games))
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) == 3 and (argv[0] in KINDS or argv[0] == "normalize"):
+        t0 = time.perf_counter()
+        n = transform_file(argv[1], argv[2], argv[0])
+        print(f"{n} 局，用时 {time.perf_counter() - t0:.2f} 秒")
+        return 0
+    print(__doc__.split("命令行：", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
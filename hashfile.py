@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+按 64 位哈希排序的定长记录文件（局面索引 / 开局统计 / 开局库共用，与界面无关）：
+- write_sorted(...)：外部排序写出。记录先攒成若干有序段落盘，再用 heapq.merge 归并，
+  内存占用与总记录数无关；可同时并入一个已有的有序文件（增量重建），键相同的记录可合并
+- SortedHashFile：mmap 打开，按首字段（哈希）二分查找，打开本身不读任何记录
+文件布局（小端）：
+  文件头 HEADER：magic(4), 版本 u16, 记录长度 u16, 记录数 u64, 附加值 u64（由调用方定义，如“已收录的局数”），
+               来源指纹 u64（由调用方定义，如 game_db.GameDB.fingerprint，0 = 未记录）
+  版本 1 的文件头没有来源指纹（短 8 字节），仍可读，来源指纹按 0 处理
+  之后是按记录元组升序排列的定长记录，第一个字段必须是 u64 哈希（格式以 "<Q" 开头）
+"""
+
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+HEADER = struct.Struct("<4sHHQQQ")
+_HEADER_V1 = struct.Struct("<4sHHQQ")
+FILE_VERSION = 2
+RUN_SIZE = 1 << 20        # 每个有序段的记录数
+
+
+class HashFileError(ValueError):
+    pass
+
+
+class SortedHashFile:
+    """with SortedHashFile(path, magic, record) as f: f.lookup(h) -> [记录元组, ...]"""
+
+    def __init__(self, path: str, magic: bytes, record: struct.Struct):
+        self.path = path
+        self.record = record
+        self._f = open(path, "rb")
+        self._mm = None
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            m, ver, size, count, extra = _HEADER_V1.unpack_from(self._mm, 0)
+            source = HEADER.unpack_from(self._mm, 0)[5] if ver >= 2 else 0
+        except (ValueError, struct.error):
+            self.close()
+            raise HashFileError(f"文件头损坏：{path}")
+        if m != magic or size != record.size or ver > FILE_VERSION:
+            self.close()
+            raise HashFileError(f"文件类型或版本不符：{path}")
+        self._base = HEADER.size if ver >= 2 else _HEADER_V1.size
+        if self._base + count * size > len(self._mm):
+            self.close()
+            raise HashFileError(f"文件被截断：{path}")
+        self.count = count
+        self.extra = extra
+        self.source = source
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> tuple:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.record.unpack_from(self._mm, self._base + i * self.record.size)
+
+    def _key(self, i: int) -> int:
+        return struct.unpack_from("<Q", self._mm, self._base + i * self.record.size)[0]
+
+    def lower_bound(self, h: int) -> int:
+        lo, hi = 0, self.count
+        key = self._key
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if key(mid) < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, h: int) -> List[tuple]:
+        i = self.lower_bound(h)
+        out = []
+        while i < self.count and self._key(i) == h:
+            out.append(self[i])
+            i += 1
+        return out
+
+    def __iter__(self) -> Iterator[tuple]:
+        """顺序遍历（按块解包，供归并重建用）"""
+        size = self.record.size
+        block = 4096
+        for start in range(0, self.count, block):
+            n = min(block, self.count - start)
+            off = self._base + start * size
+            yield from self.record.iter_unpack(self._mm[off:off + n * size])
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _spill(run: List[tuple], record: struct.Struct, tmpdir: str) -> str:
+    run.sort()
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"".join(record.pack(*t) for t in run))
+    return path
+
+
+def _read_run(path: str, record: struct.Struct) -> Iterator[tuple]:
+    size = record.size * 4096
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield from record.iter_unpack(chunk)
+
+
+def write_sorted(path: str, magic: bytes, record: struct.Struct, items: Iterable[tuple],
+                 extra: int = 0, source: int = 0, existing: Optional[Iterable[tuple]] = None,
+                 key_len: Optional[int] = None,
+                 combine: Optional[Callable[[tuple, tuple], tuple]] = None,
+                 run_size: int = RUN_SIZE) -> int:
+    """
+    把 items（可与 existing 这个已排序序列一起）排序写入 path，返回记录数。
+    key_len/combine：前 key_len 个字段相同的相邻记录用 combine(a, b) 合并成一条（如累加计数）。
+    先写临时文件再 os.replace，写到一半中断不会破坏旧文件；existing 若有 close()，替换前会被关闭。
+    """
+    tmpdir = os.path.dirname(os.path.abspath(path))
+    runs: List[str] = []
+    buf: List[tuple] = []
+    try:
+        for t in items:
+            buf.append(t)
+            if len(buf) >= run_size:
+                runs.append(_spill(buf, record, tmpdir))
+                buf = []
+        buf.sort()
+        streams = [_read_run(p, record) for p in runs] + [iter(buf)]
+        if existing is not None:
+            streams.append(iter(existing))
+        merged = heapq.merge(*streams)
+
+        tmp_out = path + ".tmp"
+        count = 0
+        with open(tmp_out, "wb") as f:
+            f.write(bytes(HEADER.size))
+            out: List[bytes] = []
+            pending: Optional[tuple] = None
+            for t in merged:
+                if pending is not None and combine is not None and t[:key_len] == pending[:key_len]:
+                    pending = combine(pending, t)
+                    continue
+                if pending is not None:
+                    out.append(record.pack(*pending))
+                    count += 1
+                    if len(out) >= 4096:
+                        f.write(b"".join(out))
+                        out.clear()
+                pending = t
+            if pending is not None:
+                out.append(record.pack(*pending))
+                count += 1
+            f.write(b"".join(out))
+            f.seek(0)
+            f.write(HEADER.pack(magic, FILE_VERSION, record.size, count, extra, source))
+        if hasattr(existing, "close"):
+            # 旧文件读完即关，Windows 下才能覆盖
+            existing.close()
+        os.replace(tmp_out, path)
+        return count
+    finally:
+        for p in runs:
+            os.remove(p)
+
+
+def read_header(path: str, magic: bytes) -> Optional[Tuple[int, int]]:
+    """只读文件头 → (附加值, 来源指纹)；文件不存在或类型不符返回 None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(HEADER.size)
+        m, ver, _, _, extra = _HEADER_V1.unpack_from(head, 0)
+        source = HEADER.unpack(head)[5] if ver >= 2 else 0
+    except (OSError, struct.error):
+        return None
+    return (extra, source) if m == magic else None
@@ -3,12 +3,20 @@
 新的 main.py
 职责最小化：仅负责启动 Tk 窗口、加载拆分后的界面模块（ui.main_ui），
 并确保 chess_rules.py 与 draw_board.py 被正常导入使用。
+设置环境变量 XIANGQI_STARTUP_TIMING=1 可打印启动耗时（导入/字体解析/首次绘制）。
+设置环境变量 XIANGQI_PROFILE=1 可在启动时就开启热路径计数（Ctrl+Shift+D 查看）。
 """
+import time
+_T0 = time.perf_counter()
+
 import tkinter as tk
 import chess_rules  # noqa: F401
 import draw_board   # noqa: F401
+import xiangqi_ui_all
 from xiangqi_ui_all import XiangqiGUI
 
+xiangqi_ui_all.set_startup_origin(_T0)
+xiangqi_ui_all.startup_mark("导入模块")
 
 
 def main():
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+子力 / 棋子布局搜索（与界面无关，不依赖 tkinter）：在 .xqdb 棋谱库的全部主线局面中找
+- 子力组合，如 "车炮-车马"（= "RC-RN"）
+- 局部布局，如 "Rb0 ce7 .e1"（ICCS 坐标，大写红、小写黑，"." 表示该格必须为空）
+- 可选：轮哪方走
+做法：build_positions(db_path) 把每局主线复盘一遍，把每个局面打包成定长数组写进 <库>.xqms：
+每局面 14 字节子力计数 + 90 字节棋盘平面（棋子码）+ 局号/半步数/走方。
+搜索时不再经过 Board 复盘，直接在这些数组上比较：装了 NumPy 时整块（几十万局面）向量化比较，
+没装则退回逐局面的纯 Python 比较（结果相同，只是慢得多）。
+文件布局（小端）：
+  文件头 _HEADER：magic "XQMS", 版本, 已收录局数, 有效数据末尾偏移, 已收录各局的指纹（game_db.GameDB.fingerprint）
+  若干数据块，每块 _CHUNK：局面数 n，随后依次是
+    局号 u32[n], 半步数 u16[n], 走方 u8[n]（0 红 1 黑）, 子力 u8[n][14], 棋盘 u8[n][90]
+  追加新局时在末尾写新块，最后才改文件头（中断后按文件头截断，旧数据保持完整）；
+  指纹对不上（库被重建或换掉）时整个重建
+棋子码：chess_rules.PIECE_CODE（红 1..7、黑 8..14，依次为 车马相仕帅炮兵），0 = 空
+命令行：
+  python material_search.py build 库.xqdb [--rebuild]
+  python material_search.py find 库.xqdb [--material 车炮-车马] [--pattern "Rb0 .e1"] [--side r|b] [--all-plies]
+"""
+
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:      # NumPy 是可选依赖：没有时用纯 Python 扫描
+    np = None
+
+import chess_rules as xr
+import game_db
+
+MS_MAGIC = b"XQMS"
+MS_VERSION = 2
+_HEADER = struct.Struct("<4sHHQQQ")     # magic, 版本, 保留, 已收录局数, 数据末尾, 来源指纹
+_CHUNK = struct.Struct("<I")
+CHUNK_POSITIONS = 1 << 18               # 每块最多局面数（扫描时一次比较一块）
+N_KINDS = 14
+BOARD_CELLS = xr.ROWS * xr.COLS
+
+_CN_PIECES = {'车': 'R', '車': 'R', '马': 'N', '馬': 'N', '相': 'B', '象': 'B', '仕': 'A', '士': 'A',
+              '帅': 'K', '将': 'K', '將': 'K', '炮': 'C', '砲': 'C', '兵': 'P', '卒': 'P'}
+_MAJORS = ('R', 'N', 'C')
+
+
+def positions_path_for(db_path: str) -> str:
+    return db_path + ".xqms"
+
+
+class MaterialSearchError(ValueError):
+    pass
+
+
+# ======================= 查询 =======================
+@dataclass
+class PositionQuery:
+    """material：子力下标(棋子码-1) -> 必须等于的个数；squares：格号 -> 棋子码（0 = 必须为空）"""
+    material: Dict[int, int] = field(default_factory=dict)
+    squares: Dict[int, int] = field(default_factory=dict)
+    side: Optional[str] = None
+
+
+def parse_material(text: str) -> Dict[int, int]:
+    """
+    "车炮-车马" / "RC-RN" / "车炮对车马"：前为红方，后为黑方。
+    车马炮按所写个数精确匹配（没写 = 0 个）；仕相兵只有写了才限定个数，否则不限；帅将忽略。
+    """
+    sides = re.split(r"\s*(?:-|对|vs|VS)\s*", text.strip())
+    if len(sides) != 2:
+        raise MaterialSearchError(f"子力格式应为“红方-黑方”：{text}")
+    out = {}
+    for color, spec in zip(('r', 'b'), sides):
+        counts: Dict[str, int] = {}
+        for ch in spec.replace(" ", ""):
+            ptype = _CN_PIECES.get(ch) or ch.upper()
+            if ptype not in xr.PIECE_TYPES:
+                raise MaterialSearchError(f"无法识别的棋子：{ch}")
+            counts[ptype] = counts.get(ptype, 0) + 1
+        for ptype in xr.PIECE_TYPES:
+            if ptype == 'K':
+                continue
+            if ptype in _MAJORS or ptype in counts:
+                out[xr.PIECE_CODE[(color, ptype)] - 1] = counts.get(ptype, 0)
+    return out
+
+
+def parse_square(text: str) -> int:
+    """ICCS 坐标 → 格号：a..i 为红方从左到右的列，0..9 为红方从下到上的行"""
+    m = re.fullmatch(r"([a-i])([0-9])", text.lower())
+    if not m:
+        raise MaterialSearchError(f"无法识别的坐标：{text}")
+    col = ord(m.group(1)) - ord('a')
+    row = xr.ROWS - 1 - int(m.group(2))
+    return row * xr.COLS + col
+
+
+def parse_pattern(text: str) -> Dict[int, int]:
+    """"Rb0 ce7 .e1"：棋子字母（FEN 记法）或 "." + ICCS 坐标"""
+    out = {}
+    for token in text.split():
+        ch, sq = token[0], parse_square(token[1:])
+        if ch == '.':
+            out[sq] = 0
+            continue
+        ptype = ch.upper()
+        ptype = {'H': 'N', 'E': 'B'}.get(ptype, ptype)
+        if ptype not in xr.PIECE_TYPES:
+            raise MaterialSearchError(f"无法识别的棋子：{token}")
+        out[sq] = xr.PIECE_CODE[('r' if ch.isupper() else 'b', ptype)]
+    return out
+
+
+def material_of(board: xr.Board) -> Dict[int, int]:
+    """当前局面的完整子力（全部 14 种精确匹配），用于“找同子力的局面”"""
+    counts = dict.fromkeys(range(N_KINDS), 0)
+    for row in board.board:
+        for p in row:
+            if p is not None:
+                counts[xr.PIECE_CODE[(p.color, p.ptype)] - 1] += 1
+    return counts
+
+
+# ======================= 建立局面数组 =======================
+def _start_cells(start_fen: Optional[str]) -> Tuple[bytearray, str]:
+    board = xr.Board()
+    if start_fen:
+        board.set_fen(start_fen)
+    cells = bytearray(BOARD_CELLS)
+    for r in range(xr.ROWS):
+        for c in range(xr.COLS):
+            p = board.board[r][c]
+            if p is not None:
+                cells[r * xr.COLS + c] = xr.PIECE_CODE[(p.color, p.ptype)]
+    return cells, board.side_to_move
+
+
+def iter_game_positions(start_fen: Optional[str], codes) -> Iterator[Tuple[int, int, bytes, bytes]]:
+    """按着法码复盘 → (半步数, 走方 0/1, 子力 14 字节, 棋盘 90 字节)，含开局局面"""
+    cells, side = _start_cells(start_fen)
+    counts = bytearray(N_KINDS)
+    for code in cells:
+        if code:
+            counts[code - 1] += 1
+    black = side == 'b'
+    yield 0, int(black), bytes(counts), bytes(cells)
+    for ply, code in enumerate(codes, start=1):
+        fr, to = code >> 8, code & 0xFF
+        if to >= BOARD_CELLS or not cells[fr]:
+            return
+        if cells[to]:
+            counts[cells[to] - 1] -= 1
+        cells[to], cells[fr] = cells[fr], 0
+        black = not black
+        yield ply, int(black), bytes(counts), bytes(cells)
+
+
+class _ChunkWriter:
+    def __init__(self, f):
+        self.f = f
+        self._reset()
+
+    def _reset(self):
+        self.gids, self.plies = [], []
+        self.sides = bytearray()
+        self.counts = bytearray()
+        self.boards = bytearray()
+
+    def add(self, gid: int, ply: int, side: int, counts: bytes, cells: bytes):
+        self.gids.append(gid)
+        self.plies.append(ply)
+        self.sides.append(side)
+        self.counts += counts
+        self.boards += cells
+        if len(self.gids) >= CHUNK_POSITIONS:
+            self.flush()
+
+    def flush(self):
+        n = len(self.gids)
+        if not n:
+            return
+        self.f.write(_CHUNK.pack(n))
+        self.f.write(struct.pack(f"<{n}I", *self.gids))
+        self.f.write(struct.pack(f"<{n}H", *self.plies))
+        self.f.write(self.sides)
+        self.f.write(self.counts)
+        self.f.write(self.boards)
+        self._reset()
+
+
+def _read_header(path: str) -> Optional[Tuple[int, int, int]]:
+    """→ (已收录局数, 数据末尾, 来源指纹)；文件不存在或不是本版本的局面数组返回 None（旧版本重建即可）"""
+    try:
+        with open(path, "rb") as f:
+            magic, ver, _, games, end, source = _HEADER.unpack(f.read(_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    if magic != MS_MAGIC or ver != MS_VERSION:
+        return None
+    return games, end, source
+
+
+def covered_games(path: str, db: game_db.GameDB) -> Optional[int]:
+    """局面数组实际收录了 db 的前几局；没有文件、局数比库还多或指纹对不上时返回 None（同 position_index）"""
+    head = _read_header(path)
+    if head is None or head[0] > len(db) or head[2] != db.fingerprint(head[0]):
+        return None
+    return head[0]
+
+
+def build_positions(db_path: str, rebuild: bool = False, log=None) -> Tuple[int, int]:
+    """建立/增量追加局面数组 → (本次处理的局数, 本次写入的局面数)"""
+    path = positions_path_for(db_path)
+    t0 = time.perf_counter()
+    with game_db.GameDB(db_path) as db:
+        total = len(db)
+        head = None if rebuild or covered_games(path, db) is None else _read_header(path)
+        first, end, _ = head or (0, _HEADER.size, 0)
+        if first == total and head is not None:
+            return 0, 0
+        n_pos = 0
+        with open(path, "r+b" if head else "wb") as f:
+            if head:
+                f.truncate(end)     # 丢掉上次中断时写了一半的块
+                f.seek(end)
+            else:
+                f.write(_HEADER.pack(MS_MAGIC, MS_VERSION, 0, 0, _HEADER.size, 0))
+            out = _ChunkWriter(f)
+            for gid in range(first, total):
+                for ply, side, counts, cells in iter_game_positions(db.start_fen(gid), db.move_codes(gid)):
+                    out.add(gid, ply, side, counts, cells)
+                    n_pos += 1
+            out.flush()
+            end = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(0)
+            f.write(_HEADER.pack(MS_MAGIC, MS_VERSION, 0, total, end, db.fingerprint()))
+    if log:
+        log(f"局面数组：处理 {total - first} 局，{n_pos} 个局面，用时 {time.perf_counter() - t0:.1f} 秒")
+    return total - first, n_pos
+
+
+# ======================= 扫描 =======================
+@dataclass
+class SearchResult:
+    hits: List[Tuple[int, int]]      # (局号, 半步数)
+    scanned: int                     # 扫描过的局面数
+    seconds: float
+
+    @property
+    def positions_per_sec(self) -> float:
+        return self.scanned / self.seconds if self.seconds > 0 else 0.0
+
+
+class PositionArrays:
+    """with PositionArrays(path) as pa: pa.search(query) -> SearchResult"""
+
+    def __init__(self, path: str):
+        head = _read_header(path)
+        if head is None:
+            raise MaterialSearchError(f"不是局面数组文件：{path}")
+        self.games_covered, end, self.source = head
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if end > _HEADER.size else None
+        self._chunks: List[Tuple[int, int]] = []     # (数据起点, 局面数)
+        off = _HEADER.size
+        while off < end:
+            n = _CHUNK.unpack_from(self._mm, off)[0]
+            off += _CHUNK.size
+            self._chunks.append((off, n))
+            off += n * (4 + 2 + 1 + N_KINDS + BOARD_CELLS)
+        if off != end:
+            self.close()
+            raise MaterialSearchError(f"局面数组文件损坏：{path}")
+
+    def __len__(self) -> int:
+        return sum(n for _, n in self._chunks)
+
+    def _columns(self, off: int, n: int):
+        """块内各列的 (起点, 长度)：局号, 半步数, 走方, 子力, 棋盘"""
+        cols = []
+        for width in (4, 2, 1, N_KINDS, BOARD_CELLS):
+            cols.append((off, n * width))
+            off += n * width
+        return cols
+
+    def _match_numpy(self, off: int, n: int, q: PositionQuery):
+        (g0, gl), (p0, pl), (s0, sl), (c0, cl), (b0, bl) = self._columns(off, n)
+        mm = self._mm
+        mask = np.ones(n, dtype=bool)
+        if q.side is not None:
+            mask &= np.frombuffer(mm, np.uint8, n, s0) == (1 if q.side == 'b' else 0)
+        if q.material:
+            counts = np.frombuffer(mm, np.uint8, cl, c0).reshape(n, N_KINDS)
+            kinds = np.fromiter(q.material.keys(), np.intp)
+            target = np.fromiter(q.material.values(), np.uint8)
+            mask &= (counts[:, kinds] == target).all(axis=1)
+        if q.squares:
+            boards = np.frombuffer(mm, np.uint8, bl, b0).reshape(n, BOARD_CELLS)
+            sqs = np.fromiter(q.squares.keys(), np.intp)
+            target = np.fromiter(q.squares.values(), np.uint8)
+            mask &= (boards[:, sqs] == target).all(axis=1)
+        idx = np.flatnonzero(mask)
+        gids = np.frombuffer(mm, "<u4", n, g0)[idx]
+        plies = np.frombuffer(mm, "<u2", n, p0)[idx]
+        return zip(gids.tolist(), plies.tolist())
+
+    def _match_python(self, off: int, n: int, q: PositionQuery):
+        (g0, _), (p0, _), (s0, _), (c0, _), (b0, _) = self._columns(off, n)
+        mm = self._mm
+        side = None if q.side is None else (1 if q.side == 'b' else 0)
+        material = list(q.material.items())
+        squares = list(q.squares.items())
+        for i in range(n):
+            if side is not None and mm[s0 + i] != side:
+                continue
+            c = c0 + i * N_KINDS
+            if any(mm[c + k] != v for k, v in material):
+                continue
+            b = b0 + i * BOARD_CELLS
+            if any(mm[b + sq] != v for sq, v in squares):
+                continue
+            yield (struct.unpack_from("<I", mm, g0 + 4 * i)[0],
+                   struct.unpack_from("<H", mm, p0 + 2 * i)[0])
+
+    def search(self, q: PositionQuery, first_per_game: bool = True) -> SearchResult:
+        """first_per_game：同一局多次满足条件时只报第一次（通常就是“进入该残局”的那一步）"""
+        t0 = time.perf_counter()
+        match = self._match_numpy if np is not None else self._match_python
+        hits: List[Tuple[int, int]] = []
+        last_gid = -1
+        scanned = 0
+        for off, n in self._chunks:
+            for gid, ply in match(off, n, q):
+                if first_per_game and gid == last_gid:
+                    continue
+                hits.append((gid, ply))
+                last_gid = gid
+            scanned += n
+        return SearchResult(hits, scanned, time.perf_counter() - t0)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="子力 / 棋子布局搜索")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="建立/追加 <库>.xqms")
+    b.add_argument("db")
+    b.add_argument("--rebuild", action="store_true")
+    f = sub.add_parser("find", help="搜索局面")
+    f.add_argument("db")
+    f.add_argument("--material", help="如 车炮-车马 / RC-RN")
+    f.add_argument("--pattern", help='如 "Rb0 ce7 .e1"')
+    f.add_argument("--side", choices=("r", "b"))
+    f.add_argument("--all-plies", action="store_true", help="同一局报告所有满足条件的局面")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        build_positions(args.db, args.rebuild, log=print)
+        return 0
+    q = PositionQuery(parse_material(args.material) if args.material else {},
+                      parse_pattern(args.pattern) if args.pattern else {}, args.side)
+    with PositionArrays(positions_path_for(args.db)) as pa:
+        res = pa.search(q, first_per_game=not args.all_plies)
+    print(f"{len(res.hits)} 个结果；扫描 {res.scanned:,} 个局面，用时 {res.seconds:.3f} 秒"
+          f"（{res.positions_per_sec:,.0f} 局面/秒，{'NumPy' if np is not None else '纯 Python'}）")
+    with game_db.GameDB(args.db) as db:
+        for gid, ply in res.hits[:50]:
+            h = db.headers(gid)
+            print(f"  #{gid + 1} 第 {ply} 步  {h.get('Event', '')}  {h.get('Red', '')} - {h.get('Black', '')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+开局库（与界面无关，不依赖 tkinter）：
+- build_book(db_path, book_path, max_ply)：用 chess_rules.Board 逐局走 .xqdb 的主线前 max_ply 步，
+  记下 (局面哈希, 着法, 权重, 红胜/和/黑胜)，同一条目累加后写成按哈希排序的二进制文件
+- 左右对称折叠：局面与其镜像只存一份，键取两者哈希中较小的一个，着法相应镜像；
+  查询时再镜像回来。自身对称的局面（如开局）里互为镜像的两步（“炮二平五”与“炮八平五”）
+  合并成一条，只列其中一步
+- OpeningBook(path)：mmap 打开即用（不读任何条目），probe(board) 二分查找，几微秒级
+  （board 也可以是不可变的 chess_rules.Position）；
+  pick(board) 按权重随机挑一步，供分析/对弈在已知开局里跳过搜索
+文件布局同 hashfile：文件头附加值记录建库时的 max_ply；记录见 RECORD。
+命令行：
+  python opening_book.py build 库.xqdb 输出.xqbk [--plies 30]
+  python opening_book.py probe 输出.xqbk ["FEN"]
+"""
+
+import random
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import chess_rules as xr
+import game_db
+import hashfile
+
+BOOK_MAGIC = b"XQBK"
+RECORD = struct.Struct("<QHIIII")   # 折叠后的局面哈希, 着法码, 权重（局数）, 红胜, 和, 黑胜
+DEFAULT_PLIES = 30
+_RESULT_SLOTS = {"1-0": 3, "1/2-1/2": 4, "0-1": 5}
+
+
+def mirror_code(code: int) -> int:
+    """着法码左右镜像"""
+    fr, to = code >> 8, code & 0xFF
+    fr += xr.COLS - 1 - 2 * (fr % xr.COLS)
+    to += xr.COLS - 1 - 2 * (to % xr.COLS)
+    return (fr << 8) | to
+
+
+def book_key(board: xr.Board) -> Tuple[int, bool, bool]:
+    """→ (折叠后的键, 是否取了镜像, 局面是否左右对称)"""
+    h, m = board.zobrist(), board.zobrist_mirror()
+    return min(h, m), m < h, h == m
+
+
+def _fold_code(code: int, mirrored: bool, symmetric: bool) -> int:
+    if symmetric:
+        # 对称局面里互为镜像的两步是同一着（“炮二平五”=“炮八平五”），统一存较小的码
+        return min(code, mirror_code(code))
+    return mirror_code(code) if mirrored else code
+
+
+@dataclass
+class BookMove:
+    move: xr.Move
+    weight: int
+    red: int
+    draw: int
+    black: int
+
+    def score(self, color: str) -> Optional[float]:
+        """color 一方的平均得分（胜 1、和 0.5），无结果记录时为 None"""
+        n = self.red + self.draw + self.black
+        if not n:
+            return None
+        wins = self.red if color == 'r' else self.black
+        return (wins + 0.5 * self.draw) / n
+
+
+def _sum_counts(a: tuple, b: tuple) -> tuple:
+    return a[:2] + tuple(x + y for x, y in zip(a[2:], b[2:]))
+
+
+def _entries(db: game_db.GameDB, max_ply: int) -> Iterator[tuple]:
+    for gid in range(len(db)):
+        board = xr.Board()
+        fen = db.start_fen(gid)
+        if fen:
+            board.set_fen(fen)
+        slot = _RESULT_SLOTS.get(db.result(gid))
+        for code in db.move_codes(gid)[:max_ply]:
+            key, mirrored, symmetric = book_key(board)
+            rec = [key, _fold_code(code, mirrored, symmetric), 1, 0, 0, 0]
+            if slot:
+                rec[slot] = 1
+            yield tuple(rec)
+            board.make_move(game_db.decode_move(code))
+
+
+def build_book(db_path: str, book_path: str, max_ply: int = DEFAULT_PLIES, log=None) -> int:
+    """整本重建，返回条目数"""
+    t0 = time.perf_counter()
+    with game_db.GameDB(db_path) as db:
+        n_games = len(db)
+        count = hashfile.write_sorted(book_path, BOOK_MAGIC, RECORD, _entries(db, max_ply),
+                                      extra=max_ply, key_len=2, combine=_sum_counts)
+    if log:
+        log(f"开局库：{n_games} 局，前 {max_ply} 步，{count} 个条目，用时 {time.perf_counter() - t0:.1f} 秒")
+    return count
+
+
+class OpeningBook:
+    """with OpeningBook(path) as book: book.probe(board) -> [BookMove, ...]（按权重降序）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = hashfile.SortedHashFile(path, BOOK_MAGIC, RECORD)
+
+    @property
+    def max_ply(self) -> int:
+        return self._file.extra
+
+    def __len__(self) -> int:
+        return len(self._file)
+
+    def probe(self, board: xr.Board) -> List[BookMove]:
+        key, mirrored, _ = book_key(board)
+        out = []
+        for _, code, weight, red, draw, black in self._file.lookup(key):
+            if mirrored:
+                code = mirror_code(code)
+            out.append(BookMove(game_db.decode_move(code), weight, red, draw, black))
+        out.sort(key=lambda bm: -bm.weight)
+        return out
+
+    def pick(self, board: xr.Board, rng: Optional[random.Random] = None,
+             min_weight: int = 1) -> Optional[xr.Move]:
+        """按权重随机选一步库着；不在库中（或都低于 min_weight）返回 None"""
+        moves = [bm for bm in self.probe(board) if bm.weight >= min_weight]
+        if not moves:
+            return None
+        rng = rng or random
+        return rng.choices([bm.move for bm in moves], weights=[bm.weight for bm in moves])[0]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) >= 3 and argv[0] == "build":
+        plies = DEFAULT_PLIES
+        if "--plies" in argv:
+            plies = int(argv[argv.index("--plies") + 1])
+        build_book(argv[1], argv[2], plies, log=print)
+        return 0
+    if len(argv) in (2, 3) and argv[0] == "probe":
+        board = xr.Board()
+        if len(argv) == 3:
+            board.set_fen(argv[2])
+        t0 = time.perf_counter()
+        with OpeningBook(argv[1]) as book:
+            moves = book.probe(board)
+        print(f"{len(moves)} 个库着（{(time.perf_counter() - t0) * 1e6:.0f} µs）")
+        for bm in moves:
+            score = bm.score(board.side_to_move)
+            score = "-" if score is None else f"{score * 100:.1f}%"
+            print(f"  {board.move_to_chinese(bm.move)}  权重 {bm.weight}  "
+                  f"红胜 {bm.red} 和 {bm.draw} 黑胜 {bm.black}  得分 {score}")
+        return 0
+    print(__doc__.split("命令行：", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+开局统计树（与界面无关，不依赖 tkinter）：当前局面下棋谱库里出现过的每一个后续着法，
+及其局数、红胜/和/黑胜比例与平均得分。
+- build_tree(db_path)：把 .xqdb 每局主线前 MAX_PLY 步复盘一遍，产出 (局面哈希, 着法码) 边，
+  外部排序时把同一条边的计数累加，写成 <库>.xqot；导航时只做二分查找，从不回扫棋谱
+- 增量：文件头记着已收录的局数与其指纹，库里新增对局后再 build 只处理新局，与旧文件归并累加；
+  库被重建或换掉（指纹对不上）时整个重建，同 position_index
+- 局面按 Zobrist 哈希归并，不同着法次序到达的同一局面（换序）统计在一起；
+  同一局里重复经过的同一条边只计一次
+命令行：
+  python opening_tree.py build 库.xqdb [--rebuild]
+  python opening_tree.py show 库.xqdb ["FEN"]
+"""
+
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import chess_rules as xr
+import game_db
+import hashfile
+from position_index import covered_games, iter_position_hashes
+
+TREE_MAGIC = b"XQOT"
+RECORD = struct.Struct("<QHIIII")   # 局面哈希, 着法码, 局数, 红胜, 和, 黑胜
+MAX_PLY = 40                        # 只统计每局前 40 个半步（开局阶段）
+_RESULT_SLOTS = {"1-0": 3, "1/2-1/2": 4, "0-1": 5}
+
+
+def tree_path_for(db_path: str) -> str:
+    return db_path + ".xqot"
+
+
+@dataclass
+class MoveStats:
+    move: xr.Move
+    games: int
+    red: int
+    draw: int
+    black: int
+
+    @property
+    def decided(self) -> int:
+        """有结果记录的局数（比例按它计算；未记录结果的局只计入局数）"""
+        return self.red + self.draw + self.black
+
+    def pct(self, n: int) -> float:
+        return 100.0 * n / self.decided if self.decided else 0.0
+
+    @property
+    def score(self) -> Optional[float]:
+        """红方平均得分（胜 1、和 0.5、负 0），无结果记录时为 None"""
+        if not self.decided:
+            return None
+        return (self.red + 0.5 * self.draw) / self.decided
+
+
+def _sum_counts(a: tuple, b: tuple) -> tuple:
+    return a[:2] + tuple(x + y for x, y in zip(a[2:], b[2:]))
+
+
+def _edges(db: game_db.GameDB, first: int) -> Iterator[Tuple[int, int, int, int, int, int]]:
+    for gid in range(first, len(db)):
+        slot = _RESULT_SLOTS.get(db.result(gid))
+        codes = db.move_codes(gid)[:MAX_PLY]
+        seen = set()
+        for (_, h), code in zip(iter_position_hashes(db.start_fen(gid), codes), codes):
+            if (h, code) in seen:
+                continue
+            seen.add((h, code))
+            rec = [h, code, 1, 0, 0, 0]
+            if slot:
+                rec[slot] = 1
+            yield tuple(rec)
+
+
+def build_tree(db_path: str, rebuild: bool = False, log=None) -> Tuple[int, int]:
+    """建立/增量更新开局统计 → (本次处理的局数, 边数)"""
+    path = tree_path_for(db_path)
+    t0 = time.perf_counter()
+    with game_db.GameDB(db_path) as db:
+        total = len(db)
+        covered = None if rebuild else covered_games(path, TREE_MAGIC, db)
+        first = covered or 0
+        if covered == total:
+            with OpeningTree(path) as tree:
+                return 0, len(tree)
+        existing = hashfile.SortedHashFile(path, TREE_MAGIC, RECORD) if covered else None
+        try:
+            count = hashfile.write_sorted(path, TREE_MAGIC, RECORD, _edges(db, first),
+                                          extra=total, source=db.fingerprint(), existing=existing,
+                                          key_len=2, combine=_sum_counts)
+        finally:
+            if existing is not None:
+                existing.close()
+    if log:
+        log(f"开局统计：处理 {total - first} 局，共 {count} 条边，用时 {time.perf_counter() - t0:.1f} 秒")
+    return total - first, count
+
+
+class OpeningTree:
+    """with OpeningTree(path) as tree: tree.moves(board) -> [MoveStats, ...]（按局数降序）"""
+
+    def __init__(self, path: str):
+        self._file = hashfile.SortedHashFile(path, TREE_MAGIC, RECORD)
+
+    @property
+    def games_covered(self) -> int:
+        return self._file.extra
+
+    def __len__(self) -> int:
+        return len(self._file)
+
+    def moves_for_hash(self, h: int) -> List[MoveStats]:
+        out = [MoveStats(game_db.decode_move(code), games, red, draw, black)
+               for _, code, games, red, draw, black in self._file.lookup(h)]
+        out.sort(key=lambda s: -s.games)
+        return out
+
+    def moves(self, board: xr.Board) -> List[MoveStats]:
+        return self.moves_for_hash(board.zobrist())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_stats(board: xr.Board, stats: List[MoveStats]) -> List[str]:
+    """文本表格（命令行用；界面有自己的表格）"""
+    lines = []
+    for s in stats:
+        score = "  -  " if s.score is None else f"{s.score * 100:5.1f}"
+        lines.append(f"{board.move_to_chinese(s.move):<6}{s.games:>8}  "
+                     f"{s.pct(s.red):5.1f}% {s.pct(s.draw):5.1f}% {s.pct(s.black):5.1f}%  {score}")
+    return lines
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) >= 2 and argv[0] == "build":
+        build_tree(argv[1], rebuild="--rebuild" in argv, log=print)
+        return 0
+    if len(argv) in (2, 3) and argv[0] == "show":
+        board = xr.Board()
+        if len(argv) == 3:
+            board.set_fen(argv[2])
+        t0 = time.perf_counter()
+        with OpeningTree(tree_path_for(argv[1])) as tree:
+            stats = tree.moves(board)
+        print(f"{len(stats)} 个着法（{(time.perf_counter() - t0) * 1000:.2f} ms）")
+        print("着法        局数   红胜    和    黑胜   红方得分")
+        for line in format_stats(board, stats):
+            print(line)
+        return 0
+    print(__doc__.split("命令行：", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+PGN 流式读写（与界面无关）：
+- iter_pgn_games(path_or_file)：生成器，逐局产出 GameRecord，内存只保留当前一局
+  支持标签、{注释}、;行注释、(嵌套变着)、$NAG、步号 "1." / "1..."、结果记号
+- PgnWriter / write_pgn：逐局追加写出（主线 + 注释 + 变着）
+- 命令行：python pgn_io.py bench [局数]  生成合成大文件并报告读写吞吐（局/秒）
+注：变着里的注释在项目的数据结构中没有位置，读取时丢弃（读后再写会丢失这些注释）；嵌套变着展开为从 pivot 起的完整序列。
+"""
+
+import os
+import re
+import sys
+import time
+import tempfile
+from typing import Iterator, List, Optional, TextIO, Union
+
+from game_record import GameRecord, RESULTS, normalize_fen
+
+_TAG_RE = re.compile(r'^\[\s*(\w+)\s+"(.*)"\s*\]\s*$')
+_MOVE_NO_RE = re.compile(r'^\d+\.+')
+_TOKEN_RE = re.compile(r'\{|\}|\(|\)|;|[^\s{}();]+')
+
+
+class _GameBuilder:
+    """把 movetext 记号累积成 GameRecord；变着用栈展开。"""
+
+    def __init__(self):
+        self.rec = GameRecord()
+        self.started = False       # 已读到 movetext
+        # 栈帧：[已走着法, 起始 ply, pivot, 前缀着法, variations 下标]
+        self.stack = [[[], 1, None, [], None]]
+
+    def move(self, san: str):
+        self.started = True
+        frame = self.stack[-1]
+        frame[0].append(san)
+        if frame[4] is None:
+            self.rec.moves.append(san)
+        else:
+            self.rec.variations[frame[4]][1].append(san)
+
+    def comment(self, text: str):
+        self.started = True
+        frame = self.stack[-1]
+        if frame[4] is not None:
+            return                  # 变着里的注释：GameRecord 没有位置存放，丢弃（见模块说明）
+        text = text.strip()
+        if not text:
+            return
+        ply = len(self.rec.moves)
+        old = self.rec.comments.get(ply)
+        self.rec.comments[ply] = f"{old}\n{text}" if old else text
+
+    def open_variation(self):
+        self.started = True
+        frame = self.stack[-1]
+        moves, start = frame[0], frame[1]
+        # 变着替换当前行的最后一步
+        alt_ply = start + max(len(moves) - 1, 0)
+        if frame[4] is None:
+            pivot, prefix = alt_ply, []
+        else:
+            pivot, prefix = frame[2], frame[3] + moves[:-1]
+        self.rec.variations.append((pivot, list(prefix)))
+        self.stack.append([[], alt_ply, pivot, list(prefix), len(self.rec.variations) - 1])
+
+    def close_variation(self):
+        if len(self.stack) > 1:
+            self.stack.pop()
+
+    def finish(self) -> GameRecord:
+        # 丢掉空变着（如 "( )"）
+        self.rec.variations = [(p, mv) for p, mv in self.rec.variations if mv]
+        self.rec.start_fen = normalize_fen(self.rec.headers.get("FEN"))
+        return self.rec
+
+
+def iter_pgn_games(source: Union[str, TextIO], encoding: str = "utf-8") -> Iterator[GameRecord]:
+    """逐局读取 PGN；source 为路径或文本文件对象。"""
+    if isinstance(source, str):
+        with open(source, "r", encoding=encoding, errors="replace") as f:
+            yield from iter_pgn_games(f)
+        return
+
+    g = _GameBuilder()
+    in_comment = False
+    comment_buf: List[str] = []
+    for raw in source:
+        line = raw.rstrip("\r\n")
+        if not in_comment:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith("[") and len(g.stack) == 1:
+                m = _TAG_RE.match(stripped)
+                if m:
+                    if g.started:
+                        # 上一局没有结果记号就开始了新标签
+                        yield g.finish()
+                        g = _GameBuilder()
+                    g.rec.headers[m.group(1)] = m.group(2).replace('\\"', '"')
+                    continue
+            if stripped.startswith("%"):
+                continue
+        line = line.replace("\\n", " ")
+        pos = 0
+        while pos < len(line):
+            if in_comment:
+                end = line.find("}", pos)
+                if end < 0:
+                    comment_buf.append(line[pos:])
+                    break
+                comment_buf.append(line[pos:end])
+                g.comment("\n".join(comment_buf))
+                comment_buf = []
+                in_comment = False
+                pos = end + 1
+                continue
+            m = _TOKEN_RE.search(line, pos)
+            if not m:
+                break
+            tok = m.group(0)
+            pos = m.end()
+            if tok == "{":
+                in_comment = True
+                comment_buf = []
+            elif tok == ";":
+                g.comment(line[pos:])
+                break
+            elif tok == "(":
+                g.open_variation()
+            elif tok == ")":
+                g.close_variation()
+            elif tok == "}":
+                continue
+            elif tok in RESULTS and len(g.stack) == 1:
+                g.rec.headers.setdefault("Result", tok)
+                yield g.finish()
+                g = _GameBuilder()
+            elif tok.startswith("$"):
+                continue
+            else:
+                tok = _MOVE_NO_RE.sub("", tok)
+                if tok:
+                    g.move(tok)
+    if g.started or g.rec.headers:
+        if in_comment and comment_buf:
+            g.comment("\n".join(comment_buf))
+        yield g.finish()
+
+
+def read_pgn_game(path: str, index: int = 0) -> Optional[GameRecord]:
+    """读取文件中第 index 局（从 0 开始）；不足则返回 None"""
+    for i, rec in enumerate(iter_pgn_games(path)):
+        if i == index:
+            return rec
+    return None
+
+
+# ======================= 写出 =======================
+def _escape_comment(text: str) -> str:
+    return text.replace("}", ")")
+
+
+def _movetext_tokens(rec: GameRecord, first_ply: int = 1) -> List[str]:
+    """主线记号序列；first_ply=2 表示黑方先行（第 1 步是黑着）"""
+    by_pivot = {}
+    for pivot, moves in rec.variations:
+        by_pivot.setdefault(pivot, []).append(moves)
+
+    def numbered(ply: int, san: str, force: bool) -> str:
+        abs_ply = ply + first_ply - 1
+        no = (abs_ply + 1) // 2
+        if abs_ply % 2 == 1:
+            return f"{no}. {san}"
+        return f"{no}... {san}" if force else san
+
+    tokens = []
+    if rec.comments.get(0):
+        tokens.append("{" + _escape_comment(rec.comments[0]) + "}")
+    force = True
+    for i, san in enumerate(rec.moves, start=1):
+        tokens.append(numbered(i, san, force))
+        force = False
+        if rec.comments.get(i):
+            tokens.append("{" + _escape_comment(rec.comments[i]) + "}")
+            force = True
+        for var in by_pivot.get(i, []):
+            body = [numbered(i + k, mv, k == 0) for k, mv in enumerate(var)]
+            tokens.append("(" + " ".join(body) + ")")
+            force = True
+    return tokens
+
+
+def format_pgn_game(rec: GameRecord, width: int = 80) -> str:
+    headers = dict(rec.headers)
+    headers.setdefault("Game", "Chinese Chess")
+    headers.setdefault("Result", "*")
+    headers.pop("FEN", None)
+    if rec.start_fen:
+        board, side = rec.start_fen.split()
+        headers["FEN"] = f"{board} {'b' if side == 'b' else 'w'} - - 0 1"
+    out = [f'[{k} "{str(v).replace(chr(34), chr(92) + chr(34))}"]' for k, v in headers.items()]
+    out.append("")
+    tokens = _movetext_tokens(rec, 2 if rec.first_side == 'b' else 1) + [rec.result]
+    line = ""
+    for tok in tokens:
+        if line and len(line) + 1 + len(tok) > width:
+            out.append(line)
+            line = tok
+        else:
+            line = f"{line} {tok}" if line else tok
+    out.append(line)
+    return "\n".join(out) + "\n\n"
+
+
+class PgnWriter:
+    """逐局追加写 PGN：with PgnWriter(path) as w: w.write(rec)"""
+
+    def __init__(self, target: Union[str, TextIO], mode: str = "a", encoding: str = "utf-8"):
+        if isinstance(target, str):
+            self._f = open(target, mode, encoding=encoding, newline="\n")
+            self._own = True
+        else:
+            self._f = target
+            self._own = False
+        self.count = 0
+
+    def write(self, rec: GameRecord):
+        self._f.write(format_pgn_game(rec))
+        self.count += 1
+
+    def close(self):
+        if self._own:
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_pgn(path: str, records, mode: str = "w") -> int:
+    with PgnWriter(path, mode) as w:
+        for rec in records:
+            w.write(rec)
+        return w.count
+
+
+# ======================= 吞吐测试 =======================
+_SAMPLE = ["炮二平五", "马8进7", "马二进三", "车9平8", "车一平二", "马2进3", "兵七进一", "卒7进1",
+           "车二进六", "炮8平9", "车二平三", "炮9退1", "马八进七", "士4进5", "炮八进二", "炮9平7",
+           "车三平四", "马7进8", "车四进二", "炮2进4", "马三进四", "炮7进5", "相三进一", "马8进7"]
+
+
+def _synthetic_record(i: int) -> GameRecord:
+    rec = GameRecord(headers={"Event": f"合成对局 {i}", "Red": "甲", "Black": "乙",
+                              "Result": RESULTS[i % 3]})
+    rec.moves = list(_SAMPLE)
+    rec.comments = {0: "开局前注释", 6: f"第 {i} 局的注释"}
+    rec.variations = [(3, ["兵三进一", "卒3进1"]), (5, ["车一进一", "车1平2"])]
+    return rec
+
+
+def bench(n_games: int = 20000):
+    tmpdir = tempfile.mkdtemp(prefix="pgn_bench_")
+    path = os.path.join(tmpdir, "synthetic.pgn")
+    t0 = time.perf_counter()
+    write_pgn(path, (_synthetic_record(i) for i in range(n_games)))
+    t_write = time.perf_counter() - t0
+    size_mb = os.path.getsize(path) / 1e6
+    t0 = time.perf_counter()
+    n = 0
+    for _ in iter_pgn_games(path):
+        n += 1
+    t_read = time.perf_counter() - t0
+    os.remove(path)
+    os.rmdir(tmpdir)
+    print(f"文件 {size_mb:.1f} MB，{n} 局")
+    print(f"写出：{n_games / t_write:,.0f} 局/秒（{size_mb / t_write:.1f} MB/s）")
+    print(f"读取：{n / t_read:,.0f} 局/秒（{size_mb / t_read:.1f} MB/s）")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "bench":
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        print("用法：python pgn_io.py bench [局数]")
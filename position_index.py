@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+局面索引（与界面无关，不依赖 tkinter）：回答“哪些对局走到过这个局面？”
+- build_index(db_path)：把 .xqdb 里每局主线复盘一遍，产出 (局面哈希, 局号, 半步数) 倒排记录，
+  外部排序后写成 <库>.xqpi；同一局里重复出现的局面只记第一次
+- 增量：文件头记着已收录的局数与这些局的指纹（game_db.GameDB.fingerprint），库里新增对局后
+  再 build 只处理新局并与旧索引归并；指纹对不上（库被重建或换掉）就整个重建
+- PositionIndex.find(hash) / find_board(board)：mmap + 二分查找，毫秒级
+复盘只用 90 格数组按着法码搬子并增量异或哈希（与 chess_rules.Board.zobrist() 完全一致），
+不做合法性检查——入库时（game_db.encode_game / bulk_import）已经逐步校验过。
+命令行：
+  python position_index.py build 库.xqdb [--rebuild]
+  python position_index.py query 库.xqdb "FEN"
+"""
+
+import struct
+import sys
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import chess_rules as xr
+import game_db
+import hashfile
+
+INDEX_MAGIC = b"XQPI"
+RECORD = struct.Struct("<QII")      # 局面哈希, 局号, 半步数（0 = 开局局面）
+
+
+def index_path_for(db_path: str) -> str:
+    return db_path + ".xqpi"
+
+
+def _start_cells(start_fen: Optional[str]) -> Tuple[list, str]:
+    board = xr.Board()
+    if start_fen:
+        board.set_fen(start_fen)
+    cells = [None] * 90
+    for r in range(xr.ROWS):
+        for c in range(xr.COLS):
+            p = board.board[r][c]
+            if p is not None:
+                cells[r * 9 + c] = xr.ZOBRIST_PIECE[(p.color, p.ptype)]
+    return cells, board.side_to_move
+
+
+def iter_position_hashes(start_fen: Optional[str], codes) -> Iterator[Tuple[int, int]]:
+    """按着法码复盘 → (半步数, 哈希)，含开局局面；着法码起点无子时停止"""
+    cells, side = _start_cells(start_fen)
+    h = 0
+    for sq, keys in enumerate(cells):
+        if keys is not None:
+            h ^= keys[sq]
+    black = side == 'b'
+    yield 0, h ^ xr.ZOBRIST_SIDE if black else h
+    for ply, code in enumerate(codes, start=1):
+        fr, to = code >> 8, code & 0xFF
+        keys = cells[fr]
+        if keys is None or to >= 90:
+            return
+        victim = cells[to]
+        if victim is not None:
+            h ^= victim[to]
+        h ^= keys[fr] ^ keys[to]
+        cells[to], cells[fr] = keys, None
+        black = not black
+        yield ply, h ^ xr.ZOBRIST_SIDE if black else h
+
+
+def _postings(db: game_db.GameDB, first: int) -> Iterator[Tuple[int, int, int]]:
+    for gid in range(first, len(db)):
+        seen = set()
+        for ply, h in iter_position_hashes(db.start_fen(gid), db.move_codes(gid)):
+            if h not in seen:
+                seen.add(h)
+                yield h, gid, ply
+
+
+def covered_games(path: str, magic: bytes, db: game_db.GameDB) -> Optional[int]:
+    """
+    由 db 派生的排序文件（局面索引 / 开局统计）实际收录了 db 的前几局；
+    文件不存在、局数比库还多或指纹对不上（库被重建或换掉）时返回 None
+    """
+    head = hashfile.read_header(path, magic)
+    if head is None:
+        return None
+    covered, source = head
+    if covered > len(db) or source != db.fingerprint(covered):
+        return None
+    return covered
+
+
+def build_index(db_path: str, rebuild: bool = False, log=None) -> Tuple[int, int]:
+    """建立/增量更新索引 → (本次处理的局数, 索引记录总数)"""
+    path = index_path_for(db_path)
+    t0 = time.perf_counter()
+    with game_db.GameDB(db_path) as db:
+        total = len(db)
+        covered = None if rebuild else covered_games(path, INDEX_MAGIC, db)
+        first = covered or 0
+        if covered == total:
+            with PositionIndex(path) as idx:
+                return 0, len(idx)
+        existing = hashfile.SortedHashFile(path, INDEX_MAGIC, RECORD) if covered else None
+        try:
+            count = hashfile.write_sorted(path, INDEX_MAGIC, RECORD, _postings(db, first),
+                                          extra=total, source=db.fingerprint(), existing=existing)
+        finally:
+            if existing is not None:
+                existing.close()
+    if log:
+        log(f"局面索引：处理 {total - first} 局，共 {count} 条记录，用时 {time.perf_counter() - t0:.1f} 秒")
+    return total - first, count
+
+
+class PositionIndex:
+    """with PositionIndex(path) as idx: idx.find_board(board) -> [(局号, 半步数), ...]"""
+
+    def __init__(self, path: str):
+        self._file = hashfile.SortedHashFile(path, INDEX_MAGIC, RECORD)
+
+    @property
+    def games_covered(self) -> int:
+        return self._file.extra
+
+    def __len__(self) -> int:
+        return len(self._file)
+
+    def find(self, h: int) -> List[Tuple[int, int]]:
+        return [(gid, ply) for _, gid, ply in self._file.lookup(h)]
+
+    def find_board(self, board: xr.Board) -> List[Tuple[int, int]]:
+        return self.find(board.zobrist())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) >= 2 and argv[0] == "build":
+        build_index(argv[1], rebuild="--rebuild" in argv, log=print)
+        return 0
+    if len(argv) == 3 and argv[0] == "query":
+        board = xr.Board()
+        board.set_fen(argv[2])
+        t0 = time.perf_counter()
+        with PositionIndex(index_path_for(argv[1])) as idx:
+            hits = idx.find_board(board)
+        print(f"{len(hits)} 局（{(time.perf_counter() - t0) * 1000:.2f} ms）")
+        with game_db.GameDB(argv[1]) as db:
+            for gid, ply in hits[:50]:
+                h = db.headers(gid)
+                print(f"  #{gid + 1} 第 {ply} 步  {h.get('Event', '')}  {h.get('Red', '')} - {h.get('Black', '')}")
+        return 0
+    print(__doc__.split("命令行：", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
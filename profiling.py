@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+可开关的热路径计数（与界面无关，不依赖 tkinter）：
+- register(owner, names, prefix)：登记要计数的函数（类的方法或模块级函数）；
+  chess_rules / xiangqi_ui_all 在模块末尾登记各自的热点
+- PROFILER.enable()：把登记的函数换成计数包装（调用次数 + 累计耗时，含内部嵌套调用）；
+  disable() 原函数原样放回——停用时没有任何包装，开销为零
+- 按“操作”归档：界面每轮刷新结束时调用 end_action(操作名)，把这段时间里的计数记到该操作下；
+  last_action 是最近一次操作的明细，by_action 是按操作累计
+- start_capture(path, n)：用 cProfile 记录接下来 n 次操作，结束后写出 .prof
+  （python -m pstats 文件 或 snakeviz 查看）
+设置环境变量 XIANGQI_PROFILE=1 时启动即开启计数。
+"""
+
+import cProfile
+import functools
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+Stats = Dict[str, List[float]]      # 名称 -> [调用次数, 累计秒数]
+
+
+def _add(stats: Stats, name: str, calls: float, seconds: float):
+    st = stats.get(name)
+    if st is None:
+        stats[name] = [calls, seconds]
+    else:
+        st[0] += calls
+        st[1] += seconds
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._targets: List[Tuple[object, str, str, Callable]] = []   # (所属类/模块, 属性名, 显示名, 原函数)
+        self.pending: Stats = {}                       # 上次 end_action 之后的计数
+        self.by_action: Dict[str, Stats] = {}
+        self.last_action: Optional[Tuple[str, Stats]] = None
+        self.version = 0                               # 每次 end_action / reset 加一，供界面判断要不要重画
+        self._capture: Optional[cProfile.Profile] = None
+        self._capture_path = None
+        self._capture_left = 0
+        self._capture_done: Optional[Callable[[str], None]] = None
+
+    @property
+    def active(self) -> bool:
+        """计数或 cProfile 采样任一开着，界面才需要在每轮刷新后调用 end_action"""
+        return self.enabled or self._capture is not None
+
+    # ---------- 登记与开关 ----------
+    def register(self, owner, names: Iterable[str], prefix: str = ""):
+        for name in names:
+            fn = getattr(owner, name)
+            target = (owner, name, prefix + name, fn)
+            self._targets.append(target)
+            if self.enabled:
+                self._install(target)
+
+    def _install(self, target):
+        owner, name, label, fn = target
+        record = self.record
+
+        @functools.wraps(fn)
+        def counted(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - t0)
+        setattr(owner, name, counted)
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for target in self._targets:
+                self._install(target)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for owner, name, _, fn in self._targets:
+                setattr(owner, name, fn)
+
+    def reset(self):
+        self.pending = {}
+        self.by_action = {}
+        self.last_action = None
+        self.version += 1
+
+    # ---------- 计数 ----------
+    def record(self, name: str, seconds: float):
+        _add(self.pending, name, 1, seconds)
+
+    def timed(self, name: str, fn: Callable, *args):
+        """手动计时一次调用（用于事先取好的绑定方法，如刷新调度里的各视图重绘函数）"""
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def end_action(self, action: str):
+        """一次操作结束：把 pending 归到该操作名下；cProfile 采样同时计一次数"""
+        if self.pending:
+            stats, self.pending = self.pending, {}
+            total = self.by_action.setdefault(action, {})
+            for name, (calls, seconds) in stats.items():
+                _add(total, name, calls, seconds)
+            self.last_action = (action, stats)
+            self.version += 1
+        if self._capture is not None:
+            self._capture_left -= 1
+            if self._capture_left <= 0:
+                self.stop_capture()
+
+    def report(self) -> str:
+        lines = []
+        for action, stats in self.by_action.items():
+            lines.append(f"{action}:")
+            for name, (calls, seconds) in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+                lines.append(f"  {name:<36}{int(calls):>8} 次 {seconds * 1000:10.1f} ms")
+        return "\n".join(lines)
+
+    # ---------- cProfile 采样 ----------
+    @property
+    def capturing(self) -> bool:
+        return self._capture is not None
+
+    def start_capture(self, path: str, actions: int, on_done: Optional[Callable[[str], None]] = None):
+        if self._capture is not None:
+            raise RuntimeError("已有一次性能采样在进行")
+        if actions < 1:
+            raise ValueError("采样的操作次数至少为 1")
+        self._capture_path = path
+        self._capture_left = actions
+        self._capture_done = on_done
+        self._capture = cProfile.Profile()
+        self._capture.enable()
+
+    def stop_capture(self) -> Optional[str]:
+        """结束采样并写出文件（不足 n 次时也可提前调用）→ 文件路径"""
+        prof, self._capture = self._capture, None
+        if prof is None:
+            return None
+        prof.disable()
+        prof.dump_stats(self._capture_path)
+        if self._capture_done:
+            self._capture_done(self._capture_path)
+        return self._capture_path
+
+
+PROFILER = Profiler()
+register = PROFILER.register
+
+if os.environ.get("XIANGQI_PROFILE"):
+    PROFILER.enable()
@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+"""
+残局库生成与查询（与界面无关，不依赖 tkinter）：小子力残局的“距将死步数”（DTM，按半步计）
+- 子力写法：红方-黑方，帅将可省略，如 "R-AA"（车对双士）、"NP-"（马兵对单将），也接受 "车-士士"
+- 走法规则全部来自 chess_rules.Board（九宫、过河、蹩腿塞眼、白脸将），无合法着法即判负
+- 索引：每组同类棋子只在其可达格上取组合数编号（双士 = C(5,2)），各组混合进制相乘再乘走方，
+  两子同格的编号标记为无效；左右对称：只存红帅在 d、e 列（第 3、4 列）的局面，查询时先镜像
+- 红黑互换：只生成“红方子力较强”的一种，另一种查询时把棋盘上下翻转、红黑对调
+- 生成：各局面的合法着法用进程池分段展开（Board 走子，吃子后的局面查已生成的子残局），
+  主进程建前驱表后做逆向分析：从被将死的局面起按步数逐层回推
+- 文件：<目录>/<子力>.xqtb（如 KR-KAA.xqtb），文件头后每个局面 1 字节，mmap 打开即用；
+  0 = 和，255 = 无效局面，其余 v 表示 DTM = v-1：奇数为走方胜，偶数为走方负
+- 长将、长捉与重复局面不参与判定（残局库里按和处理），60 回合自然限着也不计
+命令行：
+  python tablebase.py gen R-AA [--dir 目录] [--workers N]
+  python tablebase.py probe "FEN" [--dir 目录]
+"""
+
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import chess_rules as xr
+
+TB_MAGIC = b"XQTB"
+TB_VERSION = 1
+_HEADER = struct.Struct("<4sHH16sQ")     # magic, 版本, 保留, 子力串, 局面数
+DEFAULT_DIR = "tablebases"
+DRAW, INVALID = 0, 255
+MAX_DTM = 253
+RANGE_SIZE = 2048                        # 每个子任务展开的局面数
+
+_CN_PIECES = {ch: ptype for (_, ptype), ch in xr.CHINESE_NAME.items()}
+_CN_PIECES.update({'将': 'K', '砲': 'C'})
+_ORDER = {p: i for i, p in enumerate(xr.PIECE_TYPES)}
+
+Piece = Tuple[str, str, int]             # (颜色, 兵种, 格号 row*9+col)
+
+
+class TablebaseError(ValueError):
+    pass
+
+
+# ======================= 子力与对称 =======================
+def parse_material(text: str) -> Tuple[str, str]:
+    """"R-AA" / "KR-KAA" / "车-士士" → ("R", "AA")：各方按 chess_rules.PIECE_TYPES 顺序排列，帅将省略"""
+    if text.count('-') != 1:
+        raise TablebaseError(f"子力格式应为“红方-黑方”：{text}")
+    sides = []
+    for spec in text.split('-'):
+        pieces = []
+        for ch in spec.strip():
+            ptype = _CN_PIECES.get(ch) or ch.upper()
+            if ptype == 'K':
+                continue
+            if ptype not in xr.PIECE_TYPES:
+                raise TablebaseError(f"无法识别的棋子：{ch}")
+            pieces.append(ptype)
+        sides.append("".join(sorted(pieces, key=_ORDER.get)))
+    return sides[0], sides[1]
+
+
+def material_name(red: str, black: str) -> str:
+    """文件名与文件头里的写法，如 KR-KAA"""
+    return f"K{red}-K{black}"
+
+
+def is_canonical(red: str, black: str) -> bool:
+    """红黑对调的两种子力只生成一种：子多的一方（同数时按兵种顺序较强的一方）为红"""
+    key = lambda s: (len(s), [-_ORDER[p] for p in s])
+    return key(red) >= key(black)
+
+
+def flip_colors(pieces: Sequence[Piece]) -> List[Piece]:
+    """上下翻转并红黑对调（走方也要随之对调）"""
+    return [('b' if c == 'r' else 'r', p, (xr.ROWS - 1 - sq // xr.COLS) * xr.COLS + sq % xr.COLS)
+            for c, p, sq in pieces]
+
+
+def _mirror_sq(sq: int) -> int:
+    return sq + xr.COLS - 1 - 2 * (sq % xr.COLS)
+
+
+def _domain(color: str, ptype: str) -> List[int]:
+    """某方某兵种可能出现的格（红方在下，第 9 行为红方底线）"""
+    def red_rows(r):
+        return r if color == 'r' else xr.ROWS - 1 - r
+    sqs = set()
+    if ptype == 'K':
+        cols = (3, 4) if color == 'r' else (3, 4, 5)     # 红帅只取左半（对称约简）
+        sqs = {red_rows(r) * 9 + c for r in (7, 8, 9) for c in cols}
+    elif ptype == 'A':
+        sqs = {red_rows(r) * 9 + c for r, c in ((9, 3), (9, 5), (8, 4), (7, 3), (7, 5))}
+    elif ptype == 'B':
+        sqs = {red_rows(r) * 9 + c for r, c in ((9, 2), (9, 6), (7, 0), (7, 4), (7, 8), (5, 2), (5, 6))}
+    elif ptype == 'P':
+        sqs = {red_rows(r) * 9 + c for r in (5, 6) for c in (0, 2, 4, 6, 8)}
+        sqs |= {red_rows(r) * 9 + c for r in range(5) for c in range(9)}
+    else:
+        sqs = set(range(xr.ROWS * xr.COLS))
+    return sorted(sqs)
+
+
+# ======================= 索引 =======================
+class Layout:
+    """某一子力下 局面 <-> 编号 的完美映射（编号最低位是走方：0 红 1 黑）"""
+
+    def __init__(self, red: str, black: str):
+        self.red, self.black = red, black
+        self.name = material_name(red, black)
+        groups = [('r', 'K', 1), ('b', 'K', 1)]
+        for color, spec in (('r', red), ('b', black)):
+            for ptype in xr.PIECE_TYPES:
+                if spec.count(ptype):
+                    groups.append((color, ptype, spec.count(ptype)))
+        self.groups = groups
+        self.domains = [_domain(c, p) for c, p, _ in groups]
+        self.slot = []                       # 每组：格号 -> 该组可达格中的序号（不可达为 -1）
+        self.sizes = []
+        for dom, (_, _, k) in zip(self.domains, groups):
+            slot = [-1] * (xr.ROWS * xr.COLS)
+            for i, sq in enumerate(dom):
+                slot[sq] = i
+            self.slot.append(slot)
+            self.sizes.append(math.comb(len(dom), k))
+        self.size = 2 * math.prod(self.sizes)
+        self._group_of = {(c, p): g for g, (c, p, _) in enumerate(groups)}
+
+    def index(self, pieces: Sequence[Piece], stm: str) -> int:
+        """pieces 须与本子力完全一致；红帅在右半边时先镜像。不可达的格返回 -1"""
+        for c, p, sq in pieces:
+            if c == 'r' and p == 'K':
+                mirror = sq % xr.COLS > 4
+                break
+        else:
+            raise TablebaseError("缺少红帅")
+        per_group: List[List[int]] = [[] for _ in self.groups]
+        for c, p, sq in pieces:
+            g = self._group_of[(c, p)]
+            i = self.slot[g][_mirror_sq(sq) if mirror else sq]
+            if i < 0:
+                return -1
+            per_group[g].append(i)
+        idx = 0
+        for g, ids in enumerate(per_group):
+            ids.sort()
+            rank = 0
+            for j, i in enumerate(ids, start=1):
+                rank += math.comb(i, j)
+            idx = idx * self.sizes[g] + rank
+        return idx * 2 + (stm == 'b')
+
+    def decode(self, idx: int) -> Tuple[List[Piece], str]:
+        stm = 'b' if idx & 1 else 'r'
+        idx >>= 1
+        ranks = []
+        for size in reversed(self.sizes):
+            idx, r = divmod(idx, size)
+            ranks.append(r)
+        ranks.reverse()
+        pieces: List[Piece] = []
+        for (c, p, k), dom, rank in zip(self.groups, self.domains, ranks):
+            # 组合数系统逆映射：从最大的序号往下贪心
+            for j in range(k, 0, -1):
+                i = j - 1
+                while math.comb(i + 1, j) <= rank:
+                    i += 1
+                rank -= math.comb(i, j)
+                pieces.append((c, p, dom[i]))
+        return pieces, stm
+
+
+# ======================= 文件与查询 =======================
+def table_path(tb_dir: str, red: str, black: str) -> str:
+    return os.path.join(tb_dir, material_name(red, black) + ".xqtb")
+
+
+class Table:
+    """单个子力的残局表（mmap）"""
+
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, ver, _, name, size = _HEADER.unpack_from(self._mm, 0)
+        except (ValueError, struct.error):
+            self._f.close()
+            raise TablebaseError(f"残局库文件损坏：{path}")
+        if magic != TB_MAGIC or ver > TB_VERSION:
+            self.close()
+            raise TablebaseError(f"不是残局库文件：{path}")
+        self.layout = Layout(*parse_material(name.rstrip(b"\0").decode("ascii")))
+        if size != self.layout.size or len(self._mm) < _HEADER.size + size:
+            self.close()
+            raise TablebaseError(f"残局库文件被截断：{path}")
+
+    def value(self, pieces: Sequence[Piece], stm: str) -> int:
+        idx = self.layout.index(pieces, stm)
+        return INVALID if idx < 0 else self._mm[_HEADER.size + idx]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+
+AnyBoard = Union[xr.Board, xr.Position]
+
+
+def _board_pieces(board: AnyBoard) -> List[Piece]:
+    if isinstance(board, xr.Position):
+        return board.pieces()
+    return [(p.color, p.ptype, r * xr.COLS + c)
+            for r, row in enumerate(board.board) for c, p in enumerate(row) if p is not None]
+
+
+def _material_of(pieces: Sequence[Piece]) -> Tuple[str, str]:
+    red = "".join(sorted((p for c, p, _ in pieces if c == 'r' and p != 'K'), key=_ORDER.get))
+    black = "".join(sorted((p for c, p, _ in pieces if c == 'b' and p != 'K'), key=_ORDER.get))
+    return red, black
+
+
+def board_material(board: AnyBoard) -> str:
+    """局面的子力名，如 KR-KA（红黑未按强弱归一）"""
+    return material_name(*_material_of(_board_pieces(board)))
+
+
+@dataclass
+class ProbeResult:
+    dtm: int               # 距将死的半步数；和棋为 -1
+
+    @property
+    def outcome(self) -> str:
+        """走方视角：'win' / 'loss' / 'draw'"""
+        if self.dtm < 0:
+            return 'draw'
+        return 'win' if self.dtm % 2 else 'loss'
+
+    def __str__(self):
+        if self.dtm < 0:
+            return "和棋"
+        moves = (self.dtm + 1) // 2
+        return f"走方胜，{moves} 步杀" if self.dtm % 2 else f"走方负，{moves} 步被杀"
+
+
+class Tablebases:
+    """with Tablebases(目录) as tb: tb.probe(board) -> ProbeResult | None（子力不在库中）；
+    board 也可以是不可变的 chess_rules.Position（并行分析时各线程/进程直接传局面值）"""
+
+    def __init__(self, tb_dir: str = DEFAULT_DIR):
+        self.dir = tb_dir
+        self._tables: Dict[Tuple[str, str], Optional[Table]] = {}
+
+    def _table(self, red: str, black: str) -> Optional[Table]:
+        key = (red, black)
+        if key not in self._tables:
+            path = table_path(self.dir, red, black)
+            self._tables[key] = Table(path) if os.path.exists(path) else None
+        return self._tables[key]
+
+    def has(self, red: str, black: str) -> bool:
+        if not is_canonical(red, black):
+            red, black = black, red
+        return self._table(red, black) is not None
+
+    def value(self, pieces: Sequence[Piece], stm: str) -> Optional[int]:
+        """原始字节值；子力不在库中返回 None"""
+        red, black = _material_of(pieces)
+        if not is_canonical(red, black):
+            pieces, stm, (red, black) = flip_colors(pieces), ('b' if stm == 'r' else 'r'), (black, red)
+        table = self._table(red, black)
+        return None if table is None else table.value(pieces, stm)
+
+    def probe(self, board: AnyBoard) -> Optional[ProbeResult]:
+        v = self.value(_board_pieces(board), board.side_to_move)
+        if v is None or v == INVALID:
+            return None
+        return ProbeResult(v - 1 if v else -1)
+
+    def best_move(self, board: AnyBoard) -> Optional[xr.Move]:
+        """胜则走最快的杀法，负则拖最久，和则保持和棋"""
+        if isinstance(board, xr.Position):
+            board = board.to_board()
+        best, best_key = None, None
+        for mv in board.generate_legal_moves():
+            board.make_move(mv)
+            res = self.probe(board)
+            board.undo_move()
+            if res is None:
+                continue
+            if res.outcome == 'loss':          # 对方负：我方胜，越快越好
+                key = (2, -res.dtm)
+            elif res.outcome == 'draw':
+                key = (1, 0)
+            else:                               # 对方胜：越慢越好
+                key = (0, res.dtm)
+            if best_key is None or key > best_key:
+                best, best_key = mv, key
+        return best
+
+    def close(self):
+        for t in self._tables.values():
+            if t is not None:
+                t.close()
+        self._tables.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================= 生成 =======================
+_NONE_WIN = 0xFFFF
+_worker_tb: Optional[Tablebases] = None
+
+
+def _expand_range(name: str, tb_dir: str, start: int, stop: int):
+    """子进程：展开 [start, stop) 各局面的合法着法。
+    返回 (无效标记, 表内后继数, 表内后继编号, 吃子出口的最快胜, 吃子出口的最慢负, 有和棋出口)"""
+    global _worker_tb
+    if _worker_tb is None or _worker_tb.dir != tb_dir:
+        _worker_tb = Tablebases(tb_dir)
+    layout = Layout(*parse_material(name))
+    n = stop - start
+    invalid = bytearray(n)
+    counts = array('H', bytes(2 * n))
+    succ = array('I')
+    exit_win = array('H', [_NONE_WIN]) * n
+    exit_loss = array('h', [-1]) * n
+    exit_draw = bytearray(n)
+    for k in range(n):
+        pieces, stm = layout.decode(start + k)
+        sqs = [sq for _, _, sq in pieces]
+        if len(set(sqs)) != len(sqs):
+            invalid[k] = 1
+            continue
+        board = xr.Board(startpos=False)
+        for c, p, sq in pieces:
+            board.set_piece(divmod(sq, xr.COLS), xr.Piece(c, p))
+        board.side_to_move = stm
+        opp = 'b' if stm == 'r' else 'r'
+        if board.is_in_check(opp):          # 轮走方可以直接吃将（含白脸将）：不可能出现
+            invalid[k] = 1
+            continue
+        for mv in board.generate_legal_moves(stm):
+            fr = mv.from_sq[0] * xr.COLS + mv.from_sq[1]
+            to = mv.to_sq[0] * xr.COLS + mv.to_sq[1]
+            nxt = [(c, p, to if sq == fr else sq) for c, p, sq in pieces if sq != to]
+            if len(nxt) == len(pieces):
+                succ.append(layout.index(nxt, opp))
+                counts[k] += 1
+                continue
+            v = _worker_tb.value(nxt, opp)
+            if v is None or v == INVALID:
+                raise TablebaseError(f"缺少子残局 {material_name(*_material_of(nxt))}")
+            if v == DRAW:
+                exit_draw[k] = 1
+            elif (v - 1) % 2 == 0:          # 对方负
+                exit_win[k] = min(exit_win[k], v)
+            else:                           # 对方胜
+                exit_loss[k] = max(exit_loss[k], v)
+    return invalid, counts, succ, exit_win, exit_loss, exit_draw
+
+
+def _sub_materials(red: str, black: str) -> List[Tuple[str, str]]:
+    out = set()
+    for i in range(len(red)):
+        out.add((red[:i] + red[i + 1:], black))
+    for i in range(len(black)):
+        out.add((red, black[:i] + black[i + 1:]))
+    return sorted(out)
+
+
+def _retrograde(size: int, invalid: bytearray, counts: array, succ: array,
+                exit_win: array, exit_loss: array, exit_draw: bytearray) -> bytearray:
+    """按步数逐层回推；返回每局面 1 字节的结果"""
+    # 前驱表（CSR）
+    pred_start = array('I', bytes(4 * (size + 1)))
+    for s in succ:
+        pred_start[s + 1] += 1
+    for i in range(size):
+        pred_start[i + 1] += pred_start[i]
+    fill = array('I', pred_start)
+    preds = array('I', bytes(4 * len(succ)))
+    pos = 0
+    for p in range(size):
+        for _ in range(counts[p]):
+            s = succ[pos]
+            preds[fill[s]] = p
+            fill[s] += 1
+            pos += 1
+    del fill
+
+    result = bytearray(size)
+    done = bytearray(invalid)
+    remaining = array('H', counts)
+    max_loss = array('h', exit_loss)
+    buckets: Dict[int, List[int]] = {}
+    for p in range(size):
+        if invalid[p]:
+            continue
+        no_exit = exit_win[p] == _NONE_WIN and exit_loss[p] < 0 and not exit_draw[p]
+        if counts[p] == 0 and no_exit:
+            buckets.setdefault(0, []).append(p)          # 无着可走：判负
+        elif exit_win[p] != _NONE_WIN:
+            buckets.setdefault(exit_win[p], []).append(p)
+        elif counts[p] == 0 and not exit_draw[p]:
+            buckets.setdefault(exit_loss[p], []).append(p)
+    d = 0
+    while buckets:
+        layer = buckets.pop(d, ())
+        if d > MAX_DTM and layer:
+            raise TablebaseError(f"DTM 超过 {MAX_DTM}，无法用 1 字节保存")
+        for p in layer:
+            if done[p]:
+                continue
+            done[p] = 1
+            result[p] = d + 1
+            for j in range(pred_start[p], pred_start[p + 1]):
+                q = preds[j]
+                if done[q]:
+                    continue
+                if d % 2 == 0:                           # p 负 → q 胜
+                    buckets.setdefault(d + 1, []).append(q)
+                else:                                    # p 胜 → q 少一条退路
+                    remaining[q] -= 1
+                    if d + 1 > max_loss[q]:
+                        max_loss[q] = d + 1
+                    if remaining[q] == 0 and not exit_draw[q] and exit_win[q] == _NONE_WIN:
+                        buckets.setdefault(max_loss[q], []).append(q)
+        d += 1
+    for p in range(size):
+        if invalid[p]:
+            result[p] = INVALID
+    return result
+
+
+def generate(material: str, tb_dir: str = DEFAULT_DIR, workers: int = 0, log=print) -> str:
+    """生成一个子力的残局表（先递归生成吃子后会进入的子残局）；已存在则直接返回路径"""
+    red, black = parse_material(material)
+    if not is_canonical(red, black):
+        red, black = black, red
+    path = table_path(tb_dir, red, black)
+    if os.path.exists(path):
+        return path
+    for sub in _sub_materials(red, black):
+        generate(material_name(*sub), tb_dir, workers, log)
+    os.makedirs(tb_dir, exist_ok=True)
+
+    layout = Layout(red, black)
+    name = layout.name
+    if len(name) > 16:
+        raise TablebaseError(f"子力过多：{name}")
+    t0 = time.perf_counter()
+    if log:
+        log(f"{name}：{layout.size:,} 个编号，展开着法……")
+    invalid, counts, succ = bytearray(), array('H'), array('I')
+    exit_win, exit_loss, exit_draw = array('H'), array('h'), bytearray()
+    ranges = [(s, min(s + RANGE_SIZE, layout.size)) for s in range(0, layout.size, RANGE_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as ex:
+        futures = [ex.submit(_expand_range, name, tb_dir, s, e) for s, e in ranges]
+        for fut in futures:
+            inv, cnt, sc, ew, el, ed = fut.result()
+            invalid += inv; counts += cnt; succ += sc
+            exit_win += ew; exit_loss += el; exit_draw += ed
+    t1 = time.perf_counter()
+    result = _retrograde(layout.size, invalid, counts, succ, exit_win, exit_loss, exit_draw)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(TB_MAGIC, TB_VERSION, 0, name.encode("ascii"), layout.size))
+        f.write(result)
+    os.replace(tmp, path)
+    if log:
+        valid = layout.size - sum(invalid)
+        wins = sum(1 for v in result if v != INVALID and v and (v - 1) % 2)
+        losses = sum(1 for v in result if v != INVALID and v and (v - 1) % 2 == 0)
+        longest = max((v - 1 for v in result if v != INVALID and v), default=0)
+        log(f"{name}：有效 {valid:,}，走方胜 {wins:,} / 负 {losses:,} / 和 {valid - wins - losses:,}，"
+            f"最长 {longest} 半步；展开 {t1 - t0:.1f} 秒，回推 {time.perf_counter() - t1:.1f} 秒")
+    return path
+
+
+def _main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="残局库生成与查询")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    g = sub.add_parser("gen", help="生成残局表（含所需的子残局）")
+    g.add_argument("material", help="如 R-AA、NP-、车-士士")
+    g.add_argument("--dir", default=DEFAULT_DIR)
+    g.add_argument("--workers", type=int, default=0)
+    p = sub.add_parser("probe", help="查询一个局面")
+    p.add_argument("fen")
+    p.add_argument("--dir", default=DEFAULT_DIR)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "gen":
+        generate(args.material, args.dir, args.workers)
+        return 0
+    board = xr.Board()
+    board.set_fen(args.fen)
+    with Tablebases(args.dir) as tb:
+        t0 = time.perf_counter()
+        res = tb.probe(board)
+        us = (time.perf_counter() - t0) * 1e6
+        if res is None:
+            print("该子力不在残局库中（或局面无效）")
+            return 1
+        best = tb.best_move(board)
+        print(f"{res}（{us:.0f} µs）" + (f"；最佳着法：{board.move_to_chinese(best)}" if best else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
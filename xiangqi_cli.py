@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+无界面命令行（不导入 tkinter，可在没有显示器的服务器上跑批处理）：
+  python xiangqi_cli.py validate 路径... [--workers N]      复盘校验棋谱文件/目录
+  python xiangqi_cli.py convert 源 目标 [--to .pgn]          格式转换（目录 → 目录时逐个文件转换）
+  python xiangqi_cli.py perft [--fen FEN] [--depth 3]        走法生成计数
+  python xiangqi_cli.py analyse 路径... [--book 开局库.xqbk] [--tablebases 目录]
+  python xiangqi_cli.py index 库.xqdb [--only positions,tree,material] [--rebuild]
+输出：stdout 每行一个 JSON 对象（逐项结果），最后一行是 {"summary": ...}；说明性文字走 stderr。
+退出码：0 成功；1 有棋谱校验/解析失败；2 用法错误；3 文件读写错误（validate/convert/analyse 中有文件读写失败时也是 3，其余文件照常处理）。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import bulk_import
+import chess_rules as xr
+import game_db
+import game_io
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_IO = 0, 1, 2, 3
+
+
+def emit(obj: Dict):
+    sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+def expand_paths(paths: List[str]) -> List[str]:
+    """文件原样保留，目录递归展开成可读的棋谱文件"""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(bulk_import.find_files(p))
+        elif os.path.exists(p):
+            out.append(p)
+        else:
+            raise FileNotFoundError(p)
+    return out
+
+
+def error_item(path: str, e: Exception, **extra) -> Dict:
+    """单个文件/单局出错时的结果行；读写错误带 "io": true（命令最后以退出码 3 结束）"""
+    item = {"status": "error", "file": path, **extra, "error": str(e) or type(e).__name__}
+    if isinstance(e, OSError):
+        item["io"] = True
+    return item
+
+
+# ======================= validate =======================
+def cmd_validate(args) -> int:
+    """单个文件出什么错都只记一条 error、接着校验下一个（bulk_import.parse_file 不往外抛异常）"""
+    files = expand_paths(args.paths)
+    n_games = n_failed = n_io = 0
+    t0 = time.perf_counter()
+    if args.workers == 1:
+        results = map(bulk_import.parse_file, files)
+    else:
+        ex = ProcessPoolExecutor(max_workers=args.workers or None)
+        results = ex.map(bulk_import.parse_file, files, chunksize=16)
+    try:
+        for path, (games, failures) in zip(files, results):
+            n_games += len(games)
+            n_failed += len(failures)
+            for item in failures:
+                n_io += bool(item.get("io"))
+                emit({"status": "error", **item})
+            if args.verbose:
+                emit({"status": "ok" if not failures else "partial", "file": path,
+                      "games": len(games), "failures": len(failures)})
+    finally:
+        if args.workers != 1:
+            ex.shutdown()
+    emit({"summary": {"files": len(files), "games": n_games, "failed_games": n_failed,
+                      "io_errors": n_io, "seconds": round(time.perf_counter() - t0, 3)}})
+    if n_io:
+        return EXIT_IO
+    return EXIT_FAILED if n_failed else EXIT_OK
+
+
+# ======================= convert =======================
+def _convert_pairs(args):
+    if not os.path.isdir(args.src):
+        yield args.src, args.dst
+        return
+    if not args.to:
+        raise ValueError("目录转换需要 --to 指定目标扩展名，如 --to .pgn")
+    ext = args.to if args.to.startswith('.') else '.' + args.to
+    for path in bulk_import.find_files(args.src):
+        rel = os.path.relpath(path, args.src)
+        yield path, os.path.join(args.dst, os.path.splitext(rel)[0] + ext)
+
+
+def cmd_convert(args) -> int:
+    """逐个文件转换；单个文件出什么错都只记一条 error、接着转换下一个"""
+    t0 = time.perf_counter()
+    n_files = n_games = n_failed = n_io = 0
+    for path, dst in _convert_pairs(args):
+        try:
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            n = game_io.write_games(dst, game_io.iter_games(path))
+        except Exception as e:
+            n_failed += 1
+            item = error_item(path, e)
+            n_io += bool(item.get("io"))
+            emit(item)
+            continue
+        n_files += 1
+        n_games += n
+        emit({"status": "ok", "file": path, "output": dst, "games": n})
+    emit({"summary": {"files": n_files, "games": n_games, "failed_files": n_failed, "io_errors": n_io,
+                      "seconds": round(time.perf_counter() - t0, 3)}})
+    if n_io:
+        return EXIT_IO
+    return EXIT_FAILED if n_failed else EXIT_OK
+
+
+# ======================= perft =======================
+def perft(board: xr.Board, depth: int) -> int:
+    if depth == 0:
+        return 1
+    moves = board.generate_legal_moves()
+    if depth == 1:
+        return len(moves)
+    n = 0
+    for mv in moves:
+        board.make_move(mv)
+        n += perft(board, depth - 1)
+        board.undo_move()
+    return n
+
+
+def cmd_perft(args) -> int:
+    board = xr.Board()
+    if args.fen:
+        board.set_fen(args.fen)
+    for depth in range(1, args.depth + 1):
+        t0 = time.perf_counter()
+        nodes = perft(board, depth)
+        dt = time.perf_counter() - t0
+        emit({"depth": depth, "nodes": nodes, "seconds": round(dt, 3),
+              "nps": round(nodes / dt) if dt > 0 else None})
+    emit({"summary": {"fen": board.board_fen(), "depth": args.depth}})
+    return EXIT_OK
+
+
+# ======================= analyse =======================
+def analyse_game(enc: game_db.EncodedGame, book=None, tablebases=None) -> Dict:
+    """主线统计：步数、将军/吃子次数、终局 FEN 与判定；可选出库步、终局残局库结论"""
+    board = xr.Board()
+    if enc.start_fen:
+        board.set_fen(enc.start_fen)
+    checks = captures = 0
+    out_of_book = None
+    for ply, code in enumerate(enc.moves, start=1):
+        mv = game_db.decode_move(code)
+        if book is not None and out_of_book is None:
+            if not any(bm.move.from_sq == mv.from_sq and bm.move.to_sq == mv.to_sq
+                       for bm in book.probe(board)):
+                out_of_book = ply
+        if board.make_move(mv) is not None:
+            captures += 1
+        if board.is_in_check(board.side_to_move):
+            checks += 1
+    info = {"plies": len(enc.moves), "checks": checks, "captures": captures,
+            "final_fen": board.board_fen(), "final_state": board.game_result()}
+    if book is not None:
+        info["out_of_book_ply"] = out_of_book
+    if tablebases is not None:
+        res = tablebases.probe(board)
+        info["tablebase"] = None if res is None else {"outcome": res.outcome, "dtm": res.dtm}
+    return info
+
+
+def cmd_analyse(args) -> int:
+    book = tbs = None
+    if args.book:
+        import opening_book
+        book = opening_book.OpeningBook(args.book)
+    if args.tablebases:
+        import tablebase
+        tbs = tablebase.Tablebases(args.tablebases)
+    n_games = n_failed = n_io = 0
+    t0 = time.perf_counter()
+    try:
+        for path in expand_paths(args.paths):
+            n = 0
+            try:
+                for n, rec in enumerate(game_io.iter_games(path), start=1):
+                    item = {"file": path, "game": n, "event": rec.headers.get("Event", ""),
+                            "result": rec.headers.get("Result", "")}
+                    try:
+                        enc = game_db.encode_game(rec)
+                    except Exception as e:
+                        n_failed += 1
+                        emit(error_item(path, e, **item))
+                        continue
+                    n_games += 1
+                    emit({"status": "ok", **item, **analyse_game(enc, book, tbs)})
+            except Exception as e:
+                # 文件本身读不下去（同 bulk_import：记在下一局上），接着分析下一个文件
+                n_failed += 1
+                err = error_item(path, e, game=n + 1)
+                n_io += bool(err.get("io"))
+                emit(err)
+    finally:
+        if book is not None:
+            book.close()
+        if tbs is not None:
+            tbs.close()
+    emit({"summary": {"games": n_games, "failed_games": n_failed, "io_errors": n_io,
+                      "seconds": round(time.perf_counter() - t0, 3)}})
+    if n_io:
+        return EXIT_IO
+    return EXIT_FAILED if n_failed else EXIT_OK
+
+
+# ======================= index =======================
+INDEX_KINDS = ("positions", "tree", "material")
+
+
+def cmd_index(args) -> int:
+    import material_search
+    import opening_tree
+    import position_index
+
+    builders = {
+        "positions": lambda: position_index.build_index(args.db, args.rebuild),
+        "tree": lambda: opening_tree.build_tree(args.db, args.rebuild),
+        "material": lambda: material_search.build_positions(args.db, args.rebuild),
+    }
+    kinds = args.only.split(",") if args.only else list(INDEX_KINDS)
+    for kind in kinds:
+        if kind not in builders:
+            raise ValueError(f"未知索引：{kind}（可选 {', '.join(INDEX_KINDS)}）")
+    t_all = time.perf_counter()
+    for kind in kinds:
+        t0 = time.perf_counter()
+        games, records = builders[kind]()
+        emit({"index": kind, "new_games": games, "records": records,
+              "seconds": round(time.perf_counter() - t0, 3)})
+    emit({"summary": {"db": args.db, "built": kinds, "seconds": round(time.perf_counter() - t_all, 3)}})
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(description="象棋摆谱器无界面命令行（JSON 输出）")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("validate", help="复盘校验棋谱")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--workers", type=int, default=0, help="子进程数（默认 CPU 核数，1 = 不开子进程）")
+    p.add_argument("--verbose", action="store_true", help="每个文件都输出一行")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("convert", help="格式转换（按扩展名）")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p.add_argument("--to", help="目录转换时的目标扩展名")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("perft", help="走法生成计数")
+    p.add_argument("--fen")
+    p.add_argument("--depth", type=int, default=3)
+    p.set_defaults(func=cmd_perft)
+
+    p = sub.add_parser("analyse", help="逐局统计主线")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--book", help="开局库 .xqbk：报告出库步")
+    p.add_argument("--tablebases", help="残局库目录：判定终局局面")
+    p.set_defaults(func=cmd_analyse)
+
+    p = sub.add_parser("index", help="为 .xqdb 建立/增量更新索引")
+    p.add_argument("db")
+    p.add_argument("--only", help="逗号分隔：" + ",".join(INDEX_KINDS))
+    p.add_argument("--rebuild", action="store_true")
+    p.set_defaults(func=cmd_index)
+    return ap
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except OSError as e:
+        print(f"文件读写失败：{e}", file=sys.stderr)
+        emit({"summary": {"error": str(e)}})
+        return EXIT_IO
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        emit({"summary": {"error": str(e)}})
+        return EXIT_USAGE
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,15 +8,27 @@
 依赖：chess_rules.py（作为 xr 导入）、draw_board.py（作为 db 导入）
 """
 
-import os, re, json, sys, subprocess, datetime
+import os, re, json, sys, math, time, datetime, itertools
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 
 import tkinter as tk
 from tkinter import ttk, font, messagebox, filedialog, simpledialog
 
 import chess_rules as xr
 import draw_board as db
+import pgn_io
+import cbr_io
+import game_db
+import game_io
+import game_transform
+import hashfile
+import opening_book
+import opening_tree
+import position_index
+import profiling
+from game_record import GameRecord, headers_to_meta, pairs_to_flat, record_from_parts
 
 
 # ======================= 变着数据结构 =======================
@@ -63,10 +75,36 @@ class VariationManager:
         return len(self.variations[pivot_ply]) != before
 
 
+# ======================= startup_timing.py =======================
+# 启动耗时：main.py 在最早时刻调用 set_startup_origin，其余阶段用 startup_mark 打点；
+# 设置环境变量 XIANGQI_STARTUP_TIMING=1 时在首次绘制后向 stderr 打印报告。
+_startup_origin = time.perf_counter()
+STARTUP_MARKS: List[Tuple[str, float]] = []
+
+
+def set_startup_origin(t0: float):
+    global _startup_origin
+    _startup_origin = t0
+
+
+def startup_mark(label: str):
+    STARTUP_MARKS.append((label, time.perf_counter()))
+
+
+def startup_report() -> str:
+    lines = []
+    prev = _startup_origin
+    for label, t in STARTUP_MARKS:
+        lines.append(f"{label:<8}{(t - prev) * 1000:8.1f} ms  (累计 {(t - _startup_origin) * 1000:.1f} ms)")
+        prev = t
+    return "\n".join(lines)
+
+
 # ======================= state_utils.py =======================
 APP_STATE_DIR = os.path.join(os.path.expanduser("~"), ".xiangqi_app")
 RECENT_JSON = os.path.join(APP_STATE_DIR, "recent_games.json")
 BOOKMARK_JSON = os.path.join(APP_STATE_DIR, "bookmarks.json")
+TABLEBASE_DIR = os.path.join(APP_STATE_DIR, "tablebases")      # tablebase.py gen ... --dir 此目录
 
 
 def ensure_state_dir():
@@ -98,7 +136,7 @@ def create_menubar(gui):
     file_menu = tk.Menu(menubar, tearoff=False)
     file_menu.add_command(label="新建(N)", command=gui.new_game)
     file_menu.add_command(label="新建向导(W)...", command=gui.new_game_wizard)
-    file_menu.add_command(label="新建到新窗口(Y)", command=lambda: gui.spawn_new_window(new_game=True))
+    file_menu.add_command(label="新建到新窗口(Y)", command=gui.spawn_new_window)
     file_menu.add_separator()
     file_menu.add_command(label="打开(O)...", command=gui.load_game)
     file_menu.add_command(label="打开到新窗口(Z)...", command=lambda: gui.spawn_new_window(open_dialog=True))
@@ -140,14 +178,103 @@ def create_menubar(gui):
     bm_menu.add_command(label="跳转到书签...", command=gui.bookmark_jump)
     menubar.add_cascade(label="书签(M)", menu=bm_menu)
 
+    # ================= 棋谱库 =================
+    lib_menu = tk.Menu(menubar, tearoff=False)
+    lib_menu.add_command(label="选择棋谱库(L)...", command=gui.choose_collection)
+    lib_menu.add_command(label="建立/更新局面索引(I)", command=gui.build_position_index)
+    lib_menu.add_command(label="查找相同局面(F)    Ctrl+F", command=gui.find_same_position)
+    lib_menu.add_command(label="查找同子力局面(M)", command=gui.find_same_material)
+    lib_menu.add_command(label="建立/更新开局统计(O)", command=gui.build_opening_tree)
+    lib_menu.add_separator()
+    lib_menu.add_command(label="建立开局库(B)...", command=gui.build_opening_book)
+    lib_menu.add_command(label="载入开局库...", command=gui.load_opening_book)
+    lib_menu.add_command(label="开局库应着    Ctrl+B", command=gui.book_move)
+    lib_menu.add_command(label="查询残局库(T)    Ctrl+T", command=gui.probe_tablebase)
+    menubar.add_cascade(label="棋谱库(L)", menu=lib_menu)
+
     # ================= 帮助 =================
     help_menu = tk.Menu(menubar, tearoff=False)
     help_menu.add_command(label="关于", command=gui.about)
+    help_menu.add_separator()
+    help_menu.add_command(label="性能采样(cProfile)...", command=gui.profile_next_actions)
     menubar.add_cascade(label="帮助(H)", menu=help_menu)
 
     return menubar
 
 
+# ======================= refresh_scheduler.py =======================
+class RefreshScheduler:
+    """
+    脏标记刷新调度：一次操作里只“标记”哪些视图过期，下一次空闲时按固定顺序各重绘一次。
+    - mark(*views, action=...)：同一轮事件循环内可多次调用，重复视图只画一次
+    - stats：按操作名累计 {视图: 重绘次数}，另计 "requests"（标记次数）与 "flushes"（实际刷新轮数）
+    - 设置环境变量 XIANGQI_REFRESH_STATS=1 时，每轮刷新后向 stderr 打印一行统计
+    - 性能计数开着时（profiling.PROFILER），各视图重绘计为 "refresh:视图"，
+      每轮刷新结束把这段时间的计数归到本轮的操作名下
+    """
+    ORDER = ("board", "highlights", "moves", "moves_sel", "note", "variations", "explorer")
+
+    def __init__(self, root, painters: Dict[str, Callable[[], None]]):
+        self.root = root
+        self.painters = painters
+        self.dirty = set()
+        self.action: Optional[str] = None
+        self.requests = 0
+        self.stats: Dict[str, Counter] = {}
+        self.verbose = bool(os.environ.get("XIANGQI_REFRESH_STATS"))
+        self._job = None
+
+    def mark(self, *views, action: Optional[str] = None):
+        for v in views:
+            if v not in self.painters:
+                raise KeyError(f"未知视图：{v}")
+        self.dirty.update(views)
+        if "board" in views:
+            # 重画棋盘会清掉高亮对象；局面变了，开局统计也要跟着换
+            self.dirty.update(("highlights", "explorer"))
+        self.requests += len(views)
+        if action and self.action is None:
+            self.action = action
+        if self._job is None:
+            self._job = self.root.after_idle(self.flush)
+
+    def cancel(self):
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        self.dirty.clear()
+
+    def flush(self):
+        self._job = None
+        painted = [v for v in self.ORDER if v in self.dirty]
+        action = self.action or "其它"
+        requests = self.requests
+        self.dirty.clear()
+        self.action = None
+        self.requests = 0
+        prof = profiling.PROFILER
+        for v in painted:
+            if prof.enabled:
+                prof.timed("refresh:" + v, self.painters[v])
+            else:
+                self.painters[v]()
+        if prof.active:
+            prof.end_action(action)
+        st = self.stats.setdefault(action, Counter())
+        st["flushes"] += 1
+        st["requests"] += requests
+        st.update(painted)
+        if self.verbose:
+            print(f"[refresh] {action}: 标记 {requests} 次，重绘 {', '.join(painted) or '无'}", file=sys.stderr)
+
+    def report(self) -> str:
+        lines = []
+        for action, st in self.stats.items():
+            views = ", ".join(f"{v}={st[v]}" for v in self.ORDER if st[v])
+            lines.append(f"{action}: 刷新 {st['flushes']} 轮，标记 {st['requests']} 次；{views}")
+        return "\n".join(lines)
+
+
 # ======================= board_canvas.py =======================
 class BoardCanvas:
     """左侧棋盘画布 + 交互逻辑。"""
@@ -155,8 +282,17 @@ class BoardCanvas:
     def __init__(self, gui, parent):
         self.gui = gui
         self.frame = tk.Frame(parent)
-        self.canvas = tk.Canvas(self.frame, bg='#DEB887')
+        self.canvas = tk.Canvas(self.frame, bg=db.BOARD_BG)
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # 每个画布自带格子尺寸（同进程多窗口时互不影响）
+        self.square_size = db.SQUARE_SIZE
+
+        # 高亮层：选中圈/提示点复用同一批画布对象，状态未变时不重绘
+        self._sel_item = None
+        self._hint_items: List[int] = []
+        self._hl_state = None
+        self._hover_sq = None           # 指针所在格：同一格内移动不触发更新
+        self._motion_job = None
 
         # 事件绑定
         self.canvas.bind("<Button-1>", self._on_click)
@@ -165,49 +301,87 @@ class BoardCanvas:
 
     # ---------- 绘制与高亮 ----------
     def draw_board(self):
+        data = [['.'] * db.BOARD_COLS for _ in range(db.BOARD_ROWS)]
         for r in range(db.BOARD_ROWS):
             for c in range(db.BOARD_COLS):
                 piece = self.gui.board.piece_at((r, c))
-                db.board_data[r][c] = '.' if piece is None else (
-                    piece.ptype.upper() if piece.color == 'r' else piece.ptype.lower()
-                )
-        self.canvas.delete("all")
-        db.draw_board(self.canvas, self.gui.piece_font)
+                if piece is not None:
+                    data[r][c] = piece.ptype.upper() if piece.color == 'r' else piece.ptype.lower()
+        db.draw_board(self.canvas, self.gui.piece_font, self.square_size, data)
+        # delete("all") 已清掉高亮对象，复用池随之作废
+        self._reset_highlight_layer()
+
+    def _reset_highlight_layer(self):
+        self._sel_item = None
+        self._hint_items = []
+        self._hl_state = None
 
     def clear_highlights(self):
         self.canvas.delete("sel"); self.canvas.delete("hint"); self.canvas.delete("hover")
+        self._reset_highlight_layer()
 
-    def update_highlights(self):
-        self.clear_highlights()
-        M, S = db.MARGIN, db.SQUARE_SIZE
-        x1 = self.gui.offset_x + M
-        y1 = self.gui.offset_y + M
+    def _center_of(self, rc):
+        S = self.square_size
+        r, c = rc
+        return (self.gui.offset_x + db.MARGIN + c * S, self.gui.offset_y + db.MARGIN + r * S)
 
-        def center_of(rc):
-            r, c = rc
-            return (x1 + c * S, y1 + r * S)
+    def update_highlights(self):
+        """按当前选中/可走目标更新高亮；与上次状态相同则直接返回。"""
+        S = self.square_size
+        targets = tuple(self.gui.legal_targets)
+        board = self.gui.board
+        state = (self.gui.selected_sq, targets,
+                 tuple(board.piece_at(t) is None for t in targets),
+                 S, self.gui.offset_x, self.gui.offset_y)
+        if state == self._hl_state:
+            return
+        self._hl_state = state
 
+        # 选中圈
         if self.gui.selected_sq is not None:
-            cx, cy = center_of(self.gui.selected_sq)
+            cx, cy = self._center_of(self.gui.selected_sq)
             rad = S * 0.34
-            self.canvas.create_oval(cx - rad, cy - rad, cx + rad, cy + rad,
-                                    outline="#CC0000", width=3, tag="sel")
-        for tr in self.gui.legal_targets:
-            cx, cy = center_of(tr)
-            rad = S * 0.1
-            tp = self.gui.board.piece_at(tr)
-            if tp is None:
-                self.canvas.create_oval(cx - rad, cy - rad, cx + rad, cy + rad,
-                                        fill="#2ecc71", outline="", tag="hint")
+            if self._sel_item is None:
+                self._sel_item = self.canvas.create_oval(0, 0, 0, 0, outline="#CC0000", width=3, tag="sel")
+            self.canvas.coords(self._sel_item, cx - rad, cy - rad, cx + rad, cy + rad)
+            self.canvas.itemconfigure(self._sel_item, state="normal")
+        elif self._sel_item is not None:
+            self.canvas.itemconfigure(self._sel_item, state="hidden")
+
+        # 提示点：不足时补建，多余的隐藏
+        while len(self._hint_items) < len(targets):
+            self._hint_items.append(self.canvas.create_oval(0, 0, 0, 0, tag="hint"))
+        rad = S * 0.1
+        for item, tr, empty in zip(self._hint_items, targets, state[2]):
+            cx, cy = self._center_of(tr)
+            if empty:
+                self.canvas.coords(item, cx - rad, cy - rad, cx + rad, cy + rad)
+                self.canvas.itemconfigure(item, fill="#2ecc71", outline="", width=1, state="normal")
             else:
-                self.canvas.create_oval(cx - rad*1.5, cy - rad*1.5, cx + rad*1.5, cy + rad*1.5,
-                                        outline="#2ecc71", width=3, tag="hint")
+                self.canvas.coords(item, cx - rad*1.5, cy - rad*1.5, cx + rad*1.5, cy + rad*1.5)
+                self.canvas.itemconfigure(item, fill="", outline="#2ecc71", width=3, state="normal")
+        for item in self._hint_items[len(targets):]:
+            self.canvas.itemconfigure(item, state="hidden")
 
     # ---------- 事件 ----------
     def _on_motion(self, e):
-        _ = self._pixel_to_sq(e.x, e.y)
+        sq = self._pixel_to_sq(e.x, e.y)
+        if sq == self._hover_sq:
+            return
+        self._hover_sq = sq
+        # 同一轮事件循环内的多次移动合并为一次高亮更新
+        if self._motion_job is None:
+            self._motion_job = self.canvas.after_idle(self._flush_motion)
+
+    def _flush_motion(self):
+        self._motion_job = None
         self.update_highlights()
 
+    def cancel_pending(self):
+        if self._motion_job is not None:
+            self.canvas.after_cancel(self._motion_job)
+            self._motion_job = None
+
     def _on_click(self, event):
         sq = self._pixel_to_sq(event.x, event.y)
         if sq is None:
@@ -240,18 +414,7 @@ class BoardCanvas:
                 self.gui.set_selection(None)
                 return
 
-            # —— 先生成SAN，后落子 —— #
-            san = self.gui.san_traditional(matched)
-            self.gui.board.make_move(matched)
-
-            # 交给GUI做“主线/变招”的记账
-            self.gui.record_move_played(san)
-
-            # 刷新
-            self.gui.set_selection(None)
-            self.draw_board()
-            self.update_highlights()
-            self.gui.refresh_moves_list()
+            self.gui.play_move(matched)
 
             res = self.gui.board.game_result()
             if res:
@@ -259,34 +422,32 @@ class BoardCanvas:
                     winner = '红方' if res.startswith('r') else '黑方'
                     messagebox.showinfo('对局结束', f'将死！胜者：{winner}')
                 else:
-                    messagebox.showinfo('对局结束', f'对局结束：{res}')
+                    messagebox.showinfo('对局结束', f'对局结束：{xr.RESULT_TEXT.get(res, res)}')
             return
 
         self.gui.set_selection(None)
 
     # ---------- 缩放与像素↔格子 ----------
     def _on_resize(self, event):
-        db.SQUARE_SIZE = min(
+        self.square_size = min(
             max(20, (event.width - 2 * db.MARGIN) // db.BOARD_COLS),
             max(20, (event.height - 2 * db.MARGIN) // db.BOARD_ROWS)
         )
-        board_width = (db.BOARD_COLS - 1) * db.SQUARE_SIZE + 2 * db.MARGIN
-        board_height = (db.BOARD_ROWS - 1) * db.SQUARE_SIZE + 2 * db.MARGIN
+        board_width = (db.BOARD_COLS - 1) * self.square_size + 2 * db.MARGIN
+        board_height = (db.BOARD_ROWS - 1) * self.square_size + 2 * db.MARGIN
         self.gui.offset_x = (event.width - board_width) // 2
         self.gui.offset_y = (event.height - board_height) // 2
 
-        self.draw_board()
-        self.update_highlights()
+        # 拖动窗口时连续的 <Configure> 合并为一次重画
+        self.gui.request_refresh("board", action="缩放")
 
     def _pixel_to_sq(self, px, py):
-        start_x = self.gui.offset_x + db.MARGIN
-        start_y = self.gui.offset_y + db.MARGIN
-        for r in range(db.BOARD_ROWS):
-            for c in range(db.BOARD_COLS):
-                cx = start_x + c * db.SQUARE_SIZE
-                cy = start_y + r * db.SQUARE_SIZE
-                if abs(px - cx) <= db.SQUARE_SIZE / 2 and abs(py - cy) <= db.SQUARE_SIZE / 2:
-                    return (r, c)
+        """像素 → 格子：直接按格距取整，落在棋盘外返回 None。"""
+        S = self.square_size
+        c = math.floor((px - self.gui.offset_x - db.MARGIN) / S + 0.5)
+        r = math.floor((py - self.gui.offset_y - db.MARGIN) / S + 0.5)
+        if 0 <= r < db.BOARD_ROWS and 0 <= c < db.BOARD_COLS:
+            return (r, c)
         return None
 
 
@@ -327,6 +488,8 @@ class MovesPanel:
 
         moves_pairs = self.gui.get_display_moves()
 
+        # ply 按实际着法计数（黑方先行时首行红着为空）
+        ply = 0
         for idx, (rmove, bmove) in enumerate(moves_pairs, start=1):
             rmove = rmove or ""
             bmove = bmove or ""
@@ -334,13 +497,15 @@ class MovesPanel:
 
             # 红走行
             self.listbox.insert(tk.END, f"{prefix}{rmove}")
-            ply_red = (2 * (idx - 1) + 1) if rmove else None
-            self.index_to_ply.append(ply_red)
+            if rmove:
+                ply += 1
+            self.index_to_ply.append(ply if rmove else None)
 
             # 黑走行
             self.listbox.insert(tk.END, f"{' ' * len(prefix)}{bmove}")
-            ply_black = (2 * (idx - 1) + 2) if bmove else None
-            self.index_to_ply.append(ply_black)
+            if bmove:
+                ply += 1
+            self.index_to_ply.append(ply if bmove else None)
 
         self.listbox.see(tk.END)
 
@@ -359,9 +524,12 @@ class MovesPanel:
             self.listbox.selection_clear(0, tk.END)
             self.listbox.see(0)
             return
-        move_idx = (ply - 1) // 2 + 1
-        is_black = (ply % 2 == 0)
-        row = (move_idx - 1) * 2 + (1 if is_black else 0)
+        if ply in self.index_to_ply:
+            row = self.index_to_ply.index(ply)
+        else:
+            move_idx = (ply - 1) // 2 + 1
+            is_black = (ply % 2 == 0)
+            row = (move_idx - 1) * 2 + (1 if is_black else 0)
         row = max(0, min(row, self.listbox.size() - 1))
         self.listbox.selection_clear(0, tk.END)
         self.listbox.selection_set(row)
@@ -430,6 +598,94 @@ class VariationPanel:
                 self.refresh_for_pivot(self._cur_pivot)
 
 
+# ======================= opening_panel.py =======================
+class OpeningPanel:
+    """
+    主线棋谱旁的“开局统计”：当前局面在棋谱库中出现过的每个后续着法及其战绩
+    - 数据来自 <库>.xqot（opening_tree.build_tree 预先算好），换局面只做一次二分查找
+    - 双击一行：在棋盘上走这一步（与手动走子相同，按主线/变着记账）
+    """
+    COLUMNS = (("games", "局数", 56), ("red", "红胜", 52), ("draw", "和", 52),
+               ("black", "黑胜", 52), ("score", "红方得分", 64))
+
+    def __init__(self, gui, parent):
+        self.gui = gui
+        self.frame = ttk.Frame(parent)
+        self.lbl = ttk.Label(self.frame, text="开局统计", font=("Microsoft YaHei", 10, "bold"))
+        self.lbl.pack(anchor=tk.W, padx=6, pady=(6, 2))
+
+        box = ttk.Frame(self.frame)
+        box.pack(fill=tk.BOTH, expand=True, padx=6, pady=(0, 6))
+        self.tree = ttk.Treeview(box, columns=[c[0] for c in self.COLUMNS], selectmode="browse")
+        self.tree.heading("#0", text="着法")
+        self.tree.column("#0", width=90, stretch=True)
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, anchor=tk.E, stretch=False)
+        vbar = ttk.Scrollbar(box, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=vbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind("<Double-Button-1>", self._play_selected)
+        self.tree.bind("<Return>", self._play_selected)
+
+        self._book: Optional[opening_tree.OpeningTree] = None
+        self._book_key = None          # (路径, 修改时间)：统计文件被重建后自动重新打开
+        self._shown = None             # (文件键, 局面哈希)：局面没变就不重画
+        self._rows: Dict[str, xr.Move] = {}
+
+    def _open_book(self) -> Optional[opening_tree.OpeningTree]:
+        db_path = self.gui.collection_path
+        path = opening_tree.tree_path_for(db_path) if db_path else None
+        key = (path, os.path.getmtime(path)) if path and os.path.exists(path) else None
+        if key != self._book_key:
+            self.close()
+            self._book_key = key
+            if key is not None:
+                try:
+                    self._book = opening_tree.OpeningTree(path)
+                except hashfile.HashFileError:
+                    self._book = None
+        return self._book
+
+    def refresh(self):
+        if self.gui.research.busy:
+            return                      # 后台任务（可能在重建统计文件）结束时会再刷新
+        book = self._open_book()
+        board = self.gui.board
+        shown = (self._book_key, board.zobrist())
+        if shown == self._shown:
+            return
+        self._shown = shown
+        self.tree.delete(*self.tree.get_children())
+        self._rows.clear()
+        if book is None:
+            hint = "未建立：棋谱库 → 建立/更新开局统计" if self.gui.collection_path else "未选择棋谱库"
+            self.lbl.config(text=f"开局统计（{hint}）")
+            return
+        stats = book.moves(board)
+        total = sum(st.games for st in stats)
+        self.lbl.config(text=f"开局统计（{total} 局）" if stats else "开局统计（库中无此局面）")
+        for st in stats:
+            score = "-" if st.score is None else f"{st.score * 100:.1f}%"
+            iid = self.tree.insert("", tk.END, text=board.move_to_chinese(st.move), values=(
+                st.games, f"{st.pct(st.red):.0f}%", f"{st.pct(st.draw):.0f}%",
+                f"{st.pct(st.black):.0f}%", score))
+            self._rows[iid] = st.move
+
+    def _play_selected(self, _evt=None):
+        sel = self.tree.selection()
+        if sel and sel[0] in self._rows:
+            self.gui.play_move(self._rows[sel[0]])
+
+    def close(self):
+        if self._book is not None:
+            self._book.close()
+            self._book = None
+        self._book_key = None
+        self._shown = None
+
+
 # ======================= file_ops.py（略注：仍仅保存主线） =======================
 class FileOps:
     def __init__(self, gui):
@@ -494,40 +750,57 @@ class FileOps:
         self.gui.new_game()
         self.gui.metadata["title"] = title
         self.gui.metadata["author"] = author
-        self.gui.board.side_to_move = 'r' if side.lower() != 'b' else 'b'
+        if side.lower() == 'b':
+            self.gui.start_fen = xr.START_FEN[:-1] + 'b'
+            self.gui.board = self.gui._new_board()
         self.gui.root.title(f"象棋摆谱器 - {self.gui.metadata['title'] or '新局'}")
         self.gui.mark_dirty()
 
-    def spawn_new_window(self, new_game=False, open_dialog=False):
-        exe = sys.executable
-        main_py = os.path.join(os.path.dirname(__file__) if "__file__" in globals() else os.getcwd(), "main.py")
-        main_py = os.path.abspath(main_py)
-        args = [exe, main_py]
-        try:
-            if sys.platform.startswith("win"):
-                subprocess.Popen(args, creationflags=subprocess.DETACHED_PROCESS)
-            else:
-                subprocess.Popen(args)
-        except Exception as e:
-            messagebox.showerror("错误", f"无法启动新窗口：{e}")
-            return
+    def spawn_new_window(self, open_dialog=False):
+        """
+        在同一进程内新开一个棋谱窗口（Toplevel），不再另起解释器：
+        字体解析结果、棋盘/棋子贴图等模块级缓存由所有窗口共享。
+        新窗口一律挂在 Tk 根窗口下，不挂在发起它的窗口下：否则关掉发起窗口会连带销毁它，
+        不经过 on_close（不提示保存，documents 里也留着已销毁的窗口）
+        """
+        top = tk.Toplevel(self.gui.root._root())
+        doc = XiangqiGUI(top)
         if open_dialog:
-            messagebox.showinfo("提示", "已打开新窗口，请在新窗口中执行‘文件-打开’。")
+            doc.load_game()
+        return doc
 
     def save_quick(self):
         if 0 <= self.recent_index < len(self.recent_files):
             path = self.recent_files[self.recent_index]
+            if path.lower().endswith(('.cbl', '.xqdb')) or self._is_multi_game_pgn(path):
+                # 棋谱库 / 多局 PGN 不能整体覆盖成单局，也不应重复追加
+                self.save_game()
+                return
             self.save_to_path(path)
         else:
             self.save_game()
 
+    @staticmethod
+    def _is_multi_game_pgn(path) -> bool:
+        """PGN 文件里是否不止一局（只读到第二局为止）；读不了也按多局处理，宁可另存"""
+        if not path.lower().endswith('.pgn') or not os.path.exists(path):
+            return False
+        games = pgn_io.iter_pgn_games(path)
+        try:
+            return next(games, None) is not None and next(games, None) is not None
+        except Exception:
+            return True
+        finally:
+            games.close()
+
     def save_game(self):
         filetypes = [
             ("JSON 棋谱（主线+注释）", "*.json"),
             ("文本棋谱（主线）", "*.txt"),
             ("PGN 棋谱（主线）", "*.pgn"),
-            ("CBR 棋谱", "*.cbr"),
             ("XQF 棋谱", "*.xqf"),
+            ("CBR 棋谱", "*.cbr"),
+            ("棋谱库（追加）", "*.xqdb"),
             ("所有文件", "*.*"),
         ]
         fn = filedialog.asksaveasfilename(defaultextension=".json", filetypes=filetypes, parent=self.gui.root)
@@ -538,50 +811,24 @@ class FileOps:
         self.recent_index = self.recent_files.index(os.path.abspath(fn))
 
     def save_to_path(self, fn):
-        _, ext = os.path.splitext(fn)
-        ext = ext.lower()
+        ext = os.path.splitext(fn)[1].lower()
         try:
-            if ext in ('.json', '.xqf', '.cbr'):
-                data = {
-                    "moves": self.gui.moves_list,                    # 仅主线
-                    "meta": self.gui.metadata,
-                    "comments": {str(k): v for k, v in self.gui.comments.items()},
-                }
-                write_json(fn, data)
-
-            elif ext == '.txt':
-                with open(fn, 'w', encoding='utf-8') as f:
-                    for idx, (rmove, bmove) in enumerate(self.gui.moves_list, start=1):
-                        r = rmove or ""
-                        b = bmove or ""
-                        prefix = f"{idx}.  "
-                        f.write(f"{prefix}{r}\n")
-                        f.write(f"{' ' * len(prefix)}{b}\n")
-
-            elif ext == '.pgn':
-                headers = [
-                    f"[Event \"Local Game\"]",
-                    f"[Date \"{datetime.date.today().strftime('%Y.%m.%d')}\"]",
-                    f"[Result \"*\"]",
-                    ""
-                ]
-                tokens = []
-                for idx, (rmove, bmove) in enumerate(self.gui.moves_list, start=1):
-                    if rmove:
-                        tokens.append(f"{idx}. {rmove}")
-                    if bmove:
-                        tokens.append(f"{bmove}")
-                body = ' '.join(tokens) + ' *\n'
-                with open(fn, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(headers))
-                    f.write(body)
-
+            rec = self.current_record()
+            if ext == '.pgn':
+                rec.headers.setdefault("Event", "Local Game")
+                rec.headers.setdefault("Date", datetime.date.today().strftime('%Y.%m.%d'))
+            if ext == '.xqdb':
+                # 棋谱库：追加为新的一局
+                with game_db.GameDBWriter(fn) as w:
+                    w.add(rec)
+                    total = len(w)
+                msg = f'已添加到棋谱库（第 {total} 局）：{fn}'
             else:
-                data = {"moves": self.gui.moves_list, "meta": self.gui.metadata}
-                write_json(fn, data)
+                game_io.write_game(fn, rec)
+                msg = f'已保存：{fn}'
 
             self.gui.clear_dirty()
-            messagebox.showinfo('保存成功', f'已保存：{fn}', parent=self.gui.root)
+            messagebox.showinfo('保存成功', msg, parent=self.gui.root)
         except Exception as e:
             messagebox.showerror('保存失败', str(e), parent=self.gui.root)
 
@@ -591,6 +838,8 @@ class FileOps:
             ("文本棋谱", "*.txt"),
             ("PGN 棋谱", "*.pgn"),
             ("CBR 棋谱", "*.cbr"),
+            ("CBL 棋谱库", "*.cbl"),
+            ("棋谱库", "*.xqdb"),
             ("XQF 棋谱", "*.xqf"),
             ("所有文件", "*.*"),
         ]
@@ -601,102 +850,101 @@ class FileOps:
         self.add_recent(fn)
         self.recent_index = self.recent_files.index(os.path.abspath(fn))
 
-    def load_game_from_path(self, fn):
-        _, ext = os.path.splitext(fn)
-        ext = ext.lower()
+    # ---- 记录 <-> 界面数据 ----
+    def current_record(self) -> GameRecord:
+        return record_from_parts(self.gui.moves_list, self.gui.metadata, self.gui.comments,
+                                 self.gui.var_mgr.variations, self.gui.start_fen)
+
+    def apply_record(self, rec: GameRecord, default_title: str = ""):
+        self.gui.start_fen = rec.start_fen
+        self.gui.moves_list = rec.move_pairs()
+        self.gui.metadata = headers_to_meta(rec.headers, default_title)
+        self.gui.comments = dict(rec.comments)
+        self.gui.var_mgr = VariationManager()
+        for pivot, san_moves in rec.variations:
+            self.gui.var_mgr.add(pivot, san_moves)
+
+    def _pick_pgn_game(self, fn) -> GameRecord:
+        """多局 PGN：流式读取，只在需要时询问载入第几局"""
+        games = pgn_io.iter_pgn_games(fn)
         try:
-            if ext in ('.json', '.xqf', '.cbr'):
-                with open(fn, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.gui.moves_list = data.get('moves', [])
-                self.gui.metadata = data.get('meta', {"title": "", "author": "", "remark": ""})
-                raw_comm = data.get('comments', {})
-                self.gui.comments = {int(k): v for k, v in raw_comm.items()}
-
-            elif ext == '.txt':
-                moves = []
-                with open(fn, 'r', encoding='utf-8') as f:
-                    raw_lines = [ln.rstrip("\n") for ln in f]
-                i = 0
-                n = len(raw_lines)
-                while i < n:
-                    line = raw_lines[i].strip()
-                    if not line:
-                        i += 1; continue
-                    m = re.match(r'^(\d+)\.\s+(.*)$', line)
-                    if m:
-                        rmove = (m.group(2) or "").strip()
-                        bmove = ""
-                        j = i + 1
-                        while j < n and raw_lines[j].strip() == "":
-                            j += 1
-                        if j < n:
-                            nxt = raw_lines[j].strip()
-                            if not re.match(r'^\d+\.\s+', nxt):
-                                bmove = nxt
-                                i = j + 1
-                            else:
-                                i = i + 1
-                        else:
-                            i = i + 1
-                        moves.append([rmove, bmove])
-                        continue
-                    parts = line.split('.', 1)
-                    rest = parts[1].strip() if len(parts) == 2 else line
-                    tokens = [t for t in rest.split() if t]
-                    if tokens:
-                        if len(tokens) == 1: moves.append([tokens[0], ""])
-                        else: moves.append([tokens[0], tokens[1]])
-                    i += 1
-                self.gui.moves_list = moves
-                self.gui.metadata = {"title": os.path.basename(fn), "author": "", "remark": ""}
-                self.gui.comments = {}
-
-            elif ext == '.pgn':
-                with open(fn, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                body = '\n'.join([ln for ln in text.splitlines() if not ln.startswith('[')])
-                body = body.replace('\\n', ' ').strip()
-                body = re.sub(r'\{[^}]*\}', '', body)
-                tokens = [t for t in re.split(r'\s+', body) if t]
-                cur = []
-                for tok in tokens:
-                    if re.match(r'^\d+\.$', tok): continue
-                    if tok in ('*', '1-0', '0-1', '1/2-1/2'): break
-                    cur.append(tok)
-                pairs = []
-                for i in range(0, len(cur), 2):
-                    rmove = cur[i]
-                    bmove = cur[i+1] if i+1 < len(cur) else ""
-                    pairs.append([rmove, bmove])
-                self.gui.moves_list = pairs
-                self.gui.metadata = {"title": os.path.basename(fn), "author": "", "remark": ""}
-                self.gui.comments = {}
+            rec = next(games, None)
+            if rec is None:
+                raise ValueError("文件中没有棋谱")
+            second = next(games, None)
+            if second is None:
+                return rec
+            idx = simpledialog.askinteger("选择棋谱", "该文件包含多局棋谱，载入第几局？",
+                                          initialvalue=1, minvalue=1, parent=self.gui.root)
+            if not idx or idx == 1:
+                return rec
+            if idx == 2:
+                return second
+            found = next(itertools.islice(games, idx - 3, None), None)
+            if found is None:
+                messagebox.showwarning("提示", f"文件中不足 {idx} 局，已载入第 1 局。", parent=self.gui.root)
+                return rec
+            return found
+        finally:
+            games.close()
+
+    def _pick_cbl_game(self, fn) -> GameRecord:
+        """CBL 棋谱库：只建偏移索引，选中的那一局才解码"""
+        with cbr_io.CblLibrary(fn) as lib:
+            if not len(lib):
+                raise ValueError("棋谱库中没有棋谱")
+            idx = 1
+            if len(lib) > 1:
+                idx = simpledialog.askinteger("选择棋谱", f"该库包含 {len(lib)} 局棋谱，载入第几局？",
+                                              initialvalue=1, minvalue=1, maxvalue=len(lib),
+                                              parent=self.gui.root) or 1
+            return lib[idx - 1]
+
+    def show_record(self, rec: GameRecord, title: str):
+        """把一局棋谱载入本窗口：套用记录、复盘主线、复位界面；返回复盘失败列表"""
+        self.apply_record(rec, title)
+        self.gui._replay_mainline()
+        self.gui._current_selected_ply = len(self.gui.board.history)
+        self.gui._building_var = None
+        self.gui.request_refresh("board", "moves", "note", "variations", action="打开")
+        self.gui.set_selection(None)
+        self.gui.root.title(f"象棋摆谱器 - {self.gui.metadata.get('title') or title}")
+        self.gui.clear_dirty()
+        return self.gui.replay_failures
+
+    def _pick_db_game(self, fn) -> GameRecord:
+        """xqdb 棋谱库：mmap 随机读取，只解码选中的一局"""
+        with game_db.GameDB(fn) as db:
+            if not len(db):
+                raise ValueError("棋谱库中没有棋谱")
+            idx = 1
+            if len(db) > 1:
+                idx = simpledialog.askinteger("选择棋谱", f"该库包含 {len(db)} 局棋谱，载入第几局？",
+                                              initialvalue=1, minvalue=1, maxvalue=len(db),
+                                              parent=self.gui.root) or 1
+            self.gui.collection_path = fn       # 局面搜索等研究功能默认用这个库
+            return db[idx - 1]
 
+    def load_game_from_path(self, fn):
+        ext = os.path.splitext(fn)[1].lower()
+        try:
+            if ext == '.pgn':
+                rec = self._pick_pgn_game(fn)
+            elif ext == '.cbl':
+                rec = self._pick_cbl_game(fn)
+            elif ext == '.xqdb':
+                rec = self._pick_db_game(fn)
             else:
-                with open(fn, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                self.gui.moves_list = data.get('moves', [])
-                self.gui.metadata = data.get('meta', {"title": "", "author": "", "remark": ""})
-                self.gui.comments = {}
-
-            # 重放到棋盘（主线）
-            self.gui.board = xr.Board()
-            for rmove, bmove in self.gui.moves_list:
-                if rmove: self.gui._play_san_force(rmove)
-                if bmove: self.gui._play_san_force(bmove)
-
-            # 复位状态/界面
-            self.gui._current_selected_ply = len(self.gui.board.history)
-            self.gui._building_var = None
-            self.gui.board_canvas.draw_board()
-            self.gui.set_selection(None)
-            self.gui.refresh_moves_list()
-            self.gui._refresh_note_editor()
-            self.gui.refresh_variations_box()  # 刷新当前步的变着列表
-            self.gui.root.title(f"象棋摆谱器 - {self.gui.metadata.get('title') or os.path.basename(fn)}")
-            self.gui.clear_dirty()
-            messagebox.showinfo('加载成功', f'已加载：{fn}', parent=self.gui.root)
+                rec = game_io.read_game(fn)
+            failures = self.show_record(rec, os.path.basename(fn))
+            if failures:
+                lines = [f"第 {ply} 步「{san}」：{err}" for ply, san, err in failures[:5]]
+                if len(failures) > 5:
+                    lines.append(f"……共 {len(failures)} 步")
+                messagebox.showwarning('加载完成（有着法无法走出）', f'已加载：{fn}\n\n' + "\n".join(lines),
+                                       parent=self.gui.root)
+            else:
+                messagebox.showinfo('加载成功', f'已加载：{fn}', parent=self.gui.root)
         except Exception as e:
             messagebox.showerror('加载失败', str(e), parent=self.gui.root)
 
@@ -743,83 +991,412 @@ class BookmarkOps:
         self._restore_to_ply(ply)
 
     def _restore_to_ply(self, ply):
-        self.gui.board = xr.Board()
-        cur = 0
-        for rmove, bmove in self.gui.moves_list:
-            if cur >= ply:
-                break
-            r = rmove if rmove else ""
-            b = bmove if bmove else ""
-            if r:
-                if cur >= ply:
-                    break
-                self.gui.play_san(r)
-                cur += 1
-                if cur > ply:
-                    break
-            if b:
-                if cur >= ply:
-                    break
-                self.gui.play_san(b)
-                cur += 1
-        self.gui.board_canvas.draw_board()
+        self.gui._replay_mainline(ply)
+        self.gui.request_refresh("board", "variations", action="书签跳转")
         self.gui.set_selection(None)
-        self.gui.refresh_moves_list()
-        self.gui.refresh_variations_box()
         self.gui.mark_dirty()
 
 
+# ======================= research_ops.py =======================
+class ResearchOps:
+    """基于 .xqdb 棋谱库的研究功能：局面索引与“相同局面”查询"""
+
+    def __init__(self, gui):
+        self.gui = gui
+        self._busy = False
+        self.book: Optional[opening_book.OpeningBook] = None
+        self.tablebases: Optional["tablebase.Tablebases"] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def choose_collection(self) -> Optional[str]:
+        fn = filedialog.askopenfilename(filetypes=[("棋谱库", "*.xqdb"), ("所有文件", "*.*")],
+                                        parent=self.gui.root)
+        if fn:
+            self.gui.collection_path = fn
+            self.gui.request_refresh("explorer", action="选择棋谱库")
+        return fn or None
+
+    def _collection(self) -> Optional[str]:
+        path = self.gui.collection_path
+        if path and os.path.exists(path):
+            return path
+        return self.choose_collection()
+
+    def _run_in_background(self, work: Callable, on_done: Callable, title: str):
+        """耗时的建索引放到线程里做，界面线程只轮询结果"""
+        if self._busy:
+            messagebox.showinfo("提示", "已有后台任务在运行。", parent=self.gui.root)
+            return
+        import threading
+        result = {}
+
+        def target():
+            try:
+                result["value"] = work()
+            except Exception as e:
+                result["error"] = e
+
+        self._busy = True
+        th = threading.Thread(target=target, daemon=True)
+        th.start()
+        self.gui.root.title(f"象棋摆谱器 - {title}……")
+
+        def poll():
+            if th.is_alive():
+                self.gui.root.after(200, poll)
+                return
+            self._busy = False
+            self.gui.root.title(f"象棋摆谱器 - {self.gui.metadata.get('title') or '新局'}")
+            # 开局统计面板在任务运行期间跳过了刷新；不论成败都补一次
+            self.gui.request_refresh("explorer", action="后台任务")
+            if "error" in result:
+                messagebox.showerror("失败", str(result["error"]), parent=self.gui.root)
+            else:
+                on_done(result.get("value"))
+
+        self.gui.root.after(200, poll)
+
+    def build_position_index(self, then: Optional[Callable] = None):
+        path = self._collection()
+        if not path:
+            return
+
+        def done(res):
+            n_new, n_rec = res
+            if then is not None:
+                then()
+            else:
+                messagebox.showinfo("局面索引", f"新收录 {n_new} 局，索引共 {n_rec} 条记录。",
+                                    parent=self.gui.root)
+
+        self._run_in_background(lambda: position_index.build_index(path), done, "正在建立局面索引")
+
+    def build_opening_tree(self):
+        path = self._collection()
+        if not path:
+            return
+
+        def done(res):
+            n_new, n_edges = res
+            messagebox.showinfo("开局统计", f"新收录 {n_new} 局，共 {n_edges} 条着法记录。",
+                                parent=self.gui.root)
+
+        if self.gui.explorer is not None:
+            self.gui.explorer.close()       # Windows 下映射着的文件不能被替换
+        self._run_in_background(lambda: opening_tree.build_tree(path), done, "正在统计开局")
+
+    def build_opening_book(self):
+        path = self._collection()
+        if not path:
+            return
+        plies = simpledialog.askinteger("建立开局库", "收录每局前多少个半步？", parent=self.gui.root,
+                                        initialvalue=opening_book.DEFAULT_PLIES, minvalue=1, maxvalue=200)
+        if not plies:
+            return
+        out = filedialog.asksaveasfilename(defaultextension=".xqbk", filetypes=[("开局库", "*.xqbk")],
+                                           initialfile=os.path.splitext(os.path.basename(path))[0] + ".xqbk",
+                                           parent=self.gui.root)
+        if not out:
+            return
+        if self.book is not None and os.path.abspath(self.book.path) == os.path.abspath(out):
+            self.book.close()
+            self.book = None
+
+        def done(count):
+            self._open_book(out)
+            messagebox.showinfo("开局库", f"已建立：{count} 个条目。", parent=self.gui.root)
+
+        self._run_in_background(lambda: opening_book.build_book(path, out, plies), done, "正在建立开局库")
+
+    def _open_book(self, path: str) -> bool:
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        try:
+            self.book = opening_book.OpeningBook(path)
+        except (OSError, hashfile.HashFileError) as e:
+            messagebox.showerror("开局库", f"无法打开开局库：{e}", parent=self.gui.root)
+            return False
+        return True
+
+    def load_opening_book(self) -> bool:
+        fn = filedialog.askopenfilename(filetypes=[("开局库", "*.xqbk"), ("所有文件", "*.*")],
+                                        parent=self.gui.root)
+        return bool(fn) and self._open_book(fn)
+
+    def book_move(self):
+        """按开局库权重随机应一步（打谱/对练时跳过已知开局）"""
+        if self.book is None and not self.load_opening_book():
+            return
+        mv = self.book.pick(self.gui.board)
+        if mv is None:
+            messagebox.showinfo("开局库", "当前局面不在开局库中。", parent=self.gui.root)
+            return
+        self.gui.play_move(mv)
+
+    def probe_tablebase(self):
+        """查残局库：当前局面的胜负、距将死步数与最佳着法"""
+        import tablebase            # 只有菜单里用到，不拖慢启动
+        if self.tablebases is None:
+            self.tablebases = tablebase.Tablebases(TABLEBASE_DIR)
+        board = self.gui.board
+        try:
+            res = self.tablebases.probe(board)
+        except tablebase.TablebaseError as e:
+            messagebox.showerror("残局库", str(e), parent=self.gui.root)
+            return
+        if res is None:
+            name = tablebase.board_material(board)
+            messagebox.showinfo("残局库", f"残局库中没有 {name}（或当前局面无效）。\n"
+                                          f"生成：python tablebase.py gen {name} --dir \"{TABLEBASE_DIR}\"",
+                                parent=self.gui.root)
+            return
+        best = self.tablebases.best_move(board)
+        text = str(res)
+        if best is not None:
+            text += f"\n最佳着法：{board.move_to_chinese(best)}"
+        messagebox.showinfo("残局库", text, parent=self.gui.root)
+
+    def close(self):
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if self.tablebases is not None:
+            self.tablebases.close()
+            self.tablebases = None
+
+    def find_same_position(self):
+        path = self._collection()
+        if not path:
+            return
+        idx_path = position_index.index_path_for(path)
+        with game_db.GameDB(path) as gdb:
+            total = len(gdb)
+            covered = position_index.covered_games(idx_path, position_index.INDEX_MAGIC, gdb)
+        if covered != total:
+            what = "还没有可用的局面索引" if covered is None else f"局面索引只收录了 {covered}/{total} 局"
+            if messagebox.askyesno("局面索引", f"{what}，现在建立？", parent=self.gui.root):
+                self.build_position_index(then=self.find_same_position)
+            return
+        t0 = time.perf_counter()
+        with position_index.PositionIndex(idx_path) as idx:
+            hits = idx.find_board(self.gui.board)
+        ms = (time.perf_counter() - t0) * 1000
+        if not hits:
+            messagebox.showinfo("查找相同局面", f"棋谱库中没有对局走到过当前局面（{ms:.1f} ms）。",
+                                parent=self.gui.root)
+            return
+        self._show_hits(path, hits, f"相同局面：{len(hits)} 局（{ms:.1f} ms）")
+
+    def find_same_material(self):
+        """找库中子力与当前局面完全相同的局面（每局报告最早的一步）"""
+        import material_search      # 会带入 NumPy；只有菜单里用到，不拖慢启动
+        path = self._collection()
+        if not path:
+            return
+        arr_path = material_search.positions_path_for(path)
+        with game_db.GameDB(path) as gdb:
+            total = len(gdb)
+            covered = material_search.covered_games(arr_path, gdb)
+        try:
+            pa = material_search.PositionArrays(arr_path) if covered == total else None
+        except (OSError, material_search.MaterialSearchError):
+            pa = None
+        if pa is None:
+            if messagebox.askyesno("子力搜索", "局面数组未建立或不是最新，现在建立？", parent=self.gui.root):
+                self._run_in_background(lambda: material_search.build_positions(path),
+                                        lambda _res: self.find_same_material(), "正在建立局面数组")
+            return
+        with pa:
+            res = pa.search(material_search.PositionQuery(material_search.material_of(self.gui.board)))
+        speed = f"{res.scanned:,} 个局面，{res.positions_per_sec:,.0f} 局面/秒"
+        if not res.hits:
+            messagebox.showinfo("子力搜索", f"棋谱库中没有同子力的局面（扫描 {speed}）。", parent=self.gui.root)
+            return
+        self._show_hits(path, res.hits, f"同子力：{len(res.hits)} 局（扫描 {speed}）")
+
+    def _show_hits(self, path, hits, title: str):
+        top = tk.Toplevel(self.gui.root)
+        top.title(title)
+        top.geometry("560x360")
+        lb = tk.Listbox(top, font=("Microsoft YaHei", 11), activestyle="dotbox")
+        sb = ttk.Scrollbar(top, orient="vertical", command=lb.yview)
+        lb.configure(yscrollcommand=sb.set)
+        sb.pack(side="right", fill="y")
+        lb.pack(side="left", fill="both", expand=True)
+        with game_db.GameDB(path) as gdb:
+            for gid, ply in hits:
+                h = gdb.headers(gid)
+                players = " - ".join(x for x in (h.get("Red"), h.get("Black")) if x)
+                lb.insert(tk.END, f"#{gid + 1}  第 {ply} 步  {h.get('Event', '')}  {players}  {h.get('Result', '')}")
+
+        def open_selected(_e=None):
+            sel = lb.curselection()
+            if sel:
+                gid, ply = hits[sel[0]]
+                self.open_game_at(path, gid, ply)
+
+        lb.bind("<Double-Button-1>", open_selected)
+        lb.bind("<Return>", open_selected)
+        lb.focus_set()
+        lb.selection_set(0)
+
+    def open_game_at(self, path, gid, ply):
+        if self.gui._dirty and not messagebox.askyesno("提示", "当前棋谱尚未保存，继续打开其它对局？",
+                                                       parent=self.gui.root):
+            return
+        with game_db.GameDB(path) as gdb:
+            rec = gdb[gid]
+        self.gui.file_ops.show_record(rec, f"{os.path.basename(path)} #{gid + 1}")
+        self.gui.restore_to_ply(ply)
+
+
 # ======================= transforms.py =======================
 class Transforms:
     def __init__(self, gui):
         self.gui = gui
 
+    def _transform_game(self, kind: str, action: str):
+        """整局变换（game_transform）：起始局面、主线、变着一起变换，注释按步号保留，停在原来的步数"""
+        gui = self.gui
+        ply = gui._current_selected_ply
+        if ply is None:
+            ply = len(gui.board.history)
+        try:
+            rec = game_transform.transform_record(gui.file_ops.current_record(), kind)
+        except game_db.GameDBError as e:
+            messagebox.showerror(action, f"棋谱中有走不通的着法，无法整局变换：\n{e}", parent=gui.root)
+            return
+        gui.file_ops.apply_record(rec, gui.metadata.get("title", ""))
+        gui._building_var = None
+        gui.request_refresh("moves", action=action)
+        gui.restore_to_ply(ply)
+        gui.mark_dirty()
+
     def flip_left_right(self):
-        new_board = xr.Board()
-        new_board.history.clear()
-        for r in range(10):
-            for c in range(9):
-                p = self.gui.board.piece_at((r, c))
-                if p:
-                    new_board.set_piece((r, 8 - c), xr.Piece(p.color, p.ptype, pid=p.pid))
-                else:
-                    new_board.set_piece((r, 8 - c), None)
-        new_board.side_to_move = self.gui.board.side_to_move
-        self.gui.board = new_board
-        self.gui.board_canvas.draw_board()
-        self.gui.set_selection(None)
-        self.gui.refresh_moves_list()
-        self.gui.refresh_variations_box()
-        self.gui.mark_dirty()
+        self._transform_game("mirror", "左右交换")
 
     def swap_red_black(self):
-        new_board = xr.Board()
-        new_board.history.clear()
-        for r in range(10):
-            for c in range(9):
-                p = self.gui.board.piece_at((r, c))
-                if p:
-                    new_color = 'b' if p.color == 'r' else 'r'
-                    new_board.set_piece((9 - r, 8 - c), xr.Piece(new_color, p.ptype, pid=p.pid))
-                else:
-                    new_board.set_piece((9 - r, 8 - c), None)
-        new_board.side_to_move = 'b' if self.gui.board.side_to_move == 'r' else 'r'
-        self.gui.board = new_board
-        self.gui.board_canvas.draw_board()
-        self.gui.set_selection(None)
-        self.gui.refresh_moves_list()
-        self.gui.refresh_variations_box()
-        self.gui.mark_dirty()
+        self._transform_game("swap", "红黑对调")
+
+
+# ======================= debug_panel.py =======================
+class ProfilerWindow:
+    """隐藏的调试窗口（Ctrl+Shift+D）：按操作列出热点函数的调用次数与耗时，以及刷新调度统计"""
+    POLL_MS = 500
+
+    def __init__(self, gui):
+        self.gui = gui
+        self.top = tk.Toplevel(gui.root)
+        self.top.title("性能计数")
+        self.top.geometry("680x520")
+        self.top.protocol("WM_DELETE_WINDOW", self.close)
+
+        bar = ttk.Frame(self.top)
+        bar.pack(fill=tk.X, padx=6, pady=4)
+        self.var_enabled = tk.BooleanVar(value=profiling.PROFILER.enabled)
+        ttk.Checkbutton(bar, text="启用计数", variable=self.var_enabled,
+                        command=self._toggle).pack(side=tk.LEFT)
+        ttk.Button(bar, text="清零", command=self._reset).pack(side=tk.LEFT, padx=6)
+        self.lbl_state = ttk.Label(bar, text="")
+        self.lbl_state.pack(side=tk.RIGHT)
+
+        body = ttk.PanedWindow(self.top, orient=tk.VERTICAL)
+        body.pack(fill=tk.BOTH, expand=True, padx=6, pady=(0, 6))
+        tree_frame = ttk.Frame(body)
+        body.add(tree_frame, weight=3)
+        self.tree = ttk.Treeview(tree_frame, columns=("calls", "total", "avg"), show="tree headings")
+        self.tree.heading("#0", text="操作 / 函数")
+        self.tree.heading("calls", text="调用次数")
+        self.tree.heading("total", text="累计(ms)")
+        self.tree.heading("avg", text="平均(µs)")
+        self.tree.column("#0", width=300)
+        for col in ("calls", "total", "avg"):
+            self.tree.column(col, width=100, anchor="e")
+        sb = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=sb.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        sb.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.txt_refresh = tk.Text(body, height=6, wrap="none")
+        body.add(self.txt_refresh, weight=1)
+
+        self._shown_version = None
+        self._shown_refresh = None
+        self._job = None
+        self._poll()
+
+    def _toggle(self):
+        if self.var_enabled.get():
+            profiling.PROFILER.enable()
+        else:
+            profiling.PROFILER.disable()
+
+    def _reset(self):
+        profiling.PROFILER.reset()
+        self.gui.refresher.stats.clear()
+
+    def _insert_stats(self, parent, stats):
+        for name, (calls, seconds) in sorted(stats.items(), key=lambda kv: -kv[1][1]):
+            self.tree.insert(parent, tk.END, text=name, values=(
+                int(calls), f"{seconds * 1000:.1f}", f"{seconds / calls * 1e6:.1f}" if calls else "-"))
+
+    def _render_tree(self):
+        prof = profiling.PROFILER
+        opened = {self.tree.item(i, "text") for i in self.tree.get_children() if self.tree.item(i, "open")}
+        self.tree.delete(*self.tree.get_children())
+        if prof.last_action is not None:
+            action, stats = prof.last_action
+            label = f"最近一次：{action}"
+            node = self.tree.insert("", tk.END, text=label, open=True)
+            self._insert_stats(node, stats)
+        for action, stats in prof.by_action.items():
+            label = f"累计：{action}"
+            node = self.tree.insert("", tk.END, text=label, open=label in opened)
+            self._insert_stats(node, stats)
+
+    def _poll(self):
+        self._job = None
+        prof = profiling.PROFILER
+        if prof.version != self._shown_version:
+            self._shown_version = prof.version
+            self._render_tree()
+        report = self.gui.refresher.report()
+        if report != self._shown_refresh:
+            self._shown_refresh = report
+            self.txt_refresh.delete("1.0", tk.END)
+            self.txt_refresh.insert("1.0", report)
+        self.var_enabled.set(prof.enabled)
+        self.lbl_state.config(text="cProfile 采样中……" if prof.capturing else "")
+        self._job = self.top.after(self.POLL_MS, self._poll)
+
+    def close(self):
+        if self._job is not None:
+            self.top.after_cancel(self._job)
+            self._job = None
+        self.top.destroy()
+        self.gui._debug_win = None
 
 
 # ======================= main_ui.py（XiangqiGUI） =======================
+SNAPSHOT_EVERY = 20       # 复盘途中每隔多少步存一份棋盘快照（跳转时从最近的快照接着走）
+
+
 class XiangqiGUI:
     """
     主组合类：XiangqiGUI（含“变着=主线切换器”）
-    - 右侧：上=棋谱属性；下=左右分栏（左=主线棋谱；右=垂直分栏：上=注释，下=变着列表）
+    - 右侧：上=棋谱属性；下=左右分栏（主线棋谱 | 开局统计 | 垂直分栏：上=注释，下=变着列表）
+    - root 可以是 tk.Tk（主窗口）或 tk.Toplevel（同进程内的其他棋谱窗口）
     """
-    def __init__(self, root: tk.Tk):
+    documents: List["XiangqiGUI"] = []   # 当前进程内打开的全部棋谱窗口
+
+    def __init__(self, root: tk.Misc):
         # —— 基本窗口 ——
+        self._primary = not XiangqiGUI.documents
+        XiangqiGUI.documents.append(self)
         self.root = root
         self.root.title("象棋摆谱器")
         self.root.minsize(980, 640)
@@ -828,12 +1405,19 @@ class XiangqiGUI:
         self._dirty = False
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-        # 棋子字体（棋盘用）
-        available_fonts = list(font.families())
-        fam = next((f for f in db.PIECE_FONT_FAMILY_PREFERRED if f in available_fonts), available_fonts[0])
-        self.piece_font = font.Font(family=fam, size=db.PIECE_FONT_SIZE, weight='bold')
-
-        # 规则与主线数据
+        # 棋子字体（棋盘用；字体族解析结果有磁盘缓存）
+        self.piece_font = font.Font(family=db.resolve_font_family(), size=db.PIECE_FONT_SIZE, weight='bold')
+        if self._primary:
+            startup_mark("字体解析")
+
+        # 规则与主线数据（start_fen=None 表示标准开局）
+        self.start_fen: Optional[str] = None
+        self.replay_failures: List[Tuple[int, str, str]] = []   # 最近一次复盘中走不出的着法
+        self._replay_ply = 0
+        # 复盘快照：{第几步: (棋盘副本, 截至该步的 replay_failures)}，只对 _snapshot_line 这条主线有效
+        self._snapshots: Dict[int, Tuple[xr.Board, tuple]] = {}
+        self._snapshot_line: List[str] = []
+        self._snapshot_fen: Optional[str] = None
         self.board = xr.Board()
         self.moves_list: List[List[str]] = []          # 主线：[[红, 黑], ...]
         self.metadata = {"title": "", "author": "", "remark": ""}
@@ -857,6 +1441,8 @@ class XiangqiGUI:
         # 子模块
         self.file_ops = FileOps(self)
         self.bm_ops = BookmarkOps(self)
+        self.research = ResearchOps(self)
+        self.collection_path: Optional[str] = None       # 当前使用的 .xqdb 棋谱库
         self.transforms = Transforms(self)
 
         # ===== 布局：左棋盘 + 右综合面板 =====
@@ -871,42 +1457,89 @@ class XiangqiGUI:
         right_paned = ttk.PanedWindow(root_paned, orient=tk.VERTICAL)
         root_paned.add(right_paned, weight=2)
 
-        # 右-上：属性
-        self.attr_frame = self._build_attr_frame(right_paned)
+        # 右-上：属性（属性/注释/变着面板较少用到，先放空容器，首次绘制后再填充）
+        self.attr_frame = ttk.Frame(right_paned)
         right_paned.add(self.attr_frame, weight=1)
 
         # 右-下：左右分栏
         lower_paned = ttk.PanedWindow(right_paned, orient=tk.HORIZONTAL)
         right_paned.add(lower_paned, weight=3)
 
-        # 左下：主线棋谱
+        # 左下：主线棋谱 | 开局统计
         self.moves_panel = MovesPanel(self, lower_paned)
         lower_paned.add(self.moves_panel.frame, weight=1)
+        self.explorer_frame = ttk.Frame(lower_paned)
+        lower_paned.add(self.explorer_frame, weight=1)
+        self.explorer = None
 
         # 右下：垂直分栏（上=注释 下=变着列表）
         right_bottom = ttk.PanedWindow(lower_paned, orient=tk.VERTICAL)
         lower_paned.add(right_bottom, weight=1)
 
-        self.notes_frame = self._build_notes_frame(right_bottom)
+        self.notes_frame = ttk.Frame(right_bottom)
         right_bottom.add(self.notes_frame, weight=3)
 
-        self.vari_panel = VariationPanel(self, right_bottom)
-        right_bottom.add(self.vari_panel.frame, weight=2)
+        self.vari_frame = ttk.Frame(right_bottom)
+        right_bottom.add(self.vari_frame, weight=2)
+        self.txt_note = None
+        self.vari_panel = None
 
         # 菜单栏
         self.recent_submenu = None
         self.root.config(menu=create_menubar(self))
 
-        # 初次绘制
-        self.board_canvas.draw_board()
-        self.board_canvas.update_highlights()
-        self.refresh_moves_list()
-        self._refresh_note_editor()
-        self.refresh_variations_box()
+        # 刷新调度（各视图每轮事件循环最多重绘一次）
+        self.refresher = RefreshScheduler(self.root, {
+            "board": self.board_canvas.draw_board,
+            "highlights": self.board_canvas.update_highlights,
+            "moves": self.moves_panel.refresh,
+            "moves_sel": self._select_current_moves_row,
+            "note": self._refresh_note_editor,
+            "variations": self._refresh_variations_pending,
+            "explorer": self._refresh_explorer,
+        })
+        self._vari_pivot: Optional[int] = None
+
+        # 初次绘制；其余面板待首帧出现后再构建
+        self.request_refresh(*RefreshScheduler.ORDER, action="启动")
+        self.root.after_idle(self._after_first_paint)
+        if self._primary:
+            startup_mark("界面构建")
 
         # 快捷键
         self.root.bind("<Control-z>", lambda e: self.undo())
         self.root.bind("<Control-y>", lambda e: self.redo())
+        self.root.bind("<Control-f>", lambda e: self.find_same_position())
+        self.root.bind("<Control-b>", lambda e: self.book_move())
+        self.root.bind("<Control-t>", lambda e: self.probe_tablebase())
+        self.root.bind("<Control-Shift-D>", lambda e: self.toggle_debug_window())
+        self._debug_win: Optional[ProfilerWindow] = None
+
+    def _after_first_paint(self):
+        self.root.update_idletasks()
+        if not self._primary:
+            self._build_deferred_panels()
+            return
+        startup_mark("首次绘制")
+        self._build_deferred_panels()
+        startup_mark("延迟面板")
+        if os.environ.get("XIANGQI_STARTUP_TIMING"):
+            print(startup_report(), file=sys.stderr)
+
+    def _build_deferred_panels(self):
+        if self.vari_panel is not None:
+            return
+        self._build_attr_frame(self.attr_frame).pack(fill=tk.BOTH, expand=True)
+        self._build_notes_frame(self.notes_frame).pack(fill=tk.BOTH, expand=True)
+        self.vari_panel = VariationPanel(self, self.vari_frame)
+        self.vari_panel.frame.pack(fill=tk.BOTH, expand=True)
+        self.explorer = OpeningPanel(self, self.explorer_frame)
+        self.explorer.frame.pack(fill=tk.BOTH, expand=True)
+        self.request_refresh("note", "variations", "explorer")
+
+    def _refresh_explorer(self):
+        if self.explorer is not None:
+            self.explorer.refresh()
 
     # =================== 展示层：主线 ===================
     def get_display_moves(self):
@@ -956,6 +1589,8 @@ class XiangqiGUI:
         return frm
 
     def _refresh_note_editor(self):
+        if self.txt_note is None:
+            return
         ply = self._current_selected_ply
         self.txt_note.delete("1.0", "end")
         if ply is None:
@@ -981,6 +1616,13 @@ class XiangqiGUI:
         self._dirty = False
 
     # ================= 规则封装 =================
+    def _new_board(self) -> xr.Board:
+        """按本局起始局面新建棋盘（排局/黑先等非标准开局由 start_fen 给出）"""
+        board = xr.Board()
+        if self.start_fen:
+            board.set_fen(self.start_fen)
+        return board
+
     def san_traditional(self, move: xr.Move) -> str:
         return self.board.move_to_chinese(move)
 
@@ -994,61 +1636,95 @@ class XiangqiGUI:
             else:
                 self.moves_list.append(["", san])
 
+    # ================= 刷新调度 =================
+    def request_refresh(self, *views, action: Optional[str] = None):
+        """标记视图过期，空闲时统一重绘；views 取自 RefreshScheduler.ORDER。"""
+        self.refresher.mark(*views, action=action)
+
     def refresh_moves_list(self):
-        self.moves_panel.refresh()
+        self.request_refresh("moves")
 
     def set_selection(self, sq):
         self.selected_sq = sq
         if sq is None:
             self.legal_targets = []
-            self.board_canvas.update_highlights()
-            return
-        legal = self.board.generate_legal_moves(self.board.side_to_move)
-        self.legal_targets = [mv.to_sq for mv in legal if mv.from_sq == sq]
-        self.board_canvas.update_highlights()
+        else:
+            legal = self.board.generate_legal_moves(self.board.side_to_move)
+            self.legal_targets = [mv.to_sq for mv in legal if mv.from_sq == sq]
+        self.request_refresh("highlights", action="选子")
 
     # —— 记谱规范化（用于稳健匹配） ——
     def _normalize_san(self, s: str) -> str:
-        if not s:
-            return ""
-        t = s.strip().replace(" ", "")
-        full_to_half = str.maketrans("０１２３４５６７８９", "0123456789")
-        t = t.translate(full_to_half)
-        zh_digit_map = {"零": "0", "〇": "0", "一": "1", "二": "2", "三": "3", "四": "4", "五": "5",
-                        "六": "6", "七": "7", "八": "8", "九": "9", "十": "10"}
-        for k, v in zh_digit_map.items():
-            t = t.replace(k, v)
-        rep = {"車": "车", "馬": "马", "傌": "马", "砲": "炮", "將": "将", "帥": "帅", "士": "仕"}
-        for k, v in rep.items():
-            t = t.replace(k, v)
-        return t
+        return xr.normalize_chinese(s)
 
     def play_san(self, san_str: str):
-        target = self._normalize_san(san_str)
-        legal = self.board.generate_legal_moves(self.board.side_to_move)
-        for mv in legal:
-            cand = self.board.move_to_chinese(mv)
-            if cand == san_str or self._normalize_san(cand) == target or \
-               self._normalize_san(cand).replace(".", "") == target.replace(".", ""):
-                self.board.make_move(mv)
-                return
-        raise ValueError(f"无法在当前局面找到匹配的走法：{san_str}")
+        mv = self.board.parse_chinese(san_str)
+        if mv is None:
+            raise ValueError(f"无法在当前局面找到匹配的走法：{san_str}")
+        self.board.make_move(mv)
 
-    def _play_san_force(self, san_str: str):
+    def _play_san_force(self, san_str: str) -> bool:
+        """复盘用：走不出的着法不打断复盘，记入 replay_failures [(第几步, 着法, 原因)]"""
         try:
             self.play_san(san_str)
-        except Exception:
-            pass
+            return True
+        except Exception as e:
+            self.replay_failures.append((self._replay_ply, san_str, str(e)))
+            return False
+
+    def _nearest_snapshot(self, flat: List[str], ply: int):
+        """不超过 ply 的最近一份快照 → (步数, 快照) 或 None；起始局面或主线改动过的部分作废"""
+        if self._snapshot_fen != self.start_fen:
+            self._snapshots.clear()
+            self._snapshot_fen = self.start_fen
+            self._snapshot_line = []
+        old = self._snapshot_line
+        same = 0
+        n = min(len(old), len(flat))
+        while same < n and old[same] == flat[same]:
+            same += 1
+        if same < len(old):
+            for k in [k for k in self._snapshots if k > same]:
+                del self._snapshots[k]
+        self._snapshot_line = list(flat)
+        best = max((k for k in self._snapshots if k <= ply), default=None)
+        return None if best is None else (best, self._snapshots[best])
+
+    def _replay_mainline(self, ply: Optional[int] = None):
+        """
+        从起始局面按主线复盘到第 ply 步（None = 走完主线）。
+        从不超过 ply 的最近一份快照（Board.copy()）接着走，途中每 SNAPSHOT_EVERY 步和终点各存一份
+        """
+        flat = pairs_to_flat(self.moves_list)
+        target = len(flat) if ply is None else max(0, min(ply, len(flat)))
+        snap = self._nearest_snapshot(flat, target)
+        if snap is None:
+            self.board = self._new_board()
+            self.replay_failures = []
+            self._replay_ply = 0
+        else:
+            self._replay_ply, (board, failures) = snap
+            self.board = board.copy()
+            self.replay_failures = list(failures)
+        for san in flat[self._replay_ply:target]:
+            self._replay_ply += 1
+            self._play_san_force(san)
+            if self._replay_ply % SNAPSHOT_EVERY == 0:
+                self._save_snapshot()
+        if target:
+            self._save_snapshot()
+
+    def _save_snapshot(self):
+        if self._replay_ply not in self._snapshots:
+            self._snapshots[self._replay_ply] = (self.board.copy(), tuple(self.replay_failures))
 
     # ================= 撤销/跳转 =================
     def undo(self):
         if not self.board.history:
             return
         self.board.undo_move()
-        self.board_canvas.draw_board()
+        self.request_refresh("board", "variations", action="悔棋")
         self.set_selection(None)
-        self.refresh_moves_list()
-        self.refresh_variations_box()
         self.mark_dirty()
 
     def delete_last_move(self):
@@ -1059,25 +1735,12 @@ class XiangqiGUI:
 
     def restore_to_ply(self, ply: int):
         """将棋局恢复到给定半步数（以“主线”为准）"""
-        self.board = xr.Board()
-        cur = 0
-        for rmove, bmove in self.moves_list:
-            if cur >= ply: break
-            if rmove:
-                if cur >= ply: break
-                self._play_san_force(rmove); cur += 1
-            if bmove:
-                if cur >= ply: break
-                self._play_san_force(bmove); cur += 1
+        self._replay_mainline(ply)
 
         self._current_selected_ply = ply
         self._building_var = None            # 切换选择时，结束正在录制的变着
-        self.board_canvas.draw_board()
+        self.request_refresh("board", "moves_sel", "note", "variations", action="跳转")
         self.set_selection(None)
-        self.refresh_moves_list()
-        self._refresh_note_editor()
-        self._select_moves_row_for_ply(ply)
-        self.refresh_variations_box()
 
     def on_move_row_selected(self, ply: int):
         self.restore_to_ply(ply)
@@ -1088,6 +1751,10 @@ class XiangqiGUI:
         except Exception:
             pass
 
+    def _select_current_moves_row(self):
+        if self._current_selected_ply is not None:
+            self._select_moves_row_for_ply(self._current_selected_ply)
+
     # =================== 变着核心 ===================
     def _mainline_san_flat(self) -> List[str]:
         flat = []
@@ -1111,6 +1778,7 @@ class XiangqiGUI:
             b = next(it, "")
             new_pairs.append([r, b])
         self.moves_list = new_pairs
+        self.request_refresh("moves", action="应用变着")
 
         # 切换后定位
         if jump_to_end:
@@ -1124,7 +1792,16 @@ class XiangqiGUI:
             # “当前步”的下一步为变着点
             base = self._current_selected_ply or 0
             pivot_ply = base + 1
-        self.vari_panel.refresh_for_pivot(pivot_ply)
+        if self.vari_panel is not None:
+            self.vari_panel.refresh_for_pivot(pivot_ply)
+
+    def _refresh_variations_pending(self):
+        pivot, self._vari_pivot = self._vari_pivot, None
+        self.refresh_variations_box(pivot)
+
+    def request_variations_refresh(self, pivot_ply: Optional[int] = None):
+        self._vari_pivot = pivot_ply
+        self.request_refresh("variations")
 
     def apply_variation_by_id(self, pivot_ply: int, var_id: int):
         v = self.var_mgr.get(pivot_ply, var_id)
@@ -1134,6 +1811,19 @@ class XiangqiGUI:
         self._building_var = None  # 应用后结束录制
         self.mark_dirty()
 
+    def play_move(self, mv: xr.Move):
+        """走一步合法着法并记账（棋盘点击、开局统计双击共用）"""
+        # —— 先生成SAN，后落子 —— #
+        san = self.san_traditional(mv)
+        self.board.make_move(mv)
+
+        # “主线/变招”的记账
+        self.record_move_played(san)
+
+        # 刷新
+        self.request_refresh("board", "moves", action="走子")
+        self.set_selection(None)
+
     def record_move_played(self, san: str):
         """
         由 BoardCanvas 在 make_move 后调用。
@@ -1150,8 +1840,8 @@ class XiangqiGUI:
             # 在末尾继续：主线追加
             self.append_move_mainline(san)
             self._current_selected_ply = len(self.board.history)
-            self._select_moves_row_for_ply(self._current_selected_ply)
-            self.refresh_variations_box()
+            self.request_refresh("moves_sel")
+            self.request_variations_refresh()
             self.mark_dirty()
             # 末尾走子 → 不是变着，结束任何录制
             self._building_var = None
@@ -1170,15 +1860,16 @@ class XiangqiGUI:
             self._building_var = (pivot, var_id)
 
         # 更新右下变着列表（显示当前 pivot 的备选）
-        self.refresh_variations_box(pivot_ply=pivot)
+        self.request_variations_refresh(pivot_ply=pivot)
         self._current_selected_ply = len(self.board.history)
-        self._select_moves_row_for_ply(self._current_selected_ply)
+        self.request_refresh("moves_sel")
         # 注意：主线不变，等待用户从变着列表中选择切换
         self.mark_dirty()
 
     # ================= 菜单委托 =================
     # 文件
     def new_game(self):
+        self.start_fen = None
         self.board = xr.Board()
         self.moves_list.clear()
         self.comments.clear()
@@ -1189,11 +1880,7 @@ class XiangqiGUI:
         self.legal_targets = []
         self._current_selected_ply = None
 
-        self.board_canvas.draw_board()
-        self.board_canvas.update_highlights()
-        self.refresh_moves_list()
-        self._refresh_note_editor()
-        self.refresh_variations_box()
+        self.request_refresh("board", "moves", "note", "variations", action="新局")
         self.root.title("象棋摆谱器 - 新局")
         self.clear_dirty()
 
@@ -1252,6 +1939,34 @@ class XiangqiGUI:
     def bookmark_jump(self):
         self.bm_ops.bookmark_jump()
 
+    # 棋谱库研究
+    def choose_collection(self):
+        self.research.choose_collection()
+
+    def build_position_index(self):
+        self.research.build_position_index()
+
+    def find_same_position(self):
+        self.research.find_same_position()
+
+    def build_opening_tree(self):
+        self.research.build_opening_tree()
+
+    def find_same_material(self):
+        self.research.find_same_material()
+
+    def build_opening_book(self):
+        self.research.build_opening_book()
+
+    def load_opening_book(self):
+        self.research.load_opening_book()
+
+    def book_move(self):
+        self.research.book_move()
+
+    def probe_tablebase(self):
+        self.research.probe_tablebase()
+
     # 变换
     def flip_left_right(self):
         self.transforms.flip_left_right()
@@ -1259,6 +1974,37 @@ class XiangqiGUI:
     def swap_red_black(self):
         self.transforms.swap_red_black()
 
+    # 调试
+    def toggle_debug_window(self):
+        if self._debug_win is not None:
+            self._debug_win.close()
+        else:
+            self._debug_win = ProfilerWindow(self)
+
+    def profile_next_actions(self):
+        """用 cProfile 记录接下来 N 次操作（每轮界面刷新算一次），写出 .prof 文件"""
+        prof = profiling.PROFILER
+        if prof.capturing:
+            if messagebox.askyesno("性能采样", "采样正在进行，现在结束并写出文件？", parent=self.root):
+                prof.stop_capture()
+            return
+        n = simpledialog.askinteger("性能采样", "用 cProfile 记录接下来多少次操作？", initialvalue=20,
+                                    minvalue=1, maxvalue=100000, parent=self.root)
+        if not n:
+            return
+        path = filedialog.asksaveasfilename(title="保存性能采样", defaultextension=".prof",
+                                            initialfile="xiangqi.prof", parent=self.root,
+                                            filetypes=[("cProfile 数据", "*.prof"), ("所有文件", "*.*")])
+        if not path:
+            return
+
+        def done(p):
+            messagebox.showinfo("性能采样", f"已写入：{p}\n查看：python -m pstats \"{p}\"", parent=self.root)
+        try:
+            prof.start_capture(path, n, on_done=done)
+        except (RuntimeError, ValueError) as e:
+            messagebox.showerror("性能采样", str(e), parent=self.root)
+
     # 其它
     def about(self):
         messagebox.showinfo(
@@ -1272,12 +2018,43 @@ class XiangqiGUI:
     # 退出
     def on_close(self):
         if self._dirty:
-            ans = messagebox.askyesnocancel("未保存的更改", "是否保存当前更改？")
+            ans = messagebox.askyesnocancel("未保存的更改", "是否保存当前更改？", parent=self.root)
             if ans is None:
                 return
             if ans:
                 self.save_quick()
-        self.root.destroy()
+        self.refresher.cancel()
+        self.board_canvas.cancel_pending()
+        if self._debug_win is not None:
+            self._debug_win.close()
+        if profiling.PROFILER.capturing:
+            profiling.PROFILER.stop_capture()       # 窗口关了就提前结束采样，写出已记录的部分
+        if self.explorer is not None:
+            self.explorer.close()
+        self.research.close()
+        XiangqiGUI.documents.remove(self)
+        tk_root = self.root._root()
+        if self.root is tk_root and XiangqiGUI.documents:
+            # 主窗口承载 Tk 解释器：其他棋谱窗口仍在时只隐藏
+            self.root.withdraw()
+        elif not XiangqiGUI.documents:
+            tk_root.destroy()
+        else:
+            self.root.destroy()
+
+
+# ======================= profiling hooks =======================
+# 界面热点登记到 profiling（计数开着时才换成包装）；RefreshScheduler 里已事先取好的
+# 绑定方法不经过这里，由调度器按 "refresh:视图" 单独计时
+def _refresh_methods(cls) -> List[str]:
+    return [n for n, v in vars(cls).items() if callable(v) and n.lstrip("_").startswith("refresh")]
+
+
+profiling.register(db, ("draw_board",), "draw_board.")
+profiling.register(BoardCanvas, ("draw_board", "update_highlights"), "BoardCanvas.")
+profiling.register(XiangqiGUI, ["play_san", "_replay_mainline"] + _refresh_methods(XiangqiGUI), "XiangqiGUI.")
+for _cls in (MovesPanel, VariationPanel, OpeningPanel, FileOps):
+    profiling.register(_cls, _refresh_methods(_cls), _cls.__name__ + ".")
 
 
 # ========== 方便外部导入 ==========
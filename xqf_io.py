@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+XQF（象棋演播室）二进制棋谱读写（与界面无关，不依赖 tkinter）：
+- parse_xqf(data)：底层解析 → XqfGame（版本、文件头字段、32 枚棋子初始坐标、先序着法树）
+- decode_xqf(data) / read_xqf(path)：解析并转成 GameRecord（主线、注释、变着、排局起始局面）
+- write_xqf(path, rec)：写出 1.0 版（不加密）XQF，含主线、变着与主线注释
+解密：版本 > 10 的正文按 32 字节周期的密钥流逐字节相减；这里按周期把正文切成 32 个步长切片，
+每片用一张 bytes.translate 查表整体处理，不在 Python 里逐字节循环。
+"""
+
+import struct
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import chess_rules as xr
+from game_record import GameRecord, normalize_fen
+
+HEADER_SIZE = 1024
+WRITE_VERSION = 10
+_COPYRIGHT = b"[(C) Copyright Mr. Dong Shiwei.]"
+# 32 个棋子槽位：0-15 红方、16-31 黑方，每方按此顺序
+_SLOT_TYPES = "RNBAKABNRCCPPPPP"
+# 文件头字符串字段（Pascal 串，GBK）：标签名 -> (偏移, 长度)
+_STRINGS = {
+    "Event": (0x50, 64),        # 标题
+    "Match": (0xD0, 64),        # 赛事名称
+    "Date": (0x110, 16),
+    "Site": (0x120, 16),
+    "Red": (0x130, 16),
+    "Black": (0x140, 16),
+    "Opening": (0x150, 64),
+    "Annotator": (0x1D0, 16),   # 评注者
+    "Author": (0x1E0, 16),      # 作者
+}
+_RESULTS = {1: "1-0", 2: "0-1", 3: "1/2-1/2"}
+# 规整后的着法标志
+TAG_DOWN = 0x80     # 有后续着法（子节点）
+TAG_RIGHT = 0x40    # 有同级的替代着法（兄弟节点）
+
+
+class XqfError(ValueError):
+    pass
+
+
+@dataclass
+class XqfGame:
+    version: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    # 每个槽位的 (row, col)；None = 不在棋盘上
+    pieces: List[Optional[Tuple[int, int]]] = field(default_factory=list)
+    # 先序排列的节点：(from_sq, to_sq, tags, comment)；nodes[0] 是根（只有开局注释）
+    nodes: List[Tuple[Tuple[int, int], Tuple[int, int], int, str]] = field(default_factory=list)
+
+
+# ======================= 读取 =======================
+def _xy_to_sq(xy: int) -> Optional[Tuple[int, int]]:
+    """XQF 坐标 x*10+y（y=0 为红方底线）→ (row, col)"""
+    if xy >= 90:
+        return None
+    return 9 - xy % 10, xy // 10
+
+
+def _sq_to_xy(sq: Tuple[int, int]) -> int:
+    r, c = sq
+    return c * 10 + (9 - r)
+
+
+def _pascal(data: bytes, off: int, size: int) -> str:
+    n = min(data[off], size - 1)
+    return data[off + 1:off + 1 + n].decode("gbk", errors="replace")
+
+
+@lru_cache(maxsize=None)
+def _sub_table(k: int) -> bytes:
+    return bytes((b - k) & 0xFF for b in range(256))
+
+
+def _decrypt(body: memoryview, keystream: bytes):
+    """body[i] -= keystream[i % 32]，按 32 个步长切片批量查表"""
+    if not any(keystream):
+        return body
+    out = bytearray(body)
+    for i, k in enumerate(keystream):
+        if k:
+            out[i::32] = out[i::32].translate(_sub_table(k))
+    return memoryview(out)
+
+
+def _keys(h: bytes):
+    """→ (KeyXY, KeyXYf, KeyXYt, 注释长度偏移, 32 字节密钥流)；1.0 版及以前不加密"""
+    if h[2] <= 10:
+        return 0, 0, 0, 0, bytes(32)
+
+    def sq54(x):
+        return (x * x * 54 + 221) & 0xFF
+
+    key_xy = (sq54(h[0x0D]) * h[0x0D]) & 0xFF
+    key_xyf = (sq54(h[0x0E]) * key_xy) & 0xFF
+    key_xyt = (sq54(h[0x0F]) * key_xyf) & 0xFF
+    rmk_offset = (h[0x0C] * 256 + h[0x0D]) % 32000 + 767
+    f = [h[0x08 + i] | (h[0x0C + i] & h[0x03]) for i in range(4)]
+    keystream = bytes(f[i % 4] & _COPYRIGHT[i] for i in range(32))
+    return key_xy, key_xyf, key_xyt, rmk_offset, keystream
+
+
+def parse_xqf(data: bytes) -> XqfGame:
+    if len(data) < HEADER_SIZE or data[:2] != b"XQ":
+        raise XqfError("不是 XQF 文件")
+    h = data[:HEADER_SIZE]
+    version = h[2]
+    key_xy, key_xyf, key_xyt, rmk_offset, keystream = _keys(h)
+
+    game = XqfGame(version=version)
+    for tag, (off, size) in _STRINGS.items():
+        val = _pascal(h, off, size).strip()
+        if val:
+            game.headers[tag] = val
+    if h[0x33] in _RESULTS:
+        game.headers["Result"] = _RESULTS[h[0x33]]
+
+    raw = h[0x10:0x30]
+    if version <= 10:
+        pos = list(raw)
+    elif version < 12:
+        pos = [(b - key_xy) & 0xFF for b in raw]
+    else:
+        pos = [0] * 32
+        for i, b in enumerate(raw):
+            pos[(i + key_xy + 1) % 32] = (b - key_xy) & 0xFF
+    game.pieces = [_xy_to_sq(xy) for xy in pos]
+
+    body = _decrypt(memoryview(data)[HEADER_SIZE:], keystream)
+    n = len(body)
+    off = 0
+    pending = 1          # 还需读的节点数：读到 down/right 标志时增加
+    while pending:
+        if off + 4 > n:
+            raise XqfError(f"着法记录在 {HEADER_SIZE + off} 处被截断")
+        b0, b1, tag, _ = body[off:off + 4]
+        off += 4
+        if version <= 10:
+            tags = (TAG_DOWN if tag & 0xF0 else 0) | (TAG_RIGHT if tag & 0x0F else 0)
+            has_rmk = True
+        else:
+            tags = tag & (TAG_DOWN | TAG_RIGHT)
+            has_rmk = bool(tag & 0x20)
+        comment = ""
+        if has_rmk:
+            if off + 4 > n:
+                raise XqfError(f"注释长度在 {HEADER_SIZE + off} 处被截断")
+            length = struct.unpack_from("<i", body, off)[0] - rmk_offset
+            off += 4
+            if length < 0 or off + length > n:
+                raise XqfError(f"注释长度无效：{length}")
+            comment = bytes(body[off:off + length]).decode("gbk", errors="replace").strip()
+            off += length
+        src = (b0 - 24 - key_xyf) & 0xFF
+        dst = (b1 - 32 - key_xyt) & 0xFF
+        if game.nodes:
+            fr, to = _xy_to_sq(src), _xy_to_sq(dst)
+            if fr is None or to is None:
+                raise XqfError(f"第 {len(game.nodes)} 个着法坐标无效：{src}->{dst}")
+        else:
+            fr = to = (0, 0)
+        game.nodes.append((fr, to, tags, comment))
+        pending -= 1
+        if tags & TAG_DOWN:
+            pending += 1
+        if tags & TAG_RIGHT and len(game.nodes) > 1:
+            pending += 1
+    return game
+
+
+def _setup_board(game: XqfGame) -> xr.Board:
+    board = xr.Board(startpos=False)
+    for slot, sq in enumerate(game.pieces):
+        if sq is None:
+            continue
+        if board.piece_at(sq) is not None:
+            raise XqfError(f"初始局面有两枚棋子重叠：{sq}")
+        color = 'r' if slot < 16 else 'b'
+        board.set_piece(sq, xr.Piece(color, _SLOT_TYPES[slot % 16]))
+    return board
+
+
+def tree_to_record(board: xr.Board, nodes, headers: Dict[str, str],
+                   default_side: str = 'r', error=XqfError) -> GameRecord:
+    """先序着法树（TAG_DOWN/TAG_RIGHT 标志，nodes[0] 为根）→ GameRecord；CBR 也用这一套"""
+    rec = GameRecord(headers=dict(headers))
+    if nodes and nodes[0][3]:
+        rec.comments[0] = nodes[0][3]
+    # 先行方以第一步棋子的颜色为准，文件头里的标志只作后备
+    first = board.piece_at(nodes[1][0]) if len(nodes) > 1 else None
+    board.side_to_move = first.color if first is not None else default_side
+    rec.start_fen = normalize_fen(board.board_fen())
+
+    path: List[str] = []          # 当前线路（从开局起）
+    stack: List[int] = []         # 有兄弟节点待读时，记下该层的半步数
+    main_done = len(nodes) == 1 or not nodes[0][2] & TAG_DOWN
+    for idx in range(1, len(nodes)):
+        fr, to, tags, comment = nodes[idx]
+        if tags & TAG_RIGHT:
+            stack.append(len(path))
+        piece = board.piece_at(fr)
+        if piece is None:
+            raise error(f"第 {len(path) + 1} 步起点没有棋子：{fr}")
+        mv = xr.Move(fr, to)
+        path.append(board.move_to_chinese(mv))
+        board.make_move(mv)
+        if not main_done and comment:
+            rec.comments[len(path)] = comment
+        if tags & TAG_DOWN:
+            continue
+        # 到达叶子：第一条是主线，其余按与主线的分叉点展开成变着
+        if not main_done:
+            rec.moves = list(path)
+            main_done = True
+        else:
+            d = 0
+            while d < len(path) and d < len(rec.moves) and path[d] == rec.moves[d]:
+                d += 1
+            if d < len(path):
+                rec.variations.append((d + 1, path[d:]))
+        if not stack:
+            break
+        depth = stack.pop()
+        while len(path) > depth:
+            board.undo_move()
+            path.pop()
+    rec.variations.sort(key=lambda v: v[0])
+    return rec
+
+
+def decode_xqf(data: bytes) -> GameRecord:
+    game = parse_xqf(data)
+    return tree_to_record(_setup_board(game), game.nodes, game.headers,
+                          'b' if data[0x32] else 'r')
+
+
+def is_xqf_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(2) == b"XQ"
+
+
+def read_xqf(path: str) -> GameRecord:
+    with open(path, "rb") as f:
+        return decode_xqf(f.read())
+
+
+# ======================= 写出 =======================
+class _Node:
+    __slots__ = ("move", "children", "comment")
+
+    def __init__(self, move=None):
+        self.move = move
+        self.children: Dict[str, "_Node"] = {}
+        self.comment = ""
+
+
+def build_move_tree(rec: GameRecord, error=XqfError) -> _Node:
+    """主线 + 变着 → 着法树（主线总是第一个子节点）；已在树里的着法不再重复解析"""
+    root = _Node()
+    root.comment = rec.comments.get(0, "")
+    lines = [rec.moves] + [rec.moves[:pivot - 1] + list(moves) for pivot, moves in rec.variations]
+    for li, line in enumerate(lines):
+        board = xr.Board()
+        if rec.start_fen:
+            board.set_fen(rec.start_fen)
+        node = root
+        for ply, san in enumerate(line, start=1):
+            child = node.children.get(san)
+            if child is None:
+                mv = board.parse_chinese(san)
+                if mv is None:
+                    where = "主线" if li == 0 else f"变着 {li} "
+                    raise error(f"{where}第 {ply} 步无法解析：{san}")
+                child = node.children[san] = _Node(mv)
+                if li == 0:
+                    child.comment = rec.comments.get(ply, "")
+            board.make_move(child.move)
+            node = child
+    return root
+
+
+def iter_preorder(root: _Node):
+    """先序遍历（不含根）→ (节点, 是否还有兄弟)；用显式栈，长棋谱不受递归深度限制"""
+    stack = [list(root.children.values())[::-1]] if root.children else []
+    while stack:
+        siblings = stack[-1]
+        node = siblings.pop()
+        if not siblings:
+            stack.pop()
+        yield node, bool(siblings)
+        if node.children:
+            stack.append(list(node.children.values())[::-1])
+
+
+def _put_pascal(buf: bytearray, off: int, size: int, text: str):
+    raw = text.encode("gbk", errors="replace")[:size - 1]
+    buf[off] = len(raw)
+    buf[off + 1:off + 1 + len(raw)] = raw
+
+
+def _piece_slots(board: xr.Board) -> bytes:
+    slots = [0xFF] * 32
+    for r in range(xr.ROWS):
+        for c in range(xr.COLS):
+            p = board.board[r][c]
+            if p is None:
+                continue
+            base = 0 if p.color == 'r' else 16
+            for i, t in enumerate(_SLOT_TYPES):
+                if t == p.ptype and slots[base + i] == 0xFF:
+                    slots[base + i] = _sq_to_xy((r, c))
+                    break
+            else:
+                raise XqfError(f"棋子数目超出 XQF 槽位：{p!r}")
+    return bytes(slots)
+
+
+def encode_xqf(rec: GameRecord) -> bytes:
+    board = xr.Board()
+    if rec.start_fen:
+        board.set_fen(rec.start_fen)
+    head = bytearray(HEADER_SIZE)
+    head[0:2] = b"XQ"
+    head[2] = WRITE_VERSION
+    head[0x10:0x30] = _piece_slots(board)
+    head[0x32] = 1 if board.side_to_move == 'b' else 0
+    head[0x33] = {v: k for k, v in _RESULTS.items()}.get(rec.result, 0)
+    for tag, (off, size) in _STRINGS.items():
+        if rec.headers.get(tag):
+            _put_pascal(head, off, size, rec.headers[tag])
+
+    body = bytearray()
+
+    def emit(src: int, dst: int, down: bool, right: bool, comment: str):
+        raw = comment.encode("gbk", errors="replace")
+        tag = (0xF0 if down else 0) | (0x0F if right else 0)
+        body.extend((src + 24, dst + 32, tag, 0))
+        body.extend(struct.pack("<i", len(raw)))
+        body.extend(raw)
+
+    root = build_move_tree(rec)
+    emit(0, 0, bool(root.children), False, root.comment)
+    for node, right in iter_preorder(root):
+        emit(_sq_to_xy(node.move.from_sq), _sq_to_xy(node.move.to_sq),
+             bool(node.children), right, node.comment)
+    return bytes(head) + bytes(body)
+
+
+def write_xqf(path: str, rec: GameRecord):
+    data = encode_xqf(rec)
+    with open(path, "wb") as f:
+        f.write(data)